@@ -3,16 +3,19 @@
 Inpaint 服务 - 智能移除图片中指定区域的文字并渲染翻译后的文字
 支持 GPU 加速和 Docker 部署
 """
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import io
 import json
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
 import cv2
-from io import BytesIO
 import logging
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 import os
 
 # ==================== 日志配置 ====================
@@ -64,18 +67,37 @@ class Config:
     # 图片处理配置
     MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', 10 * 1024 * 1024))  # 10MB
     INPAINT_RADIUS = int(os.getenv('INPAINT_RADIUS', 3))
-    OUTPUT_QUALITY = int(os.getenv('OUTPUT_QUALITY', 95))
+    OUTPUT_QUALITY = int(os.getenv('OUTPUT_QUALITY', 95))  # JPEG / WebP 质量
+    PNG_COMPRESSION = int(os.getenv('OUTPUT_PNG_COMPRESSION', 3))  # PNG 压缩级别 0-9
     
     # Inpaint 方法: TELEA (快) 或 NS (质量好)
     INPAINT_METHOD_NAME = os.getenv('INPAINT_METHOD', 'TELEA')
     INPAINT_METHOD = cv2.INPAINT_TELEA if INPAINT_METHOD_NAME == 'TELEA' else cv2.INPAINT_NS
     
+    # 区域修复：只对 boxes 周围的裁剪区域执行 inpaint（相邻 boxes 合并为一个区域）
+    ROI_PADDING = int(os.getenv('INPAINT_ROI_PADDING', 16))  # 裁剪区域外扩像素（不小于修复半径 + 1）
+    ROI_WORKERS = int(os.getenv('INPAINT_ROI_WORKERS', min(4, os.cpu_count() or 1)))
+    ROI_MAX_COVERAGE = float(os.getenv('INPAINT_ROI_MAX_COVERAGE', 0.6))  # 区域面积超过整图该比例时直接整图修复
+    
+    # 纯色背景快速填充：box 周围一圈像素足够均匀时直接用背景色填充，不做 inpaint
+    FLAT_FILL = os.getenv('INPAINT_FLAT_FILL', 'true').lower() == 'true'
+    FLAT_RING = int(os.getenv('INPAINT_FLAT_RING', 4))  # 采样环宽度（像素）
+    FLAT_MAX_STD = float(os.getenv('INPAINT_FLAT_MAX_STD', 6.0))  # 采样像素各通道标准差上限
+    FLAT_MIN_SAMPLES = int(os.getenv('INPAINT_FLAT_MIN_SAMPLES', 16))  # 采样像素过少时不做判断
+    
+    # 金字塔修复：mask 很大时先在缩小的图上 inpaint，放大后只在 mask 边缘的窄带内按原分辨率细修
+    PYRAMID_MIN_PIXELS = int(os.getenv('INPAINT_PYRAMID_MIN_PIXELS', 150000))  # 单个区域 mask 像素数达到该值时启用，0 表示关闭
+    PYRAMID_SCALE = float(os.getenv('INPAINT_PYRAMID_SCALE', 0.25))  # 缩小比例
+    PYRAMID_BAND = int(os.getenv('INPAINT_PYRAMID_BAND', 6))  # 原分辨率细修的边缘带宽度（像素）
+    
     # 文字渲染配置
     DEFAULT_FONT_PATH = os.getenv('FONT_PATH', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
     DEFAULT_TEXT_COLOR = tuple(map(int, os.getenv('TEXT_COLOR', '0,0,0').split(',')))  # 黑色
     DEFAULT_BG_COLOR = tuple(map(int, os.getenv('BG_COLOR', '255,255,255').split(',')))  # 白色
     MIN_FONT_SIZE = int(os.getenv('MIN_FONT_SIZE', 10))
     MAX_FONT_SIZE = int(os.getenv('MAX_FONT_SIZE', 200))
+    FONT_CACHE_SIZE = int(os.getenv('FONT_CACHE_SIZE', 128))  # 缓存的 (字体, 字号) 数
+    TEXT_METRIC_CACHE_SIZE = int(os.getenv('TEXT_METRIC_CACHE_SIZE', 4096))  # 缓存的文字尺寸测量结果数
     
     # CORS 配置
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',')
@@ -86,6 +108,41 @@ config = Config()
 app = Flask(__name__)
 CORS(app, origins=ALLOWED_ORIGINS if ALLOWED_ORIGINS != '*' else config.CORS_ORIGINS)
 
+# ==================== 链路追踪 ====================
+# 与 translator_api 约定的请求头：X-Trace-Id 传入 trace，X-Trace-Spans 回传阶段耗时
+TRACE_HEADER = 'X-Trace-Id'
+SPANS_HEADER = 'X-Trace-Spans'
+SERVICE_NAME = 'inpaint'
+# 修复统计（区域数、纯色填充 / inpaint 的 box 数等）通过该响应头回传
+STATS_HEADER = 'X-Inpaint-Stats'
+
+
+class StageTimer:
+    """记录单个请求内各阶段的耗时"""
+
+    def __init__(self):
+        self.spans = []
+
+    def record(self, name, start, end=None, **attrs):
+        end = end if end is not None else time.time()
+        span = {
+            'name': name,
+            'service': SERVICE_NAME,
+            'start': round(start, 6),
+            'duration_ms': round((end - start) * 1000, 1)
+        }
+        if attrs:
+            span['attrs'] = attrs
+        self.spans.append(span)
+        return end
+
+    def attach(self, response, request_id):
+        """把 trace_id 和 spans 写入响应头"""
+        response.headers[TRACE_HEADER] = request_id
+        response.headers[SPANS_HEADER] = json.dumps(self.spans)
+        return response
+
+
 # ==================== GPU 检测 ====================
 def check_gpu_support():
     """检查 OpenCV CUDA 支持"""
@@ -165,15 +222,30 @@ def get_font_path():
 FONT_PATH = get_font_path()
 
 
+@lru_cache(maxsize=config.FONT_CACHE_SIZE)
+def load_font(font_path, size):
+    """加载字体（按 (路径, 字号) 缓存，避免每次测量都重新解析字体文件）"""
+    return ImageFont.truetype(font_path, size)
+
+
+@lru_cache(maxsize=config.TEXT_METRIC_CACHE_SIZE)
+def measure_text(font_path, size, text):
+    """文字在指定字号下相对绘制起点的外接框 (left, top, right, bottom)，结果缓存"""
+    return load_font(font_path, size).getbbox(text)
+
+
 def calculate_font_size(box, text, font_path, max_attempts=30):
     """
     自动计算合适的字体大小
     
+    从 box 高度估算初始字号，之后利用文字尺寸与字号近似成正比的关系按比例修正，
+    通常只需测量一两次
+    
     Args:
         box: [[x1,y1], [x2,y2], [x3,y3], [x4,y4]]
         text: 要绘制的文字
         font_path: 字体文件路径
-        max_attempts: 最大尝试次数
+        max_attempts: 最大测量次数
         
     Returns:
         int: 合适的字体大小
@@ -181,32 +253,24 @@ def calculate_font_size(box, text, font_path, max_attempts=30):
     if not text or not font_path:
         return config.MIN_FONT_SIZE
     
-    # 计算 box 的宽高
+    # 计算 box 的宽高（留 10% 边距）
     points = np.array(box)
-    width = np.max(points[:, 0]) - np.min(points[:, 0])
-    height = np.max(points[:, 1]) - np.min(points[:, 1])
+    max_width = (np.max(points[:, 0]) - np.min(points[:, 0])) * 0.9
+    max_height = (np.max(points[:, 1]) - np.min(points[:, 1])) * 0.9
     
-    # 二分查找合适的字体大小
     min_size = config.MIN_FONT_SIZE
     max_size = config.MAX_FONT_SIZE
     best_size = min_size
+    size = min(max(int(max_height), min_size), max_size)
     
     for _ in range(max_attempts):
-        size = (min_size + max_size) // 2
-        
         try:
-            font = ImageFont.truetype(font_path, size)
-        except:
-            font = ImageFont.load_default()
+            left, top, right, bottom = measure_text(font_path, size, text)
+        except Exception:
             return config.MIN_FONT_SIZE
+        text_width, text_height = right - left, bottom - top
         
-        # 获取文字边界
-        bbox = font.getbbox(text)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # 检查是否适合（留 10% 边距）
-        if text_width <= width * 0.9 and text_height <= height * 0.9:
+        if text_width <= max_width and text_height <= max_height:
             best_size = size
             min_size = size + 1
         else:
@@ -214,6 +278,10 @@ def calculate_font_size(box, text, font_path, max_attempts=30):
         
         if min_size > max_size:
             break
+        
+        # 按比例估计下一个字号，并限制在剩余的搜索区间内
+        scale = min(max_width / max(text_width, 1), max_height / max(text_height, 1))
+        size = min(max(int(size * scale), min_size), max_size)
     
     return max(best_size, config.MIN_FONT_SIZE)
 
@@ -222,8 +290,10 @@ def draw_text_on_image(image, texts_data, font_path):
     """
     在图片上绘制翻译后的文字
     
+    只把每段文字覆盖的小块区域转为 PIL 图片绘制后写回，整张图片保持为 OpenCV 的 BGR 数组
+
     Args:
-        image: PIL.Image 对象
+        image: BGR numpy 数组（原地修改）
         texts_data: [
             {
                 'box': [[x1,y1], [x2,y2], [x3,y3], [x4,y4]],
@@ -236,13 +306,13 @@ def draw_text_on_image(image, texts_data, font_path):
         font_path: 字体文件路径
         
     Returns:
-        PIL.Image: 绘制后的图片
+        numpy 数组: 绘制后的图片
     """
     if not font_path:
         logger.warning("字体路径无效，跳过文字渲染")
         return image
     
-    draw = ImageDraw.Draw(image)
+    image_height, image_width = image.shape[:2]
     rendered_count = 0
     
     for i, item in enumerate(texts_data):
@@ -269,13 +339,12 @@ def draw_text_on_image(image, texts_data, font_path):
             font_size = calculate_font_size(box, text, font_path)
             
             try:
-                font = ImageFont.truetype(font_path, font_size)
+                font = load_font(font_path, font_size)
+                bbox = measure_text(font_path, font_size, text)
             except Exception as e:
                 logger.warning(f"加载字体失败: {e}, 使用默认字体")
                 font = ImageFont.load_default()
-            
-            # 获取文字边界
-            bbox = font.getbbox(text)
+                bbox = font.getbbox(text)
             text_width = bbox[2] - bbox[0]
             text_height = bbox[3] - bbox[1]
             
@@ -290,18 +359,34 @@ def draw_text_on_image(image, texts_data, font_path):
                 x = int(np.max(points[:, 0])) - text_width
                 y = center_y - text_height // 2
             
+            # 需要重绘的小块区域：文字实际覆盖的范围 + 背景框
+            padding = 2
+            px0, py0 = x + bbox[0], y + bbox[1]
+            px1, py1 = x + bbox[2], y + bbox[3]
+            if bg_color:
+                px0, py0 = min(px0, x - padding), min(py0, y - padding)
+                px1, py1 = max(px1, x + text_width + padding + 1), max(py1, y + text_height + padding + 1)
+            px0, py0 = max(int(px0), 0), max(int(py0), 0)
+            px1, py1 = min(int(px1), image_width), min(int(py1), image_height)
+            if px0 >= px1 or py0 >= py1:
+                continue
+            
+            # 小块按 RGB 交给 PIL（实际字节是 BGR），颜色相应反转
+            patch = image[py0:py1, px0:px1]
+            canvas = Image.fromarray(patch)
+            draw = ImageDraw.Draw(canvas)
+            
             # 绘制背景（如果指定）
             if bg_color:
-                bg_color = tuple(bg_color)
-                padding = 2
                 draw.rectangle(
-                    [(x - padding, y - padding),
-                     (x + text_width + padding, y + text_height + padding)],
-                    fill=bg_color
+                    [(x - padding - px0, y - padding - py0),
+                     (x + text_width + padding - px0, y + text_height + padding - py0)],
+                    fill=tuple(bg_color)[::-1]
                 )
             
             # 绘制文字
-            draw.text((x, y), text, font=font, fill=color)
+            draw.text((x - px0, y - py0), text, font=font, fill=color[::-1])
+            patch[:] = np.asarray(canvas)
             
             rendered_count += 1
             logger.debug(
@@ -358,26 +443,6 @@ def normalize_boxes(boxes):
     return normalized_boxes
 
 
-def create_mask_from_boxes(image_shape, boxes):
-    """
-    根据 boxes 创建 mask
-    
-    Args:
-        image_shape: 图片形状 (height, width, channels)
-        boxes: 标准化后的 boxes 列表
-    
-    Returns:
-        mask: numpy array, 255 表示需要修复的区域
-    """
-    mask = np.zeros(image_shape[:2], dtype=np.uint8)
-    
-    for points in boxes:
-        # 在 mask 上绘制文字区域（填充为白色）
-        cv2.fillPoly(mask, [points], 255)
-    
-    return mask
-
-
 def validate_boxes(boxes, image_shape):
     """
     验证 boxes 坐标是否在图片范围内
@@ -404,6 +469,266 @@ def validate_boxes(boxes, image_shape):
     return True, ""
 
 
+# ==================== 区域修复 ====================
+# OpenCV 在 inpaint 期间释放 GIL，各区域可在线程池中并行处理
+roi_executor = ThreadPoolExecutor(max_workers=max(config.ROI_WORKERS, 1), thread_name_prefix='inpaint-roi')
+
+
+def group_boxes(boxes, image_shape, padding):
+    """
+    把 boxes 按外扩后的外接矩形合并成互不重叠的区域
+
+    Args:
+        boxes: 标准化后的 boxes 列表
+        image_shape: 图片形状 (height, width, ...)
+        padding: 外扩像素
+
+    Returns:
+        [((x0, y0, x1, y1), [box 下标, ...]), ...]，坐标为左闭右开
+    """
+    height, width = image_shape[:2]
+    regions = []
+    for i, points in enumerate(boxes):
+        x0, y0 = points.min(axis=0) - padding
+        x1, y1 = points.max(axis=0) + padding + 1
+        regions.append([max(int(x0), 0), max(int(y0), 0), min(int(x1), width), min(int(y1), height), [i]])
+
+    # 合并有重叠的区域，直到没有重叠（合并后的区域可能与其他区域产生新的重叠）
+    merged = True
+    while merged:
+        merged = False
+        regions.sort(key=lambda r: (r[1], r[0]))
+        result = []
+        for region in regions:
+            for other in result:
+                if region[0] < other[2] and other[0] < region[2] and region[1] < other[3] and other[1] < region[3]:
+                    other[0], other[1] = min(other[0], region[0]), min(other[1], region[1])
+                    other[2], other[3] = max(other[2], region[2]), max(other[3], region[3])
+                    other[4].extend(region[4])
+                    merged = True
+                    break
+            else:
+                result.append(region)
+        regions = result
+
+    return [((x0, y0, x1, y1), indices) for x0, y0, x1, y1, indices in regions]
+
+
+def estimate_flat_color(image, text_mask, points):
+    """
+    估计 box 的背景色：取 box 外接矩形外扩 FLAT_RING 像素范围内、不属于任何文字区域的像素，
+    各通道标准差都不超过 FLAT_MAX_STD 时视为纯色背景
+
+    Args:
+        image: 图片（或区域裁剪）数组
+        text_mask: 与 image 同尺寸的文字 mask，255 表示文字区域
+        points: box 坐标（与 image 同一坐标系）
+
+    Returns:
+        背景色 tuple；背景有纹理或采样不足时返回 None
+    """
+    height, width = text_mask.shape
+    x0, y0 = np.maximum(points.min(axis=0) - config.FLAT_RING, 0)
+    x1, y1 = np.minimum(points.max(axis=0) + config.FLAT_RING + 1, (width, height))
+    samples = image[y0:y1, x0:x1][text_mask[y0:y1, x0:x1] == 0]
+    if len(samples) < config.FLAT_MIN_SAMPLES:
+        return None
+    if samples.std(axis=0).max() > config.FLAT_MAX_STD:
+        return None
+    return tuple(int(c) for c in np.median(samples, axis=0))
+
+
+def pyramid_inpaint(image, mask):
+    """
+    多尺度修复：cv2.inpaint 的耗时随 mask 面积和半径快速增长，大面积文字（大标题、海报）
+    先在缩小 PYRAMID_SCALE 倍的图上修复，放大填回 mask 内部，再以原分辨率修复 mask 边缘
+    PYRAMID_BAND 像素宽的窄带，使填充内容与周围像素自然衔接
+
+    Args:
+        image: 图片（或区域裁剪）数组
+        mask: 255 表示需要修复的区域
+
+    Returns:
+        修复后的新数组
+    """
+    height, width = mask.shape
+    small_size = (max(int(width * config.PYRAMID_SCALE), 1), max(int(height * config.PYRAMID_SCALE), 1))
+    small = cv2.resize(image, small_size, interpolation=cv2.INTER_AREA)
+    # 任何包含文字像素的缩小像素都要修复，避免文字颜色混进缩小图
+    small_mask = (cv2.resize(mask, small_size, interpolation=cv2.INTER_AREA) > 0).astype(np.uint8) * 255
+    small = cv2.inpaint(small, small_mask, config.INPAINT_RADIUS, config.INPAINT_METHOD)
+
+    result = image.copy()
+    inside = mask > 0
+    result[inside] = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)[inside]
+
+    kernel = np.ones((2 * config.PYRAMID_BAND + 1, 2 * config.PYRAMID_BAND + 1), np.uint8)
+    band = cv2.subtract(mask, cv2.erode(mask, kernel))
+    return cv2.inpaint(result, band, config.INPAINT_RADIUS, config.INPAINT_METHOD)
+
+
+def _inpaint_region(image, rect, points_list):
+    """
+    修复单个区域（原地写回 image）
+
+    背景均匀的 box 直接用背景色填充，其余 box 再统一 inpaint；
+    需要 inpaint 的像素数达到 PYRAMID_MIN_PIXELS 时使用金字塔修复
+
+    Returns:
+        (mask 像素数, 纯色填充的 box 数, inpaint 的 box 数, 是否使用了金字塔修复)
+    """
+    x0, y0, x1, y1 = rect
+    crop = image[y0:y1, x0:x1]
+    polygons = [(points - (x0, y0)).astype(np.int32) for points in points_list]
+    text_mask = np.zeros(crop.shape[:2], dtype=np.uint8)
+    for points in polygons:
+        # 逐个填充：一次传入多个多边形时，重叠部分会被抵消
+        cv2.fillPoly(text_mask, [points], 255)
+
+    # 先为所有 box 采样背景，再统一写回，避免先填充的 box 影响后面的判断
+    fills, textured = [], []
+    for points in polygons:
+        color = estimate_flat_color(crop, text_mask, points) if config.FLAT_FILL else None
+        if color is None:
+            textured.append(points)
+        else:
+            fills.append((points, color))
+
+    for points, color in fills:
+        cv2.fillPoly(crop, [points], color)
+
+    if textured:
+        if fills:
+            mask = np.zeros_like(text_mask)
+            for points in textured:
+                cv2.fillPoly(mask, [points], 255)
+        else:
+            mask = text_mask
+        if 0 < config.PYRAMID_MIN_PIXELS <= np.count_nonzero(mask):
+            crop[:] = pyramid_inpaint(crop, mask)
+            return int(np.count_nonzero(text_mask)), len(fills), len(textured), True
+        crop[:] = cv2.inpaint(crop, mask, config.INPAINT_RADIUS, config.INPAINT_METHOD)
+
+    return int(np.count_nonzero(text_mask)), len(fills), len(textured), False
+
+
+def inpaint_regions(image, boxes):
+    """
+    只在 boxes 周围的区域内执行 inpaint，耗时随文字面积而不是图片面积增长
+
+    背景均匀的 box 走纯色填充，不调用 cv2.inpaint
+
+    Args:
+        image: BGR numpy 数组（原地修改）
+        boxes: 标准化后的 boxes 列表
+
+    Returns:
+        (image, 统计信息 dict)
+    """
+    height, width = image.shape[:2]
+    padding = max(config.ROI_PADDING, config.INPAINT_RADIUS + 1)
+    regions = group_boxes(boxes, image.shape, padding)
+    roi_pixels = sum((x1 - x0) * (y1 - y0) for (x0, y0, x1, y1), _ in regions)
+
+    # 区域几乎覆盖整图时，整图修复更省事
+    if roi_pixels > config.ROI_MAX_COVERAGE * height * width:
+        mask_pixels, flat_boxes, inpaint_boxes, pyramid = _inpaint_region(image, (0, 0, width, height), boxes)
+        return image, {'mode': 'full', 'regions': 1, 'roi_pixels': height * width, 'mask_pixels': mask_pixels,
+                       'flat_boxes': flat_boxes, 'inpaint_boxes': inpaint_boxes, 'pyramid_regions': int(pyramid)}
+
+    futures = [
+        roi_executor.submit(_inpaint_region, image, rect, [boxes[i] for i in indices])
+        for rect, indices in regions
+    ]
+    results = [future.result() for future in futures]
+    return image, {'mode': 'roi', 'regions': len(regions), 'roi_pixels': roi_pixels,
+                   'mask_pixels': sum(r[0] for r in results),
+                   'flat_boxes': sum(r[1] for r in results),
+                   'inpaint_boxes': sum(r[2] for r in results),
+                   'pyramid_regions': sum(r[3] for r in results)}
+
+
+# ==================== 编解码 ====================
+# 输出格式 -> (imencode 扩展名, MIME 类型)
+OUTPUT_FORMATS = {
+    'jpeg': ('.jpg', 'image/jpeg'),
+    'png': ('.png', 'image/png'),
+    'webp': ('.webp', 'image/webp')
+}
+
+
+def detect_image_format(data):
+    """按文件头识别输入格式；不是 JPEG / PNG / WebP 时返回 None"""
+    if data[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def parse_output_format(value, input_format):
+    """解析客户端请求的输出格式，未指定时与输入格式一致（其他输入格式输出 png）；不支持时返回 None"""
+    if not value:
+        return input_format or 'png'
+    value = value.strip().lower()
+    value = 'jpeg' if value in ('jpg', 'image/jpeg') else value.replace('image/', '')
+    return value if value in OUTPUT_FORMATS else None
+
+
+def decode_image(data):
+    """
+    解码为 BGR 数组；OpenCV 不支持的格式（如旧版本 OpenCV 下的 GIF）用 PIL 兜底
+
+    Returns:
+        BGR 数组，解码失败时返回 None
+    """
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is not None:
+        return image
+
+    try:
+        pil_image = Image.open(io.BytesIO(data))
+        source = f"{pil_image.format} {pil_image.size}"
+        if pil_image.mode == 'P' and 'transparency' in pil_image.info:
+            pil_image = pil_image.convert('RGBA')
+        if pil_image.mode in ('RGBA', 'LA'):
+            # 有透明通道，铺白色背景
+            background = Image.new('RGB', pil_image.size, (255, 255, 255))
+            background.paste(pil_image, mask=pil_image.split()[-1])
+            pil_image = background
+        elif pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
+        logger.info(f"✓ PIL 解码成功: {source}")
+        return cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+    except Exception as e:
+        logger.warning(f"⚠️ PIL 解码失败: {e}")
+        return None
+
+
+def encode_image(image, output_format):
+    """用 cv2.imencode 直接编码 BGR 数组，返回 bytes"""
+    ext, _ = OUTPUT_FORMATS[output_format]
+    if output_format == 'jpeg':
+        params = [cv2.IMWRITE_JPEG_QUALITY, config.OUTPUT_QUALITY]
+    elif output_format == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, config.OUTPUT_QUALITY]
+    else:
+        params = [cv2.IMWRITE_PNG_COMPRESSION, config.PNG_COMPRESSION]
+    ok, buffer = cv2.imencode(ext, image, params)
+    if not ok:
+        raise ValueError(f"编码 {output_format} 失败")
+    return buffer.tobytes()
+
+
+def image_response(data, output_format):
+    """构造图片响应"""
+    ext, mimetype = OUTPUT_FORMATS[output_format]
+    return Response(data, mimetype=mimetype,
+                    headers={'Content-Disposition': f'inline; filename=inpainted{ext}'})
+
+
 # ==================== API 端点 ====================
 @app.route('/inpaint', methods=['POST'])
 def inpaint():
@@ -414,6 +739,7 @@ def inpaint():
     
     请求参数:
         file: 图片文件
+        format: 输出格式（可选）: png / webp / jpeg，默认与输入格式一致
         boxes: JSON 数组，文字区域坐标 [[[x1,y1],[x2,y2],[x3,y3],[x4,y4]], ...]
         texts: JSON 数组（可选），翻译后的文字信息 [
             {
@@ -424,8 +750,9 @@ def inpaint():
             }
         ]
     """
-    request_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    request_id = request.headers.get(TRACE_HEADER) or datetime.now().strftime('%Y%m%d_%H%M%S_%f')
     start_time = datetime.now()
+    timer = StageTimer()
     
     logger.info(f"[{request_id}] 收到 inpaint 请求")
     
@@ -475,33 +802,32 @@ def inpaint():
                 logger.error(f"[{request_id}] texts JSON 解析失败: {e}")
                 return jsonify({'error': 'Invalid JSON in texts parameter', 'detail': str(e)}), 400
         
-        # 5. 读取图片
-        try:
-            image = Image.open(file.stream)
-            logger.info(f"[{request_id}] 图片: {image.size} {image.mode}")
-            
-            # 转换为 RGB
-            if image.mode != 'RGB':
-                logger.debug(f"[{request_id}] 转换 {image.mode} -> RGB")
-                image = image.convert('RGB')
-            
-        except Exception as e:
-            logger.error(f"[{request_id}] 图片读取失败: {e}")
-            return jsonify({'error': 'Unsupported image format', 'detail': str(e)}), 400
+        # 5. 读取图片（直接解码为 BGR 数组，之后全程不再转换颜色空间）
+        decode_start = time.time()
+        image_bytes = file.read()
+        input_format = detect_image_format(image_bytes)
+        output_format = parse_output_format(request.form.get('format') or request.args.get('format'), input_format)
+        if output_format is None:
+            return jsonify({'error': 'Unsupported output format',
+                            'detail': f"format 可选: {', '.join(OUTPUT_FORMATS)}"}), 400
+        
+        img_array = decode_image(image_bytes)
+        if img_array is None:
+            logger.error(f"[{request_id}] 图片读取失败")
+            return jsonify({'error': 'Unsupported image format'}), 400
         
-        # 6. 转换为 numpy 数组
-        img_array = np.array(image)
-        logger.debug(f"[{request_id}] 数组形状: {img_array.shape}")
+        height, width = img_array.shape[:2]
+        timer.record('inpaint.decode', decode_start, width=width, height=height, format=input_format or 'other')
+        logger.info(f"[{request_id}] 图片: {width}x{height} {input_format or 'other'} -> {output_format}")
         
-        # 7. 处理 boxes（空则返回原图）
+        # 6. 处理 boxes（空则返回原图，格式相同时不重新编码）
         if len(boxes) == 0:
             logger.info(f"[{request_id}] boxes 为空，返回原图")
-            output = BytesIO()
-            image.save(output, format='JPEG', quality=config.OUTPUT_QUALITY)
-            output.seek(0)
-            return send_file(output, mimetype='image/jpeg')
+            if output_format != input_format:
+                image_bytes = encode_image(img_array, output_format)
+            return timer.attach(image_response(image_bytes, output_format), request_id)
         
-        # 8. 标准化 boxes
+        # 7. 标准化 boxes
         try:
             normalized_boxes = normalize_boxes(boxes)
             if not normalized_boxes:
@@ -511,34 +837,31 @@ def inpaint():
             logger.error(f"[{request_id}] Boxes 格式错误: {e}")
             return jsonify({'error': 'Invalid boxes format', 'detail': str(e)}), 400
         
-        # 9. 验证坐标
+        # 8. 验证坐标
         is_valid, error_msg = validate_boxes(normalized_boxes, img_array.shape)
         if not is_valid:
             return jsonify({'error': 'Invalid coordinates', 'detail': error_msg}), 400
         
-        # 10. 创建 mask 并执行 inpainting
-        mask = create_mask_from_boxes(img_array.shape, normalized_boxes)
-        mask_pixels = np.count_nonzero(mask)
-        logger.info(f"[{request_id}] Mask: {mask_pixels} 像素需要修复")
-        
+        # 9. 按区域执行 inpainting（只处理 boxes 周围的裁剪区域）
+        inpaint_start = time.time()
         try:
-            img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-            
             logger.debug(f"[{request_id}] 开始 inpaint (方法: {config.INPAINT_METHOD_NAME}, 半径: {config.INPAINT_RADIUS})")
-            result_bgr = cv2.inpaint(img_bgr, mask, config.INPAINT_RADIUS, config.INPAINT_METHOD)
-            result_rgb = cv2.cvtColor(result_bgr, cv2.COLOR_BGR2RGB)
-            
-            logger.info(f"[{request_id}] ✓ Inpainting 完成")
+            result_array, stats = inpaint_regions(img_array, normalized_boxes)
             
-            # 转回 PIL Image
-            result_image = Image.fromarray(result_rgb)
+            coverage = stats['roi_pixels'] / (img_array.shape[0] * img_array.shape[1])
+            logger.info(f"[{request_id}] ✓ Inpainting 完成: {stats['mask_pixels']} 像素, "
+                        f"{stats['regions']} 个区域 ({stats['mode']}, 占整图 {coverage:.1%}), "
+                        f"纯色填充 {stats['flat_boxes']} / inpaint {stats['inpaint_boxes']} 个 box, "
+                        f"金字塔修复 {stats['pyramid_regions']} 个区域")
+            timer.record('inpaint.inpaint', inpaint_start, **stats)
             
         except Exception as e:
             logger.error(f"[{request_id}] Inpainting 失败: {e}", exc_info=True)
             return jsonify({'error': 'Inpainting failed', 'detail': str(e)}), 500
         
-        # 11. 渲染翻译后的文字（如果提供了 texts）
+        # 10. 渲染翻译后的文字（如果提供了 texts）
         if texts_data:
+            render_start = time.time()
             try:
                 # 将 box 和 text 对应起来
                 combined_texts = []
@@ -553,22 +876,25 @@ def inpaint():
                         }
                         combined_texts.append(combined_item)
                 
-                result_image = draw_text_on_image(result_image, combined_texts, FONT_PATH)
+                result_array = draw_text_on_image(result_array, combined_texts, FONT_PATH)
+                timer.record('inpaint.render', render_start, texts=len(combined_texts))
                 
             except Exception as e:
                 logger.error(f"[{request_id}] 文字渲染失败: {e}", exc_info=True)
                 # 渲染失败不影响返回 inpaint 后的图片
                 logger.warning(f"[{request_id}] 继续返回未渲染文字的图片")
         
-        # 12. 返回结果
-        output = BytesIO()
-        result_image.save(output, format='JPEG', quality=config.OUTPUT_QUALITY)
-        output.seek(0)
+        # 11. 返回结果
+        encode_start = time.time()
+        output = encode_image(result_array, output_format)
+        timer.record('inpaint.encode', encode_start, format=output_format, bytes=len(output))
         
         processing_time = (datetime.now() - start_time).total_seconds()
-        logger.info(f"[{request_id}] ✓ 完成: {processing_time:.3f}s, 输出: {len(output.getvalue())/1024:.1f}KB")
+        logger.info(f"[{request_id}] ✓ 完成: {processing_time:.3f}s, 输出: {output_format} {len(output)/1024:.1f}KB")
         
-        return send_file(output, mimetype='image/jpeg', as_attachment=False, download_name='inpainted.jpg')
+        response = image_response(output, output_format)
+        response.headers[STATS_HEADER] = json.dumps(stats)
+        return timer.attach(response, request_id)
     
     except Exception as e:
         logger.error(f"[{request_id}] 未知错误: {e}", exc_info=True)
@@ -604,6 +930,8 @@ def health_check():
         'timestamp': datetime.now().isoformat(),
         'service': 'inpaint-render',
         'font_available': FONT_PATH is not None,
+        'font_cache': load_font.cache_info()._asdict(),
+        'text_metric_cache': measure_text.cache_info()._asdict(),
         'gpu_available': GPU_AVAILABLE
     })
 
@@ -1,13 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from paddleocr import PaddleOCR
 import cv2
 import numpy as np
 import base64
+import hashlib
+import hmac
 import time
 import logging
 import os
 import re
+import json
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 
 # ========== CPU模式配置 ==========
@@ -22,26 +29,553 @@ logger = logging.getLogger(__name__)
 OCR_HOST = os.getenv('OCR_HOST', '0.0.0.0')
 OCR_PORT = int(os.getenv('OCR_PORT', '8899'))
 ALLOWED_ORIGINS = os.getenv('ALLOWED_ORIGINS', '*')
+# 检测前把长边缩到该值以内（0 表示不缩放），识别出的坐标再还原到原图
+OCR_MAX_SIDE = int(os.getenv('OCR_MAX_SIDE', '2048'))
+# 大尺寸 JPEG 直接以 1/2、1/4、1/8 分辨率解码（IMREAD_REDUCED_*），省去全尺寸解码
+OCR_REDUCED_DECODE = os.getenv('OCR_REDUCED_DECODE', 'true').lower() == 'true'
+# 超大 / 超长图分块识别：长边超过阈值，或长宽比超过 OCR_TILE_ASPECT 时切成重叠的块并行识别
+OCR_TILE_ENABLED = os.getenv('OCR_TILE_ENABLED', 'true').lower() == 'true'
+OCR_TILE_THRESHOLD = int(os.getenv('OCR_TILE_THRESHOLD', '4096'))
+OCR_TILE_ASPECT = float(os.getenv('OCR_TILE_ASPECT', '3.0'))
+OCR_TILE_SIZE = int(os.getenv('OCR_TILE_SIZE', '1536'))
+OCR_TILE_OVERLAP = int(os.getenv('OCR_TILE_OVERLAP', '192'))
+
+# OCR 工作进程池：每个进程持有一个 PaddleOCR 实例（单独占用一份模型内存）
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', '2'))
+# 每个工作进程的推理线程数，默认平分 CPU 核数
+OCR_CPU_THREADS = int(os.getenv('OCR_CPU_THREADS', str(max(1, (os.cpu_count() or 1) // max(OCR_WORKERS, 1)))))
+# CPU 推理调优：MKL-DNN(oneDNN) 加速及其 kernel 缓存容量（每种输入尺寸缓存一份）
+OCR_ENABLE_MKLDNN = os.getenv('OCR_ENABLE_MKLDNN', 'true').lower() == 'true'
+OCR_MKLDNN_CACHE_CAPACITY = int(os.getenv('OCR_MKLDNN_CACHE_CAPACITY', '10'))
+# 每个工作进程的 OpenMP / MKL / OpenBLAS 数学库线程数（默认与 OCR_CPU_THREADS 相同，避免多进程超额占用 CPU）
+OCR_MATH_THREADS = int(os.getenv('OCR_MATH_THREADS', os.getenv('OMP_NUM_THREADS', str(OCR_CPU_THREADS))))
+# int8 量化模型目录：配置后注册 int8 配置档（其余参数同 fast），模型名需与目录中的模型一致
+OCR_INT8_DET_MODEL_DIR = os.getenv('OCR_INT8_DET_MODEL_DIR', '')
+OCR_INT8_DET_MODEL_NAME = os.getenv('OCR_INT8_DET_MODEL_NAME', 'PP-OCRv5_mobile_det')
+OCR_INT8_REC_MODEL_DIR = os.getenv('OCR_INT8_REC_MODEL_DIR', '')
+OCR_INT8_REC_MODEL_NAME = os.getenv('OCR_INT8_REC_MODEL_NAME', 'PP-OCRv5_mobile_rec')
+# 启动自检：工作进程就绪后用合成图片测量各配置档的吞吐量（张/秒）
+OCR_BENCHMARK_ON_START = os.getenv('OCR_BENCHMARK_ON_START', 'true').lower() == 'true'
+OCR_BENCHMARK_IMAGES = int(os.getenv('OCR_BENCHMARK_IMAGES', '16'))
+# 动态批处理：首个请求到达后最多等待的毫秒数，以及单批最多图片数
+OCR_BATCH_WINDOW_MS = float(os.getenv('OCR_BATCH_WINDOW_MS', '10'))
+OCR_MAX_BATCH = int(os.getenv('OCR_MAX_BATCH', '8'))
+# 工作进程识别一批图片的超时（秒），超时视为卡死并重启
+OCR_TASK_TIMEOUT = float(os.getenv('OCR_TASK_TIMEOUT', '120'))
+# 请求在队列中等待空闲工作进程的时间预算（秒）；请求端最多等待 排队 + 识别 两段时间
+OCR_QUEUE_TIMEOUT = float(os.getenv('OCR_QUEUE_TIMEOUT', '60'))
+OCR_REQUEST_TIMEOUT = OCR_QUEUE_TIMEOUT + OCR_TASK_TIMEOUT
+# /ocr/batch 单次请求最多图片数
+OCR_BATCH_MAX_IMAGES = int(os.getenv('OCR_BATCH_MAX_IMAGES', '32'))
+
+# 模型配置档：fast（移动版模型、不做方向分类、限制检测边长，适合正向截图）/ accurate（服务器版模型 + 文本行方向分类）
+# OCR_PROFILES 为每个工作进程预加载的配置档，请求用 profile 参数选择
+OCR_PROFILES = [name.strip() for name in os.getenv('OCR_PROFILES', 'accurate,fast').split(',') if name.strip()]
+OCR_DEFAULT_PROFILE = os.getenv('OCR_DEFAULT_PROFILE', 'accurate')
+OCR_FAST_DET_SIDE = int(os.getenv('OCR_FAST_DET_SIDE', '960'))
+
+# 识别结果缓存（按图片内容哈希 + 识别参数寻址，只缓存紧凑格式）：内存 LRU + 磁盘
+OCR_CACHE_ENABLED = os.getenv('OCR_CACHE_ENABLED', 'true').lower() == 'true'
+OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'))
+OCR_CACHE_MAX_ENTRIES = int(os.getenv('OCR_CACHE_MAX_ENTRIES', '2000'))
+OCR_CACHE_MEMORY_MB = float(os.getenv('OCR_CACHE_MEMORY_MB', '64'))
+OCR_CACHE_DISK_MB = float(os.getenv('OCR_CACHE_DISK_MB', '512'))  # 0 表示不落盘
+# 升级模型或识别逻辑后修改此值，旧缓存自动失效
+OCR_CACHE_VERSION = os.getenv('OCR_CACHE_VERSION', '1')
+# 管理接口令牌（请求头 X-Admin-Token）；未设置时只允许本机访问
+OCR_ADMIN_TOKEN = os.getenv('OCR_ADMIN_TOKEN', '')
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": ALLOWED_ORIGINS}})
 
-# 初始化OCR引擎
-logger.info("🚀 初始化PaddleOCR (CPU模式)...")
-try:
-    ocr = PaddleOCR(
-        use_textline_orientation=True,  # 替代 use_angle_cls
-        lang='ch'                       # 支持中英文
-        # PaddleOCR 3.2.0 已移除 use_gpu 和 show_log 参数
-        # CPU/GPU 通过环境变量 CUDA_VISIBLE_DEVICES 控制
-    )
-    logger.info("✅ PaddleOCR初始化完成 (CPU模式)")
-except Exception as e:
-    logger.error(f"❌ PaddleOCR初始化失败: {e}")
-    raise
+# 各配置档的 PaddleOCR 参数
+PROFILE_CONFIGS = {
+    'accurate': {
+        'use_textline_orientation': True,  # 替代 use_angle_cls
+        'lang': 'ch',                      # 支持中英文
+    },
+    'fast': {
+        'text_detection_model_name': 'PP-OCRv5_mobile_det',
+        'text_recognition_model_name': 'PP-OCRv5_mobile_rec',
+        'use_textline_orientation': False,
+        'use_doc_orientation_classify': False,
+        'use_doc_unwarping': False,
+        # 检测图长边限制在 OCR_FAST_DET_SIDE 以内
+        'text_det_limit_type': 'max',
+        'text_det_limit_side_len': OCR_FAST_DET_SIDE,
+    },
+}
+
+# int8 量化模型配置档
+if OCR_INT8_DET_MODEL_DIR or OCR_INT8_REC_MODEL_DIR:
+    PROFILE_CONFIGS['int8'] = dict(PROFILE_CONFIGS['fast'])
+    if OCR_INT8_DET_MODEL_DIR:
+        PROFILE_CONFIGS['int8'].update(text_detection_model_name=OCR_INT8_DET_MODEL_NAME,
+                                       text_detection_model_dir=OCR_INT8_DET_MODEL_DIR)
+    if OCR_INT8_REC_MODEL_DIR:
+        PROFILE_CONFIGS['int8'].update(text_recognition_model_name=OCR_INT8_REC_MODEL_NAME,
+                                       text_recognition_model_dir=OCR_INT8_REC_MODEL_DIR)
+
+unknown_profiles = [name for name in OCR_PROFILES + [OCR_DEFAULT_PROFILE] if name not in PROFILE_CONFIGS]
+if unknown_profiles:
+    raise ValueError(f"未知的 OCR 配置档: {', '.join(unknown_profiles)} (可选: {', '.join(PROFILE_CONFIGS)})")
+if OCR_DEFAULT_PROFILE not in OCR_PROFILES:
+    OCR_PROFILES.insert(0, OCR_DEFAULT_PROFILE)
+
+
+# 工作进程由 spawn 启动并继承环境变量：在子进程导入 paddle 之前限定数学库线程数
+for _var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+    os.environ[_var] = str(OCR_MATH_THREADS)
+
+
+def cpu_settings():
+    """当前生效的 CPU 推理设置（/health 与启动日志使用）"""
+    return {
+        'cpu_count': os.cpu_count(),
+        'enable_mkldnn': OCR_ENABLE_MKLDNN,
+        'mkldnn_cache_capacity': OCR_MKLDNN_CACHE_CAPACITY,
+        'cpu_threads': OCR_CPU_THREADS,
+        'math_threads': OCR_MATH_THREADS,
+        'int8': {
+            'enabled': 'int8' in PROFILE_CONFIGS,
+            'det_model': f"{OCR_INT8_DET_MODEL_NAME} ({OCR_INT8_DET_MODEL_DIR})" if OCR_INT8_DET_MODEL_DIR else None,
+            'rec_model': f"{OCR_INT8_REC_MODEL_NAME} ({OCR_INT8_REC_MODEL_DIR})" if OCR_INT8_REC_MODEL_DIR else None
+        }
+    }
+
+
+def create_ocr_engine(profile=OCR_DEFAULT_PROFILE, cpu_threads=None):
+    """创建一个 PaddleOCR 实例"""
+    kwargs = {'enable_mkldnn': OCR_ENABLE_MKLDNN, 'mkldnn_cache_capacity': OCR_MKLDNN_CACHE_CAPACITY}
+    if cpu_threads:
+        kwargs['cpu_threads'] = cpu_threads
+    # PaddleOCR 3.2.0 已移除 use_gpu 和 show_log 参数
+    # CPU/GPU 通过环境变量 CUDA_VISIBLE_DEVICES 控制
+    return PaddleOCR(**PROFILE_CONFIGS[profile], **kwargs)
+
+
+# ========== OCR 工作进程池 ==========
+def _export_result(res, full):
+    """把单张图片的识别结果转成可跨进程传输的结构"""
+    if full:
+        return serialize_ocr_result([res])[0]
+    items = list(iter_ocr_items([res]))
+    return {
+        'rec_texts': [text for text, _, _ in items],
+        'rec_scores': [score for _, score, _ in items],
+        'rec_polys': [points for _, _, points in items]
+    }
+
+
+def _worker_main(worker_id, conn, cpu_threads, profiles):
+    """工作进程：为每个配置档预加载一个 PaddleOCR 实例，每次接收同一配置档的一批图片，一次 predict 识别"""
+    engines = {}
+    for profile in profiles:
+        try:
+            engines[profile] = create_ocr_engine(profile, cpu_threads)
+        except Exception as e:
+            conn.send(('error', f"PaddleOCR初始化失败 ({profile}): {e}"))
+            return
+    conn.send(('ready', os.getpid()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        profile, batch = message
+        engine = engines[profile]
+        try:
+            results = list(engine.predict([image for image, _ in batch]))
+            conn.send([('ok', _export_result(res, full)) for res, (_, full) in zip(results, batch)])
+        except Exception as e:
+            if len(batch) == 1:
+                conn.send([('error', f"{type(e).__name__}: {e}")])
+                continue
+            # 整批失败时逐张重试，避免一张坏图拖累同批的其他请求
+            replies = []
+            for image, full in batch:
+                try:
+                    replies.append(('ok', _export_result(list(engine.predict(image))[0], full)))
+                except Exception as item_error:
+                    replies.append(('error', f"{type(item_error).__name__}: {item_error}"))
+            conn.send(replies)
+
+
+class _Task:
+    __slots__ = ('image', 'full', 'profile', 'future', 'enqueued_at', 'attempts')
+
+    def __init__(self, image, full, profile):
+        self.image = image
+        self.full = full
+        self.profile = profile
+        self.future = Future()
+        self.enqueued_at = time.time()
+        self.attempts = 0
+
+
+class OCRWorkerPool:
+    """
+    OCR 工作进程池
+
+    - N 个工作进程各自为每个配置档持有一个 PaddleOCR 实例（spawn 启动，推理线程数由 cpu_threads 控制）
+    - 请求进入共享队列；空闲进程取任务时，在首个任务到达后的 batch_window 内凑齐一批（同一配置档），一次 predict 识别
+    - 工作进程崩溃后自动重启，未完成的任务重新排队一次
+    - 记录队列深度、批大小、排队耗时和重启次数
+    """
+
+    MAX_ATTEMPTS = 2
+
+    def __init__(self, size=OCR_WORKERS, cpu_threads=OCR_CPU_THREADS,
+                 batch_window=OCR_BATCH_WINDOW_MS / 1000, max_batch=OCR_MAX_BATCH, profiles=OCR_PROFILES):
+        self.size = max(size, 1)
+        self.cpu_threads = cpu_threads
+        self.profiles = list(profiles)
+        self.batch_window = batch_window
+        self.max_batch = max(max_batch, 1)
+        self._ctx = multiprocessing.get_context('spawn')
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._workers = [
+            {'id': i, 'process': None, 'conn': None, 'ready': False, 'busy': False,
+             'batches': 0, 'restarts': 0}
+            for i in range(self.size)
+        ]
+        self._started = False
+        # 指标
+        self.max_queue_depth = 0
+        self.batches = 0
+        self.images = 0
+        self.profile_images = {profile: 0 for profile in self.profiles}
+        self.batch_sizes = {}
+        self.total_wait = 0.0
+        self.errors = 0
+
+    # ---------- 对外接口 ----------
+
+    def start(self):
+        """启动所有工作进程（每个进程由一个 feeder 线程负责喂数据和重启）"""
+        if self._started:
+            return
+        self._started = True
+        logger.info(f"🚀 启动 OCR 工作进程池: {self.size} 个进程 × {self.cpu_threads} 线程, "
+                    f"配置档 {', '.join(self.profiles)}, "
+                    f"批处理窗口 {self.batch_window * 1000:.0f}ms, 单批 ≤{self.max_batch}")
+        for worker in self._workers:
+            threading.Thread(target=self._feed_loop, args=(worker,), name=f"ocr-feeder-{worker['id']}",
+                             daemon=True).start()
+
+    def submit(self, image, full=False, profile=OCR_DEFAULT_PROFILE):
+        """提交一张图片，返回 Future（结果为单张图片的识别结果 dict）"""
+        if profile not in self.profiles:
+            raise ValueError(f"OCR 配置档未加载: {profile}")
+        task = _Task(image, full, profile)
+        with self._cond:
+            self._pending.append(task)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+            self._cond.notify()
+        return task.future
+
+    def predict(self, image, full=False, profile=OCR_DEFAULT_PROFILE, timeout=OCR_REQUEST_TIMEOUT):
+        """识别一张图片，返回与 ocr.predict() 相同结构的列表"""
+        return [self.wait(self.submit(image, full, profile), timeout)]
+
+    def wait(self, future, timeout=OCR_REQUEST_TIMEOUT):
+        """
+        等待 submit() 返回的 Future；超时后取消尚未被取走的任务
+
+        Raises:
+            RuntimeError: 排队 + 识别超过 timeout 秒
+        """
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            with self._cond:
+                queue_depth = len(self._pending)
+            busy = sum(1 for worker in self._workers if worker['busy'])
+            raise RuntimeError(f"OCR 排队/识别超时: {timeout:.0f}s 内未完成 "
+                               f"(队列深度 {queue_depth}, 忙碌进程 {busy}/{self.size})") from None
+
+    def ready_count(self):
+        return sum(1 for worker in self._workers if worker['ready'])
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.size,
+                'ready_workers': self.ready_count(),
+                'busy_workers': sum(1 for worker in self._workers if worker['busy']),
+                'cpu_threads': self.cpu_threads,
+                'profiles': self.profiles,
+                'queue_depth': len(self._pending),
+                'max_queue_depth': self.max_queue_depth,
+                'batches': self.batches,
+                'images': self.images,
+                'profile_images': dict(self.profile_images),
+                'avg_batch_size': round(self.images / self.batches, 2) if self.batches else None,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'avg_queue_wait_ms': round(self.total_wait / self.images * 1000, 1) if self.images else None,
+                'errors': self.errors,
+                'restarts': sum(worker['restarts'] for worker in self._workers),
+                'processes': [
+                    {'id': w['id'], 'pid': w['process'].pid if w['process'] else None,
+                     'ready': w['ready'], 'busy': w['busy'], 'batches': w['batches'], 'restarts': w['restarts']}
+                    for w in self._workers
+                ]
+            }
+
+    # ---------- 内部实现 ----------
+
+    def _spawn(self, worker):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main, args=(worker['id'], child_conn, self.cpu_threads, self.profiles),
+            name=f"ocr-worker-{worker['id']}", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker['process'], worker['conn'] = process, parent_conn
+
+        status, detail = parent_conn.recv()
+        if status != 'ready':
+            raise RuntimeError(detail)
+        worker['ready'] = True
+        logger.info(f"✅ OCR 工作进程 #{worker['id']} 就绪 (pid={detail})")
+
+    def _discard(self, worker):
+        worker['ready'] = False
+        if worker['conn'] is not None:
+            worker['conn'].close()
+        if worker['process'] is not None:
+            worker['process'].join(timeout=1)
+            if worker['process'].is_alive():
+                worker['process'].kill()
+        worker['process'], worker['conn'] = None, None
+
+    def _next_batch(self):
+        """取下一批任务：等待首个任务，再在批处理窗口内尽量凑满（只取与首个任务相同配置档的任务）"""
+        with self._cond:
+            batch = []
+            while not batch:
+                self._cond.wait_for(lambda: self._pending)
+                deadline = self._pending[0].enqueued_at + self.batch_window
+                while 0 < len(self._pending) < self.max_batch:
+                    remaining = deadline - time.time()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        break
+                # 等待期间任务可能已被其他进程取走，取空时重新等待
+                if not self._pending:
+                    continue
+                profile = self._pending[0].profile
+                others = []
+                while self._pending and len(batch) < self.max_batch:
+                    task = self._pending.popleft()
+                    if task.future.cancelled():
+                        continue  # 请求端已超时放弃
+                    (batch if task.profile == profile else others).append(task)
+                # 其他配置档的任务按原顺序放回队首，并唤醒其他空闲进程
+                if others:
+                    self._pending.extendleft(reversed(others))
+                    self._cond.notify()
+
+            now = time.time()
+            self.batches += 1
+            self.images += len(batch)
+            self.profile_images[batch[0].profile] += len(batch)
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            self.total_wait += sum(now - task.enqueued_at for task in batch)
+            return batch
+
+    def _requeue(self, batch, error):
+        """工作进程崩溃：未超过重试次数的任务放回队首，其余返回错误"""
+        retry = []
+        for task in batch:
+            if task.future.done():
+                continue
+            task.attempts += 1
+            if task.attempts < self.MAX_ATTEMPTS:
+                retry.append(task)
+            else:
+                task.future.set_exception(RuntimeError(error))
+        with self._cond:
+            self._pending.extendleft(reversed(retry))
+            self._cond.notify_all()
+
+    def _fail(self, batch, error):
+        """以错误结束批次中尚未完成的任务"""
+        for task in batch:
+            if not task.future.done():
+                task.future.set_exception(RuntimeError(error))
+
+    def _feed_loop(self, worker):
+        while True:
+            if worker['conn'] is None:
+                try:
+                    self._spawn(worker)
+                except Exception as e:
+                    logger.error(f"❌ OCR 工作进程 #{worker['id']} 启动失败: {e}，5 秒后重试")
+                    self._discard(worker)
+                    time.sleep(5)
+                    continue
+
+            batch = self._next_batch()
+            worker['busy'] = True
+            try:
+                conn = worker['conn']
+                conn.send((batch[0].profile, [(task.image, task.full) for task in batch]))
+                # 工作进程卡住（既不退出也不回复）时按崩溃处理，否则该进程会永久占用一个位置
+                if not conn.poll(OCR_TASK_TIMEOUT):
+                    raise TimeoutError(f"{OCR_TASK_TIMEOUT:.0f}s 内无响应")
+                replies = conn.recv()
+            except TimeoutError as e:
+                logger.error(f"⏱️ OCR 工作进程 #{worker['id']} {e}，重启中...")
+                worker['restarts'] += 1
+                self.errors += 1
+                self._discard(worker)
+                self._requeue(batch, f"OCR 工作进程无响应: {e}")
+                continue
+            except (EOFError, OSError) as e:
+                exitcode = worker['process'].exitcode if worker['process'] else None
+                logger.error(f"💥 OCR 工作进程 #{worker['id']} 异常退出 (exitcode={exitcode})，重启中...")
+                worker['restarts'] += 1
+                self.errors += 1
+                self._discard(worker)
+                self._requeue(batch, f"OCR 工作进程异常退出: {e or exitcode}")
+                continue
+            except Exception as e:
+                # 其他异常（如数据无法序列化）：管道状态不可信，重启进程并让本批任务失败，送料线程继续运行
+                logger.error(f"❌ OCR 工作进程 #{worker['id']} 通信失败: {e}，重启中...", exc_info=True)
+                worker['restarts'] += 1
+                self.errors += 1
+                self._discard(worker)
+                self._fail(batch, f"OCR 工作进程通信失败: {e}")
+                continue
+            finally:
+                worker['busy'] = False
+
+            worker['batches'] += 1
+            try:
+                for task, (status, result) in zip(batch, replies):
+                    if task.future.done():
+                        continue
+                    if status == 'ok':
+                        task.future.set_result(result)
+                    else:
+                        self.errors += 1
+                        task.future.set_exception(RuntimeError(result))
+            except Exception as e:
+                logger.error(f"❌ OCR 工作进程 #{worker['id']} 返回结果无效: {e}")
+                self.errors += 1
+            # 返回条数不足等情况下，剩余任务不能一直挂起
+            self._fail(batch, "OCR 工作进程未返回结果")
+
+
+# ========== 启动自检 ==========
+benchmark_result = {'status': 'disabled' if not OCR_BENCHMARK_ON_START else 'pending'}
+
+
+def _benchmark_image(index, width=960, height=540):
+    """合成一张多行文字的测试图"""
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    for row in range(8):
+        cv2.putText(image, f"Benchmark {index:03d}-{row} The quick brown fox 0123456789",
+                    (24, 48 + row * 62), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+    return image
+
+
+def run_startup_benchmark(pool, images=OCR_BENCHMARK_IMAGES, ready_timeout=600):
+    """
+    等待工作进程全部就绪后，用合成图片测量各配置档的吞吐量并写入 benchmark_result
+
+    每个配置档先预热（MKL-DNN 首次推理需要生成 kernel），再并发提交 images 张图片计时
+    """
+    deadline = time.time() + ready_timeout
+    while pool.ready_count() < pool.size:
+        if time.time() > deadline:
+            benchmark_result.update(status='failed', error='工作进程未就绪')
+            logger.warning("⚠️ 启动自检跳过: 工作进程未就绪")
+            return
+        time.sleep(1)
+
+    benchmark_result['status'] = 'running'
+    settings = cpu_settings()
+    profiles = {}
+    try:
+        for profile in pool.profiles:
+            warmup = [pool.submit(_benchmark_image(i), profile=profile) for i in range(pool.size)]
+            for future in warmup:
+                pool.wait(future)
+
+            start = time.time()
+            futures = [pool.submit(_benchmark_image(i), profile=profile) for i in range(images)]
+            for future in futures:
+                pool.wait(future)
+            elapsed = time.time() - start
+            profiles[profile] = {
+                'images': images,
+                'seconds': round(elapsed, 3),
+                'images_per_sec': round(images / elapsed, 2)
+            }
+            logger.info(f"📈 启动自检 [{profile}]: {images} 张 960x540 图片 {elapsed:.2f}s, "
+                        f"{images / elapsed:.2f} 张/秒 ({pool.size} 进程 × {settings['cpu_threads']} 线程, "
+                        f"mkldnn={settings['enable_mkldnn']}, 数学库线程 {settings['math_threads']})")
+    except Exception as e:
+        benchmark_result.update(status='failed', error=str(e), profiles=profiles)
+        logger.warning(f"⚠️ 启动自检失败: {e}")
+        return
+    benchmark_result.update(status='done', profiles=profiles, finished_at=datetime.now().isoformat())
+
+
+# 初始化OCR工作进程池（spawn 出的子进程也会导入本模块，只在主进程启动）
+pool = OCRWorkerPool()
+if multiprocessing.current_process().name == 'MainProcess':
+    pool.start()
+    if OCR_BENCHMARK_ON_START:
+        threading.Thread(target=run_startup_benchmark, args=(pool,), name='ocr-benchmark', daemon=True).start()
+
+# ========== 链路追踪 ==========
+# 与 translator_api 约定的请求头：X-Trace-Id 传入 trace，X-Trace-Spans 回传阶段耗时
+TRACE_HEADER = 'X-Trace-Id'
+SPANS_HEADER = 'X-Trace-Spans'
+SERVICE_NAME = 'ocr'
+
+
+class StageTimer:
+    """记录单个请求内各阶段的耗时"""
+
+    def __init__(self):
+        self.spans = []
+
+    def record(self, name, start, end=None, **attrs):
+        end = end if end is not None else time.time()
+        span = {
+            'name': name,
+            'service': SERVICE_NAME,
+            'start': round(start, 6),
+            'duration_ms': round((end - start) * 1000, 1)
+        }
+        if attrs:
+            span['attrs'] = attrs
+        self.spans.append(span)
+        return end
+
+    def attach(self, response, request_id):
+        """把 trace_id 和 spans 写入响应头"""
+        response.headers[TRACE_HEADER] = request_id
+        response.headers[SPANS_HEADER] = json.dumps(self.spans)
+        return response
+
 
 def image_from_base64(base64_str):
-    """从base64字符串解码图像，支持所有常见格式（PNG、JPG、GIF、WEBP等）"""
+    """从base64字符串解码图像（兼容旧版 JSON 接口）"""
+    return image_from_bytes(bytes_from_base64(base64_str))
+
+
+def bytes_from_base64(base64_str):
+    """base64 字符串（可带 data URL 前缀）转为原始字节"""
     try:
         # 处理 data URL 格式 (data:image/jpeg;base64,...)
         if base64_str.startswith('data:image'):
@@ -55,7 +589,16 @@ def image_from_base64(base64_str):
         # 解码base64
         image_bytes = base64.b64decode(base64_str)
         logger.info(f"Base64解码成功，字节长度: {len(image_bytes)}")
-        
+    except base64.binascii.Error as e:
+        logger.error(f"Base64解码错误: {e}")
+        raise ValueError(f"Base64格式错误: {str(e)}")
+    
+    return image_bytes
+
+
+def image_from_bytes(image_bytes):
+    """从原始字节解码图像，支持所有常见格式（PNG、JPG、GIF、WEBP等）"""
+    try:
         # 方法1: 尝试使用OpenCV直接解码
         image_array = np.frombuffer(image_bytes, np.uint8)
         image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
@@ -99,13 +642,113 @@ def image_from_base64(base64_str):
             logger.error(f"PIL处理失败: {pil_error}")
             raise ValueError(f"图像解码失败: OpenCV和PIL都无法解码")
         
-    except base64.binascii.Error as e:
-        logger.error(f"Base64解码错误: {e}")
-        raise ValueError(f"Base64格式错误: {str(e)}")
+    except ValueError:
+        raise
     except Exception as e:
         logger.error(f"图像处理错误: {e}", exc_info=True)
         raise ValueError(f"图像处理失败: {str(e)}")
 
+# IMREAD_REDUCED_* 解码倍数，从大到小尝试
+_REDUCED_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2)
+]
+
+
+def _image_size(image_bytes):
+    """只读取文件头获取图像尺寸 (w, h)，失败返回 None"""
+    try:
+        from PIL import Image
+        import io
+        return Image.open(io.BytesIO(image_bytes)).size
+    except Exception:
+        return None
+
+
+def should_tile(w, h, force=False):
+    """是否分块识别：超大图或超长图（force 时只要超过一个块就分块）"""
+    long_side, short_side = max(w, h), min(w, h)
+    if long_side <= OCR_TILE_SIZE:
+        return False
+    if force:
+        return True
+    return long_side > OCR_TILE_THRESHOLD or long_side / max(short_side, 1) >= OCR_TILE_ASPECT
+
+
+def decode_for_ocr(image_bytes, max_side=OCR_MAX_SIDE, tile=None):
+    """
+    解码图像并按缩放策略缩小
+
+    - 普通图片：长边限制在 max_side 以内
+    - 分块识别的图片：短边限制在 max_side 以内（长图按长边缩放会把文字压得太小）
+
+    大尺寸 JPEG 优先用 IMREAD_REDUCED_* 以缩小的分辨率解码，剩余部分再用 INTER_AREA 缩放
+
+    Args:
+        tile: None 按尺寸自动判断是否分块，True 强制分块，False 不分块
+
+    Returns:
+        (image, original_size, tiled)：original_size 为原图尺寸 (w, h)，用于还原坐标
+    """
+    image = None
+    original_size = None
+    size = _image_size(image_bytes) if (max_side or tile is not False) else None
+    tiled = tile is not False and OCR_TILE_ENABLED and bool(size) and should_tile(*size, force=bool(tile))
+
+    def limited_side(w, h):
+        return min(w, h) if tiled else max(w, h)
+
+    if max_side and OCR_REDUCED_DECODE and size and image_bytes[:2] == b'\xff\xd8':
+        if limited_side(*size) > max_side:
+            for factor, flag in _REDUCED_FLAGS:
+                if limited_side(*size) / factor >= max_side:
+                    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+                    if image is not None:
+                        # 文件头尺寸不含 EXIF 旋转，方向与解码结果不一致时交换
+                        w, h = size
+                        if (image.shape[1] > image.shape[0]) != (w > h):
+                            w, h = h, w
+                        original_size = (w, h)
+                        logger.info(f"✓ 缩小解码 1/{factor}: {w}x{h} -> {image.shape[1]}x{image.shape[0]}")
+                    break
+
+    if image is None:
+        image = image_from_bytes(image_bytes)
+        original_size = (image.shape[1], image.shape[0])
+        if size is None and tile is not False and OCR_TILE_ENABLED:
+            tiled = should_tile(*original_size, force=bool(tile))
+
+    h, w = image.shape[:2]
+    if max_side and limited_side(w, h) > max_side:
+        ratio = max_side / limited_side(w, h)
+        size = (max(1, round(w * ratio)), max(1, round(h * ratio)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    return image, original_size, tiled
+
+
+def restore_coordinates(values, sx, sy):
+    """把缩小后图像上的坐标（x / y 交替排列，任意形状）按比例还原到原图"""
+    arr = np.asarray(values, dtype=np.float64)
+    if arr.size == 0:
+        return arr.astype(np.int32)
+    restored = arr.reshape(-1, 2) * (sx, sy)
+    return np.rint(restored).astype(np.int32).reshape(arr.shape)
+
+
+def restore_serialized_coordinates(serialized_result, sx, sy):
+    """还原完整格式结果中的 dt_polys / rec_polys / rec_boxes"""
+    for res_dict in serialized_result:
+        res = res_dict.get('res') if isinstance(res_dict, dict) else None
+        if not isinstance(res, dict):
+            continue
+        for key in ('dt_polys', 'rec_polys', 'rec_boxes'):
+            if res.get(key):
+                res[key] = [restore_coordinates(item, sx, sy).tolist() for item in res[key]]
+    return serialized_result
+
+
 def serialize_ocr_result(result):
     """将OCR结果序列化为可JSON化的格式"""
     serialized_results = []
@@ -358,145 +1001,932 @@ def filter_ocr_by_language_v2(ocr_results, target_lang='zh'):
     return filtered_results
 
 
+# ========== 紧凑响应格式 ==========
+# format=compact 时只返回文本、置信度和多边形，多边形打包成扁平的 int32 数组：
+#   poly_encoding=json    -> data 为整数列表
+#   poly_encoding=base64  -> data 为小端 int32 字节的 base64 字符串
+#   poly_encoding=msgpack -> 整个响应以 msgpack 返回，data 为原始字节（需安装 msgpack）
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+POLY_ENCODINGS = ('json', 'base64', 'msgpack')
+
+
+def _first_present(data, keys):
+    """按顺序返回第一个非空字段（兼容 numpy 数组，不能直接用 or）"""
+    for key in keys:
+        value = data.get(key)
+        if value is not None and len(value) > 0:
+            return value
+    return []
+
+
+def iter_ocr_items(raw_result):
+    """
+    逐条取出 OCR 结果中的 (text, score, points)，points 为 N×2 的 int32 数组
+
+    兼容 PaddleOCR 3.x 的结果对象（dict）、{'res': {...}} 结构和旧版带 .json 的对象；空文本和没有框的文本被跳过
+    """
+    for res in raw_result or []:
+        # PaddleOCR 3.x 的结果本身是 dict，旧版本 / 其他对象退回 .json
+        data = res if isinstance(res, dict) else (getattr(res, 'json', None) or {})
+        if isinstance(data.get('res'), dict):
+            data = data['res']
+
+        page_texts = data.get('rec_texts') or []
+        page_scores = _first_present(data, ['rec_scores'])
+        # rec_polys 与 rec_texts 一一对应，dt_polys 可能包含被识别阶段丢弃的框
+        polys = _first_present(data, ['rec_polys', 'dt_polys'])
+        boxes = _first_present(data, ['rec_boxes']) if len(polys) == 0 else []
+
+        for i, text in enumerate(page_texts):
+            if not text or not text.strip():
+                continue
+            if i < len(polys):
+                points = np.asarray(polys[i], dtype=np.int32).reshape(-1, 2)
+            elif i < len(boxes):
+                x1, y1, x2, y2 = (int(v) for v in boxes[i][:4])
+                points = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.int32)
+            else:
+                continue
+            score = float(page_scores[i]) if i < len(page_scores) else 0.0
+            yield text, score, points
+
+
+def compact_ocr_result(raw_result, target_lang=None):
+    """
+    直接从 PaddleOCR 原始结果提取紧凑结果（跳过完整序列化）
+
+    Args:
+        raw_result: ocr.predict() 的返回值
+        target_lang: 不为空时只保留该语言的文本
+
+    Returns:
+        (texts, scores, flat, counts)：flat 为所有多边形顶点拼接成的 int32 数组，
+        counts 为每个多边形的顶点数
+    """
+    texts, scores, chunks, counts = [], [], [], []
+    dropped = 0
+
+    for text, score, points in iter_ocr_items(raw_result):
+        if target_lang and detect_text_language(text) != target_lang:
+            dropped += 1
+            continue
+        texts.append(text)
+        scores.append(round(score, 4))
+        chunks.append(points.ravel())
+        counts.append(len(points))
+
+    if target_lang:
+        logger.info(f"🔍 过滤结果: {len(texts) + dropped} 个文本 → {len(texts)} 个 {target_lang.upper()} 文本")
+
+    flat = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int32)
+    return texts, scores, flat, counts
+
+
+def pack_polys(flat, counts, encoding):
+    """把扁平的多边形数组按指定方式编码"""
+    packed = {'dtype': 'int32', 'encoding': encoding, 'count': len(counts)}
+    # 绝大多数是四边形，顶点数一致时只写一个数字
+    if counts and all(c == counts[0] for c in counts):
+        packed['points_per_poly'] = counts[0]
+    else:
+        packed['counts'] = counts
+
+    if encoding == 'json':
+        packed['data'] = flat.tolist()
+    else:
+        raw = flat.astype('<i4').tobytes()
+        packed['data'] = raw if encoding == 'msgpack' else base64.b64encode(raw).decode('ascii')
+    return packed
+
+
+# ========== 分块识别 ==========
+def tile_starts(length, tile=OCR_TILE_SIZE, overlap=OCR_TILE_OVERLAP):
+    """一个方向上各块的起点（相邻块重叠 overlap 像素，最后一块贴齐边缘）"""
+    if length <= tile:
+        return [0]
+    step = max(tile - overlap, 1)
+    return list(range(0, length - tile, step)) + [length - tile]
+
+
+def _tile_items(raw, image_shape, x0, y0, w, h):
+    """把一个块的识别结果转换为全图坐标下的条目，并标记贴着接缝（可能被切断）的边"""
+    img_h, img_w = image_shape[:2]
+    seams = {
+        'left': x0 > 0, 'top': y0 > 0,
+        'right': x0 + w < img_w, 'bottom': y0 + h < img_h
+    }
+    items = []
+    for text, score, points in iter_ocr_items(raw):
+        points = points + (x0, y0)
+        x1, y1 = points.min(axis=0)
+        x2, y2 = points.max(axis=0)
+        # 贴着接缝的框可能被切断
+        cut = {
+            'left': seams['left'] and x1 - x0 <= 2,
+            'top': seams['top'] and y1 - y0 <= 2,
+            'right': seams['right'] and x0 + w - x2 <= 2,
+            'bottom': seams['bottom'] and y0 + h - y2 <= 2
+        }
+        items.append({
+            'text': text, 'score': score, 'points': points,
+            'rect': (int(x1), int(y1), int(x2), int(y2)),
+            'cut': cut, 'tile': (x0, y0)
+        })
+    return items
+
+
+def _join_fragments(left, right):
+    """拼接跨接缝的两段文字，去掉重叠区域重复识别的部分"""
+    for k in range(min(len(left), len(right)), 0, -1):
+        if left.endswith(right[:k]):
+            return left + right[k:]
+    return left + right
+
+
+def merge_tile_items(items):
+    """
+    合并各块的识别结果
+
+    - 横跨左右接缝、两边都被切断的同一行：合并为一个框，文字去重后拼接
+      （两段都落在重叠区域内，面积重叠率很高，必须先于重复判断，否则较短的一段会被当作重复丢弃）
+    - 重叠区域内重复识别的同一行（最多一边在共同接缝处被切断）：保留没有被接缝切断的
+      （其次文字更长、置信度更高的）
+    """
+    def area(r):
+        return max(r[2] - r[0], 0) * max(r[3] - r[1], 0)
+
+    def quality(item):
+        return (-sum(item['cut'].values()), len(item['text']), item['score'])
+
+    items = sorted(items, key=lambda it: (it['rect'][1], it['rect'][0]))
+    merged = []
+    for item in items:
+        for i, kept in enumerate(merged):
+            if kept['tile'] == item['tile']:
+                continue
+            a, b = kept['rect'], item['rect']
+            inter = (max(min(a[2], b[2]) - max(a[0], b[0]), 0) *
+                     max(min(a[3], b[3]) - max(a[1], b[1]), 0))
+            if inter == 0:
+                continue
+
+            # 同一行（垂直方向大部分重叠）且在接缝处相接
+            overlap_h = min(a[3], b[3]) - max(a[1], b[1])
+            same_row = overlap_h >= 0.6 * min(a[3] - a[1], b[3] - b[1])
+            first, second = (kept, item) if a[0] <= b[0] else (item, kept)
+            both_cut = first['cut']['right'] and second['cut']['left']
+            if same_row and both_cut:
+                x1, y1 = min(a[0], b[0]), min(a[1], b[1])
+                x2, y2 = max(a[2], b[2]), max(a[3], b[3])
+                merged[i] = {
+                    'text': _join_fragments(first['text'], second['text']),
+                    'score': min(first['score'], second['score']),
+                    'points': np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.int32),
+                    'rect': (x1, y1, x2, y2),
+                    'cut': {**first['cut'], 'right': second['cut']['right']},
+                    'tile': None
+                }
+                break
+
+            if not both_cut and inter / max(min(area(a), area(b)), 1) >= 0.6:
+                if quality(item) > quality(kept):
+                    merged[i] = item
+                break
+        else:
+            merged.append(item)
+    return merged
+
+
+def ocr_tiled(image, request_id='', profile=OCR_DEFAULT_PROFILE):
+    """
+    分块识别：切成重叠的块交给工作进程池并行识别，合并为与 ocr.predict() 相同结构的结果
+
+    Returns:
+        ([{'res': {'rec_texts', 'rec_scores', 'rec_polys'}}], tile_count)
+    """
+    h, w = image.shape[:2]
+    tile_w, tile_h = min(OCR_TILE_SIZE, w), min(OCR_TILE_SIZE, h)
+    tiles = [(x0, y0) for y0 in tile_starts(h) for x0 in tile_starts(w)]
+    logger.info(f"[{request_id}] 🧩 分块识别: {w}x{h} -> {len(tiles)} 块 "
+                f"({tile_w}x{tile_h}, 重叠 {OCR_TILE_OVERLAP}px, 并行 {pool.size})")
+
+    futures = [
+        pool.submit(np.ascontiguousarray(image[y0:y0 + tile_h, x0:x0 + tile_w]), profile=profile)
+        for x0, y0 in tiles
+    ]
+    items = []
+    for (x0, y0), future in zip(tiles, futures):
+        raw = [pool.wait(future)]
+        items.extend(_tile_items(raw, image.shape, x0, y0, tile_w, tile_h))
+    merged = merge_tile_items(items)
+    logger.info(f"[{request_id}] 🧩 合并接缝: {len(items)} -> {len(merged)} 个文本")
+
+    return [{'res': {
+        'rec_texts': [item['text'] for item in merged],
+        'rec_scores': [item['score'] for item in merged],
+        'rec_polys': [item['points'].tolist() for item in merged]
+    }}], len(tiles)
+
+
+# ========== 识别结果缓存 ==========
+class OCRResultCache:
+    """
+    紧凑识别结果缓存
+
+    - 键：图片字节的 SHA-256 + 影响结果的参数（配置档、语言过滤、max_side、分块模式）+ 分块配置 / 缓存版本
+    - 内存 LRU（条目数和字节数双重上限）+ 磁盘（每个键一个 JSON 文件，按最近使用时间淘汰到字节上限）
+    - 相同图片同时到达时只识别一次，其余请求等待结果
+    """
+
+    def __init__(self, cache_dir=OCR_CACHE_DIR, max_entries=OCR_CACHE_MAX_ENTRIES,
+                 memory_mb=OCR_CACHE_MEMORY_MB, disk_mb=OCR_CACHE_DISK_MB, enabled=OCR_CACHE_ENABLED):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.memory_limit = int(memory_mb * 1024 * 1024)
+        self.disk_limit = int(disk_mb * 1024 * 1024)
+        self.enabled = enabled
+        self._memory = OrderedDict()  # key -> (entry, size)
+        self._memory_bytes = 0
+        self._disk = OrderedDict()    # key -> 文件字节数（按最近使用排序）
+        self._disk_bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.coalesced = 0
+        self.misses = 0
+        if self.enabled and self.disk_limit > 0:
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(image_bytes, options):
+        """缓存键：图片内容哈希 + 识别参数"""
+        target_lang = options['source_lang'] if (options['source_lang'] and options['filter_enabled']) else ''
+        tile = 'auto' if options['tile'] is None else str(options['tile']).lower()
+        parts = [
+            hashlib.sha256(image_bytes).hexdigest(),
+            options['profile'], target_lang, str(options['max_side']), tile,
+            f"{OCR_TILE_THRESHOLD}/{OCR_TILE_ASPECT}/{OCR_TILE_SIZE}/{OCR_TILE_OVERLAP}",
+            str(OCR_REDUCED_DECODE), OCR_CACHE_VERSION
+        ]
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+    # ---------- 磁盘 ----------
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_disk_index(self):
+        """启动时扫描缓存目录，按 mtime 建立磁盘索引"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            files = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.json')]
+        except OSError as e:
+            logger.warning(f"⚠️ OCR缓存目录不可用，只使用内存缓存: {e}")
+            self.disk_limit = 0
+            return
+        for entry in sorted(files, key=lambda e: e.stat().st_mtime):
+            size = entry.stat().st_size
+            self._disk[entry.name[:-5]] = size
+            self._disk_bytes += size
+        self._evict_disk()
+        if self._disk:
+            logger.info(f"✓ OCR缓存已加载: {len(self._disk)} 条 ({self._disk_bytes / 1024 / 1024:.1f} MB)")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            data['flat'] = np.frombuffer(base64.b64decode(data['flat']), dtype='<i4').astype(np.int32)
+            os.utime(self._path(key))
+            return data
+        except Exception as e:
+            logger.warning(f"⚠️ OCR缓存文件损坏，已丢弃: {key[:12]} ({e})")
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+            self._remove_file(key)
+            return None
+
+    def _write_disk(self, key, entry):
+        """原子写入（先写临时文件再 rename），随后淘汰超出上限的旧文件"""
+        path = self._path(key)
+        data = dict(entry, flat=base64.b64encode(entry['flat'].astype('<i4').tobytes()).decode('ascii'))
+        try:
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"⚠️ OCR缓存写入失败: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """淘汰最久未使用的磁盘条目（调用方需持有锁）"""
+        while self._disk and self._disk_bytes > self.disk_limit:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self._remove_file(key)
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    # ---------- 内存 ----------
+
+    @staticmethod
+    def _entry_size(entry):
+        """估算条目占用的内存字节数"""
+        return (entry['flat'].nbytes + sum(len(text.encode('utf-8')) + 64 for text in entry['texts'])
+                + 32 * len(entry['scores']) + 8 * len(entry['counts']) + 512)
+
+    def _remember(self, key, entry):
+        """放入内存 LRU（调用方需持有锁）"""
+        size = self._entry_size(entry)
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        self._memory[key] = (entry, size)
+        self._memory_bytes += size
+        while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.memory_limit):
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    # ---------- 查询 / 写入 ----------
+
+    def get(self, key):
+        """
+        查询缓存
+
+        Returns:
+            (entry, 'memory' | 'disk')，未命中时为 (None, None)
+        """
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                return cached[0], 'memory'
+            on_disk = key in self._disk
+            if on_disk:
+                self._disk.move_to_end(key)
+
+        if on_disk:
+            entry = self._read_disk(key)
+            if entry is not None:
+                with self._lock:
+                    self._remember(key, entry)
+                return entry, 'disk'
+        return None, None
+
+    def put(self, key, entry):
+        with self._lock:
+            self._remember(key, entry)
+        if self.disk_limit > 0:
+            self._write_disk(key, entry)
+
+    def get_or_compute(self, key, compute, timeout=OCR_REQUEST_TIMEOUT):
+        """
+        先查缓存，未命中时计算并写入；相同键正在计算时等待其结果
+
+        Returns:
+            (entry, source)：source 为 memory / disk / coalesced / computed
+        """
+        while True:
+            entry, source = self.get(key)
+            if entry is not None:
+                with self._lock:
+                    if source == 'memory':
+                        self.hits_memory += 1
+                    else:
+                        self.hits_disk += 1
+                return entry, source
+
+            with self._lock:
+                event = self._inflight.get(key)
+                if event is None:
+                    self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+
+            # 相同图片正在识别，等待后重新查缓存；对方失败则自己重新识别
+            if event.wait(timeout):
+                entry, _ = self.get(key)
+                if entry is not None:
+                    with self._lock:
+                        self.coalesced += 1
+                    return entry, 'coalesced'
+
+        try:
+            entry = compute()
+            self.put(key, entry)
+            return entry, 'computed'
+        finally:
+            with self._lock:
+                event = self._inflight.pop(key, None)
+            if event is not None:
+                event.set()
+
+    def flush(self):
+        """清空内存和磁盘缓存"""
+        with self._lock:
+            memory_entries = len(self._memory)
+            disk_keys = list(self._disk)
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._disk.clear()
+            self._disk_bytes = 0
+        for key in disk_keys:
+            self._remove_file(key)
+        logger.info(f"🧹 OCR缓存已清空: 内存 {memory_entries} 条, 磁盘 {len(disk_keys)} 条")
+        return {'memory_entries': memory_entries, 'disk_entries': len(disk_keys)}
+
+    def stats(self):
+        with self._lock:
+            hits = self.hits_memory + self.hits_disk + self.coalesced
+            total = hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'memory_limit_bytes': self.memory_limit,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+                'disk_limit_bytes': self.disk_limit,
+                'inflight': len(self._inflight),
+                'hits_memory': self.hits_memory,
+                'hits_disk': self.hits_disk,
+                'coalesced': self.coalesced,
+                'misses': self.misses,
+                'hit_ratio': round(hits / total, 3) if total else 0.0
+            }
+
+
+# 全局实例（spawn 出的工作进程不使用缓存）
+ocr_cache = OCRResultCache(enabled=OCR_CACHE_ENABLED and multiprocessing.current_process().name == 'MainProcess')
+
+
+def _flag(value):
+    """解析表单 / 查询参数中的布尔值"""
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def read_ocr_request():
+    """
+    解析 OCR 请求，支持三种传输方式：
+    - application/octet-stream 或 image/*：请求体即图片原始字节，参数放在查询字符串
+    - multipart/form-data：图片在 file（或 image）字段，参数放在表单或查询字符串
+    - application/json：image_base64 / url（旧接口，保持兼容）
+
+    Returns:
+        (image_bytes, image_base64, url, params)，三种图片来源只有一个非空
+
+    Raises:
+        ValueError: 请求格式不支持或缺少图片
+    """
+    mimetype = request.mimetype or ''
+    
+    if mimetype == 'application/octet-stream' or mimetype.startswith('image/'):
+        image_bytes = request.get_data(cache=False)
+        if not image_bytes:
+            raise ValueError('请求体为空')
+        return image_bytes, None, None, request.args.to_dict()
+    
+    if mimetype == 'multipart/form-data':
+        upload = request.files.get('file') or request.files.get('image')
+        if upload is None:
+            raise ValueError('请在 file 字段上传图片')
+        params = request.args.to_dict()
+        params.update(request.form.to_dict())
+        return upload.read(), None, None, params
+    
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not data:
+            raise ValueError('请求数据为空')
+        if data.get('url'):
+            return None, None, data['url'], data
+        for key in ['image', 'image_base64', 'base64', 'img']:
+            if data.get(key):
+                return None, data[key], None, data
+        raise ValueError(f"请提供有效的image_base64或url参数 (收到: {list(data.keys())})")
+    
+    raise ValueError('不支持的 Content-Type，请使用 application/octet-stream、multipart/form-data 或 application/json')
+
+
 @app.route('/health', methods=['GET'])
 def health():
-    """健康检查"""
+    """健康检查（工作进程全部未就绪时返回 503）"""
+    ready = pool.ready_count() > 0
     return jsonify({
-        'status': 'healthy',
-        'ocr_available': True,
+        'status': 'healthy' if ready else 'starting',
+        'ocr_available': ready,
         'timestamp': datetime.now().isoformat(),
         'version': '3.2.0',
-        'mode': 'CPU'
-    })
+        'mode': 'CPU',
+        'default_profile': OCR_DEFAULT_PROFILE,
+        'cpu': cpu_settings(),
+        'benchmark': benchmark_result,
+        'pool': pool.stats(),
+        'cache': ocr_cache.stats()
+    }), 200 if ready else 503
+
+
+def _admin_allowed():
+    """管理接口鉴权：配置了 OCR_ADMIN_TOKEN 时校验请求头，否则只允许本机访问"""
+    if OCR_ADMIN_TOKEN:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), OCR_ADMIN_TOKEN)
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+@app.route('/admin/cache/flush', methods=['POST'])
+def flush_cache():
+    """清空识别结果缓存（内存 + 磁盘）"""
+    if not _admin_allowed():
+        return jsonify({'success': False, 'error': 'forbidden'}), 403
+    removed = ocr_cache.flush()
+    return jsonify({'success': True, 'removed': removed, 'cache': ocr_cache.stats()})
+
+
+def parse_ocr_options(params):
+    """
+    解析识别参数（/ocr 与 /ocr/batch 共用）
+
+    Raises:
+        ValueError: 参数不合法
+    """
+    poly_encoding = params.get('poly_encoding', 'base64')
+    if poly_encoding not in POLY_ENCODINGS:
+        raise ValueError(f"不支持的 poly_encoding: {poly_encoding} (可选: {', '.join(POLY_ENCODINGS)})")
+    if poly_encoding == 'msgpack' and msgpack is None:
+        logger.warning("⚠️ 未安装 msgpack，改用 base64")
+        poly_encoding = 'base64'
+    try:
+        max_side = int(params.get('max_side', OCR_MAX_SIDE))
+    except (TypeError, ValueError):
+        raise ValueError(f"max_side 必须是整数: {params.get('max_side')}")
+    # tile: auto（默认，按尺寸判断）/ true 强制分块 / false 不分块
+    tile_param = str(params.get('tile', 'auto')).lower()
+    profile = params.get('profile') or OCR_DEFAULT_PROFILE
+    if profile not in pool.profiles:
+        raise ValueError(f"不支持的 profile: {profile} (可选: {', '.join(pool.profiles)})")
+
+    return {
+        'source_lang': params.get('source_lang', None),
+        'filter_enabled': _flag(params.get('filter_by_language', False)),
+        'compact': params.get('format', 'full') == 'compact',
+        'poly_encoding': poly_encoding,
+        'max_side': max_side,
+        'tile': None if tile_param == 'auto' else _flag(tile_param),
+        'profile': profile
+    }
+
+
+def _decode_and_predict(image_bytes, options, request_id, timer, tag, attrs):
+    """
+    解码缩放 → 识别
+
+    Returns:
+        (raw_ocr_result, ocr_time, scale_info, (sx, sy))：sx / sy 为坐标还原比例，未缩放时为 None
+    """
+    decode_start = time.time()
+    image, (orig_w, orig_h), tiled = decode_for_ocr(image_bytes, options['max_side'], options['tile'])
+    
+    # 缩放比例（检测图 / 原图），坐标按反比例还原
+    ocr_h, ocr_w = image.shape[:2]
+    scaled = (ocr_w, ocr_h) != (orig_w, orig_h)
+    scale_info = {
+        'tiled': tiled,
+        'scale': round(ocr_w / orig_w, 4),
+        'original_size': [orig_w, orig_h],
+        'ocr_size': [ocr_w, ocr_h]
+    }
+    
+    timer.record('ocr.decode', decode_start, width=orig_w, height=orig_h, scale=scale_info['scale'], **attrs)
+    if scaled:
+        logger.info(f"{tag} 图像尺寸: {orig_w}x{orig_h} -> {ocr_w}x{ocr_h} (scale={scale_info['scale']})")
+    else:
+        logger.info(f"{tag} 图像尺寸: {image.shape}")
+    
+    # OCR识别
+    logger.info(f"{tag} 开始OCR识别...")
+    ocr_start_time = time.time()
+    
+    if tiled:
+        raw_ocr_result, tile_count = ocr_tiled(image, request_id, options['profile'])
+    else:
+        raw_ocr_result = pool.predict(image, full=not options['compact'], profile=options['profile'])
+        tile_count = 1
+    
+    ocr_time = time.time() - ocr_start_time
+    timer.record('ocr.predict', ocr_start_time, tiles=tile_count, profile=options['profile'], **attrs)
+    logger.info(f"{tag} OCR识别完成，耗时: {ocr_time:.3f}秒")
+    
+    restore = (orig_w / ocr_w, orig_h / ocr_h) if scaled else None
+    return raw_ocr_result, ocr_time, scale_info, restore
+
+
+def _recognize_compact(image_bytes, options, request_id, timer, tag, attrs):
+    """识别并生成可缓存的紧凑结果条目（多边形为原图坐标下的扁平 int32 数组）"""
+    raw_ocr_result, ocr_time, scale_info, restore = _decode_and_predict(
+        image_bytes, options, request_id, timer, tag, attrs)
+    
+    # 紧凑格式：直接从原始结果取文本 / 置信度 / 多边形，过滤在同一遍中完成
+    serialize_start = time.time()
+    source_lang = options['source_lang']
+    target_lang = source_lang if (source_lang and options['filter_enabled']) else None
+    texts, scores, flat, counts = compact_ocr_result(raw_ocr_result, target_lang)
+    if restore:
+        flat = restore_coordinates(flat, *restore)
+    timer.record('ocr.serialize', serialize_start, format='compact', texts=len(texts), **attrs)
+    return {
+        'texts': texts,
+        'scores': scores,
+        'flat': np.asarray(flat, dtype=np.int32),
+        'counts': counts,
+        'ocr_time': round(ocr_time, 3),
+        **scale_info
+    }
+
+
+def run_ocr(image_bytes, options, request_id, timer, label=None):
+    """
+    识别一张图片：解码缩放 → 识别 → 序列化 / 语言过滤 → 还原坐标
+
+    紧凑格式的结果按图片内容哈希缓存，命中时跳过解码和识别
+
+    Args:
+        label: 批量识别时的客户端 id（用于日志和 trace）
+
+    Returns:
+        单张图片的结果 payload（紧凑或完整格式，不含 request_id / processing_time）
+    """
+    tag = f"[{request_id}]" + (f"[{label}]" if label is not None else '')
+    attrs = {'id': label} if label is not None else {}
+    source_lang = options['source_lang']
+    filter_enabled = options['filter_enabled']
+    
+    if options['compact']:
+        lookup_start = time.time()
+        if ocr_cache.enabled:
+            key = ocr_cache.make_key(image_bytes, options)
+            entry, source = ocr_cache.get_or_compute(
+                key, lambda: _recognize_compact(image_bytes, options, request_id, timer, tag, attrs))
+        else:
+            entry, source = _recognize_compact(image_bytes, options, request_id, timer, tag, attrs), 'computed'
+        
+        cached = source != 'computed'
+        if cached:
+            timer.record('ocr.cache', lookup_start, source=source, texts=len(entry['texts']), **attrs)
+            logger.info(f"{tag} ⚡ 命中OCR缓存 ({source})，{len(entry['texts'])} 个文本")
+        return {
+            'success': True,
+            'format': 'compact',
+            'texts': entry['texts'],
+            'scores': entry['scores'],
+            'polys': pack_polys(entry['flat'], entry['counts'], options['poly_encoding']),
+            'ocr_time': 0.0 if cached else entry['ocr_time'],
+            'total_texts': len(entry['texts']),
+            'source_lang': source_lang,
+            'filtered': bool(source_lang and filter_enabled),
+            'profile': options['profile'],
+            'cached': cached,
+            'tiled': entry['tiled'],
+            'scale': entry['scale'],
+            'original_size': entry['original_size'],
+            'ocr_size': entry['ocr_size']
+        }
+    
+    raw_ocr_result, ocr_time, scale_info, restore = _decode_and_predict(
+        image_bytes, options, request_id, timer, tag, attrs)
+    
+    # 🔥 先序列化（转换为字典格式）
+    serialize_start = time.time()
+    serialized_result = serialize_ocr_result(raw_ocr_result)
+    if restore:
+        serialized_result = restore_serialized_coordinates(serialized_result, *restore)
+    timer.record('ocr.serialize', serialize_start, **attrs)
+    
+    # 🔥 然后在序列化后的结果上过滤
+    filtered = False
+    if source_lang and filter_enabled:
+        logger.info(f"{tag} 🔍 开始语言过滤 (目标: {source_lang})...")
+        filter_start_time = time.time()
+        
+        # 🔥 在序列化后的结果上过滤
+        serialized_result = filter_ocr_by_language_v2(
+            serialized_result,  # 传入序列化后的结果
+            target_lang=source_lang
+        )
+        
+        filter_time = time.time() - filter_start_time
+        timer.record('ocr.filter', filter_start_time, **attrs)
+        filtered = True
+        logger.info(f"{tag} ✓ 语言过滤完成，耗时: {filter_time:.3f}秒")
+    else:
+        logger.info(f"{tag} ⊗ 跳过语言过滤")
+    
+    # 统计信息
+    total_texts = 0
+    try:
+        for res_dict in serialized_result:
+            if isinstance(res_dict, dict) and 'res' in res_dict:
+                rec_texts = res_dict['res'].get('rec_texts', [])
+                total_texts += len(rec_texts)
+    except:
+        pass
+    
+    return {
+        'success': True,
+        'result': serialized_result,
+        'ocr_time': round(ocr_time, 3),
+        'total_texts': total_texts,
+        'source_lang': source_lang,
+        'filtered': filtered,
+        'profile': options['profile'],
+        **scale_info
+    }
+
+
+def ocr_response(payload, options, timer, request_id):
+    """按 poly_encoding 返回 JSON 或 msgpack 响应"""
+    if options['compact'] and options['poly_encoding'] == 'msgpack':
+        return timer.attach(Response(msgpack.packb(payload, use_bin_type=True),
+                                     mimetype='application/msgpack'), request_id)
+    return timer.attach(jsonify(payload), request_id)
+
 
 @app.route('/ocr', methods=['POST'])
 def ocr_api():
     """OCR识别接口 - 返回原始OCR结果"""
     start_time = time.time()
-    request_id = f"req_{int(start_time * 1000)}"
+    request_id = request.headers.get(TRACE_HEADER) or f"req_{int(start_time * 1000)}"
+    timer = StageTimer()
     
     logger.info(f"[{request_id}] 收到OCR识别请求")
     
     try:
-        if not request.is_json:
-            return jsonify({
-                'success': False,
-                'error': '请求Content-Type必须是application/json',
-                'request_id': request_id
-            }), 400
-        
-        data = request.get_json()
-        if not data:
-            return jsonify({
+        try:
+            image_bytes, image_base64, image_url, params = read_ocr_request()
+            # 🔥 从请求中读取参数
+            options = parse_ocr_options(params)
+        except ValueError as e:
+            return timer.attach(jsonify({
                 'success': False,
-                'error': '请求数据为空',
+                'error': str(e),
                 'request_id': request_id
-            }), 400
-        
-        # 🔥 从请求中读取参数
-        source_lang = data.get('source_lang', None)
-        filter_enabled = data.get('filter_by_language', False)
+            }), request_id), 400
         
-        logger.info(f"[{request_id}] 参数: source_lang={source_lang}, filter_enabled={filter_enabled}")
+        logger.info(f"[{request_id}] 参数: source_lang={options['source_lang']}, "
+                    f"filter_enabled={options['filter_enabled']}, profile={options['profile']}, "
+                    f"format={'compact/' + options['poly_encoding'] if options['compact'] else 'full'}")
         
         # 获取图像
-        image = None
-        if 'url' in data and data['url']:
+        if image_url:
             import requests
-            logger.info(f"[{request_id}] 从URL加载图像: {data['url']}")
-            response = requests.get(data['url'], timeout=30)
+            logger.info(f"[{request_id}] 从URL加载图像: {image_url}")
+            response = requests.get(image_url, timeout=30)
             response.raise_for_status()
-            image_array = np.frombuffer(response.content, np.uint8)
-            image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-            if image is None:
-                raise ValueError("URL图像解码失败")
+            image_bytes = response.content
+        elif image_base64:
+            image_bytes = bytes_from_base64(image_base64)
         else:
-            image_data = None
-            for key in ['image', 'image_base64', 'base64', 'img']:
-                if key in data and data[key]:
-                    image_data = data[key]
-                    logger.info(f"[request_id] 使用参数: {key}")
-                    break
-            
-            if not image_data:
-                return jsonify({
-                    'success': False,
-                    'error': '请提供有效的image_base64或url参数',
-                    'request_id': request_id,
-                    'available_keys': list(data.keys())
-                }), 400
-            
-            image = image_from_base64(image_data)
+            logger.info(f"[{request_id}] 二进制图片: {len(image_bytes) / 1024:.1f} KB ({request.mimetype})")
         
-        logger.info(f"[{request_id}] 图像尺寸: {image.shape}")
+        payload = run_ocr(image_bytes, options, request_id, timer)
+        del image_bytes
         
-        # OCR识别
-        logger.info(f"[{request_id}] 开始OCR识别...")
-        ocr_start_time = time.time()
+        processing_time = time.time() - start_time
+        payload.update(request_id=request_id, processing_time=round(processing_time, 3))
+        logger.info(f"[{request_id}] 处理完成，识别到 {payload['total_texts']} 个文本，总耗时: {processing_time:.3f}秒")
         
-        raw_ocr_result = ocr.predict(image)
+        # 返回结果
+        return ocr_response(payload, options, timer, request_id)
         
-        ocr_time = time.time() - ocr_start_time
-        logger.info(f"[{request_id}] OCR识别完成，耗时: {ocr_time:.3f}秒")
+    except Exception as e:
+        error_time = time.time() - start_time
+        logger.error(f"[{request_id}] 处理失败: {str(e)}", exc_info=True)
         
-        # 🔥 先序列化（转换为字典格式）
-        serialized_result = serialize_ocr_result(raw_ocr_result)
+        return timer.attach(jsonify({
+            'success': False,
+            'error': str(e),
+            'error_type': type(e).__name__,
+            'request_id': request_id,
+            'processing_time': round(error_time, 3)
+        }), request_id), 500
+
+
+def read_batch_request():
+    """
+    解析批量 OCR 请求
+
+    - multipart/form-data：每个文件字段的字段名即客户端 id，参数放在表单或查询字符串
+    - application/json：{"images": [{"id": "...", "image_base64": "..."}, ...], 其他参数}
+
+    Returns:
+        ([(id, image_bytes), ...], params)
+
+    Raises:
+        ValueError: 请求格式不支持、缺少图片、id 重复或图片数超过上限
+    """
+    mimetype = request.mimetype or ''
+    items = []
+
+    if mimetype == 'multipart/form-data':
+        params = request.args.to_dict()
+        params.update(request.form.to_dict())
+        for image_id, upload in request.files.items(multi=True):
+            items.append((image_id, upload.read()))
+    elif request.is_json:
+        data = request.get_json(silent=True) or {}
+        params = {k: v for k, v in data.items() if k != 'images'}
+        for entry in data.get('images') or []:
+            if not isinstance(entry, dict) or 'id' not in entry:
+                raise ValueError('images 中的每一项都需要 id 字段')
+            image_base64 = entry.get('image_base64') or entry.get('image')
+            if not image_base64:
+                raise ValueError(f"图片 {entry['id']} 缺少 image_base64")
+            items.append((str(entry['id']), bytes_from_base64(image_base64)))
+    else:
+        raise ValueError('不支持的 Content-Type，请使用 multipart/form-data 或 application/json')
+
+    if not items:
+        raise ValueError('请求中没有图片')
+    if len(items) > OCR_BATCH_MAX_IMAGES:
+        raise ValueError(f"单次最多 {OCR_BATCH_MAX_IMAGES} 张图片 (收到 {len(items)} 张)")
+    ids = [image_id for image_id, _ in items]
+    if len(set(ids)) != len(ids):
+        raise ValueError('图片 id 重复')
+    return items, params
+
+
+@app.route('/ocr/batch', methods=['POST'])
+def ocr_batch_api():
+    """批量OCR识别接口 - 多张图片一次请求，结果按客户端 id 返回"""
+    start_time = time.time()
+    request_id = request.headers.get(TRACE_HEADER) or f"req_{int(start_time * 1000)}"
+    timer = StageTimer()
+    
+    try:
+        try:
+            items, params = read_batch_request()
+            options = parse_ocr_options(params)
+        except ValueError as e:
+            return timer.attach(jsonify({
+                'success': False,
+                'error': str(e),
+                'request_id': request_id
+            }), request_id), 400
         
-        # 🔥 然后在序列化后的结果上过滤
-        filtered = False
-        if source_lang and filter_enabled:
-            logger.info(f"[{request_id}] 🔍 开始语言过滤 (目标: {source_lang})...")
-            filter_start_time = time.time()
-            
-            # 🔥 在序列化后的结果上过滤
-            serialized_result = filter_ocr_by_language_v2(
-                serialized_result,  # 传入序列化后的结果
-                target_lang=source_lang
-            )
-            
-            filter_time = time.time() - filter_start_time
-            filtered = True
-            logger.info(f"[{request_id}] ✓ 语言过滤完成，耗时: {filter_time:.3f}秒")
-        else:
-            logger.info(f"[{request_id}] ⊗ 跳过语言过滤")
+        logger.info(f"[{request_id}] 收到批量OCR请求: {len(items)} 张图片, profile={options['profile']}, "
+                    f"format={'compact/' + options['poly_encoding'] if options['compact'] else 'full'}")
         
-        processing_time = time.time() - start_time
+        def recognize(image_id, image_bytes):
+            try:
+                return run_ocr(image_bytes, options, request_id, timer, label=image_id)
+            except Exception as e:
+                logger.error(f"[{request_id}][{image_id}] 处理失败: {e}", exc_info=True)
+                return {'success': False, 'error': str(e), 'error_type': type(e).__name__}
         
-        # 统计信息
-        total_texts = 0
-        try:
-            for res_dict in serialized_result:
-                if isinstance(res_dict, dict) and 'res' in res_dict:
-                    rec_texts = res_dict['res'].get('rec_texts', [])
-                    total_texts += len(rec_texts)
-        except:
-            pass
+        # 各图片同时提交给工作进程池，由进程池凑批识别
+        with ThreadPoolExecutor(max_workers=len(items), thread_name_prefix='ocr-batch') as executor:
+            futures = {image_id: executor.submit(recognize, image_id, image_bytes) for image_id, image_bytes in items}
+            results = {image_id: future.result() for image_id, future in futures.items()}
         
-        logger.info(f"[{request_id}] 处理完成，识别到 {total_texts} 个文本，总耗时: {processing_time:.3f}秒")
+        failed = sum(1 for result in results.values() if not result['success'])
+        processing_time = time.time() - start_time
+        logger.info(f"[{request_id}] 批量处理完成: {len(items)} 张图片 ({failed} 张失败)，总耗时: {processing_time:.3f}秒")
         
-        # 返回结果
-        return jsonify({
+        return ocr_response({
             'success': True,
-            'result': serialized_result,
+            'results': results,
+            'total_images': len(items),
+            'failed': failed,
             'request_id': request_id,
-            'processing_time': round(processing_time, 3),
-            'ocr_time': round(ocr_time, 3),
-            'total_texts': total_texts,
-            'source_lang': source_lang,
-            'filtered': filtered
-        })
+            'processing_time': round(processing_time, 3)
+        }, options, timer, request_id)
         
     except Exception as e:
         error_time = time.time() - start_time
-        logger.error(f"[{request_id}] 处理失败: {str(e)}", exc_info=True)
+        logger.error(f"[{request_id}] 批量处理失败: {str(e)}", exc_info=True)
         
-        return jsonify({
+        return timer.attach(jsonify({
             'success': False,
             'error': str(e),
             'error_type': type(e).__name__,
             'request_id': request_id,
             'processing_time': round(error_time, 3)
-        }), 500
+        }), request_id), 500
 
 @app.route('/ocr/parsed', methods=['POST'])
 def ocr_parsed_api():
@@ -508,7 +1938,10 @@ if __name__ == '__main__':
     logger.info(f"✅ 服务启动完成，监听地址: {OCR_HOST}:{OCR_PORT}")
     logger.info("📋 可用接口:")
     logger.info("  - GET  /health     : 健康检查")
-    logger.info("  - POST /ocr        : OCR识别（返回原始结果）")
+    logger.info("  - POST /ocr        : OCR识别（返回原始结果；支持 octet-stream / multipart / base64 JSON；format=compact 返回紧凑结果）")
+    logger.info("  - POST /ocr/batch  : 批量OCR识别（多张图片一次请求，结果按客户端 id 返回）")
     logger.info("  - POST /ocr/parsed : OCR识别（返回解析结果，兼容旧版本）")
-    logger.info("� 运行模式: CPU (PaddlePaddle 3.2.0)")
+    logger.info("  - POST /admin/cache/flush : 清空识别结果缓存")
+    logger.info(f"� 运行模式: CPU (PaddlePaddle 3.2.0), {pool.size} 个工作进程 × {pool.cpu_threads} 线程, "
+                f"MKL-DNN {'开启' if OCR_ENABLE_MKLDNN else '关闭'}, 数学库线程 {OCR_MATH_THREADS}")
     app.run(host=OCR_HOST, port=OCR_PORT, debug=False, threaded=True)
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""
+测试分块识别的接缝合并（merge_tile_items）
+
+不调用 OCR 模型：直接构造两个相邻块的识别结果，检查
+- 被左右接缝切断的同一行合并为一个框，文字去重后拼接（较短的一段不会被当作重复丢弃）
+- 重叠区域内重复识别的同一行只保留一个
+"""
+import os
+
+
+TILE = 1536
+IMAGE_SHAPE = (400, 2880, 3)  # 两块: x0=0 和 x0=1344（重叠 192px）
+
+
+def tile_result(items, x0):
+    """构造一个块的识别结果（坐标为块内坐标）"""
+    texts, scores, polys = [], [], []
+    for text, (x1, y1, x2, y2) in items:
+        texts.append(text)
+        scores.append(0.9)
+        polys.append([[x1 - x0, y1], [x2 - x0, y1], [x2 - x0, y2], [x1 - x0, y2]])
+    return [{'res': {'rec_texts': texts, 'rec_scores': scores, 'rec_polys': polys}}]
+
+
+def merge(app, left_items, right_items):
+    items = (app._tile_items(tile_result(left_items, 0), IMAGE_SHAPE, 0, 0, TILE, IMAGE_SHAPE[0]) +
+             app._tile_items(tile_result(right_items, 1344), IMAGE_SHAPE, 1344, 0, TILE, IMAGE_SHAPE[0]))
+    return app.merge_tile_items(items)
+
+
+def test_short_fragments_joined(app):
+    """两段都落在重叠区域内的被切断文字：合并而不是去重"""
+    merged = merge(app, [("Hello wor", (1300, 100, 1535, 140))], [("world again", (1344, 100, 1800, 140))])
+    assert [item['text'] for item in merged] == ["Hello world again"], merged
+    assert merged[0]['rect'] == (1300, 100, 1800, 140), merged[0]['rect']
+    print("✅ 接缝两侧的短片段已拼接:", merged[0]['text'])
+
+
+def test_duplicate_in_overlap(app):
+    """重叠区域内完整识别了两次的同一行：只保留一个"""
+    merged = merge(app, [("Overlap", (1400, 200, 1500, 240))], [("Overlap", (1402, 201, 1499, 240))])
+    assert [item['text'] for item in merged] == ["Overlap"], merged
+    print("✅ 重叠区域的重复识别已去重")
+
+
+def test_duplicate_with_cut_copy(app):
+    """一块里被切断、另一块里完整的同一行：保留完整的"""
+    merged = merge(app, [("Seam tex", (1450, 300, 1535, 340))], [("Seam text", (1450, 300, 1560, 340))])
+    assert [item['text'] for item in merged] == ["Seam text"], merged
+    print("✅ 保留未被切断的完整文字")
+
+
+if __name__ == '__main__':
+    # 导入 app 会启动工作进程池，不需要启动自检
+    os.environ.setdefault('OCR_BENCHMARK_ON_START', 'false')
+    import app
+
+    test_short_fragments_joined(app)
+    test_duplicate_in_overlap(app)
+    test_duplicate_with_cut_copy(app)
+    print("✅ 全部通过")
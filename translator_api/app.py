@@ -10,7 +10,7 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 from dotenv import load_dotenv
 load_dotenv()
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g, has_request_context
 from flask_cors import CORS
 from datetime import datetime
 import threading
@@ -22,7 +22,20 @@ from datetime import timedelta
 from functools import wraps
 from werkzeug.security import check_password_hash, generate_password_hash
 import base64
+import mimetypes
+import shutil
+import stat
+import zipfile
+from urllib.parse import quote
+from werkzeug.utils import safe_join
 from services.ali_translate_client import AliTranslateClient
+from services.tracing import TRACE_HEADER, start_trace, end_trace, get_current_trace, span
+from services.result_cache import result_cache, save_upload_with_hash, make_cache_key
+from services.storage import file_store
+from services.job_queue import job_manager, JobQueueFull, JobCancelled, TERMINAL_STATUSES
+from services.admission import admission, AdmissionRejected, client_id_from_request
+from services.summary_service import summary_manager
+from services.http_client import http_client
 
 
 
@@ -39,7 +52,9 @@ try:
     from config import (
         API_HOST, API_PORT, UPLOAD_FOLDER, ARCHIVE_FOLDER, LOG_FOLDER,
         OCR_SERVICE_URL, INPAINT_SERVICE_URL, USE_INPAINT, ALLOWED_ORIGINS,
-        MONITOR_USERNAME, MONITOR_PASSWORD_HASH, MAX_FILE_SIZE
+        MONITOR_USERNAME, MONITOR_PASSWORD_HASH, MAX_FILE_SIZE,
+        TRACE_RETURN_TIMING, FILES_X_ACCEL_REDIRECT, FILES_X_ACCEL_PREFIX,
+        FILES_CACHE_MAX_AGE, ARCHIVE_MAX_AGE_HOURS, JOB_SSE_HEARTBEAT, OCR_PROFILE
     )
     # 🔥 修复：确保 UPLOAD_FOLDER 是绝对路径
     if not os.path.isabs(UPLOAD_FOLDER):
@@ -60,9 +75,21 @@ except Exception as e:
     MONITOR_USERNAME = "admin"
     from werkzeug.security import generate_password_hash
     MONITOR_PASSWORD_HASH = generate_password_hash("change_me_in_production")
+    TRACE_RETURN_TIMING = False
+    FILES_X_ACCEL_REDIRECT = False
+    FILES_X_ACCEL_PREFIX = "/protected-files/"
+    FILES_CACHE_MAX_AGE = 3600
+    ARCHIVE_MAX_AGE_HOURS = 2
+    JOB_SSE_HEARTBEAT = 15
+    OCR_PROFILE = ""
 
 app = Flask(__name__)
 
+# 补充 Office 文档类型（部分系统的 mimetypes 数据库缺失）
+mimetypes.add_type('application/vnd.openxmlformats-officedocument.presentationml.presentation', '.pptx')
+mimetypes.add_type('application/vnd.ms-powerpoint', '.ppt')
+mimetypes.add_type('image/webp', '.webp')
+
 # CORS 配置（使用配置文件）
 CORS(app, origins=ALLOWED_ORIGINS, supports_credentials=True)
 
@@ -110,6 +137,367 @@ def require_monitor_auth(f):
 
 
 
+# ============= 请求链路追踪 =============
+
+@app.before_request
+def begin_request_trace():
+    """为每个请求建立 trace（沿用上游传入的 X-Trace-Id）"""
+    start_trace(request.headers.get(TRACE_HEADER))
+
+
+@app.after_request
+def finish_request_trace(response):
+    """结束 trace，回写 X-Trace-Id 响应头"""
+    trace = end_trace()
+    if trace is not None:
+        response.headers[TRACE_HEADER] = trace.trace_id
+    return response
+
+
+# ============= 准入控制 =============
+
+@app.before_request
+def admit_request():
+    """按接口类别排队 / 限流；排不上时快速返回 429 或 503"""
+    class_name = admission.classify(request.path, request.method)
+    if class_name is None:
+        return None
+    
+    client_id = client_id_from_request(request)
+    try:
+        with span('admission.wait', endpoint_class=class_name):
+            g.admission_ticket = admission.acquire(class_name, client_id)
+    except AdmissionRejected as e:
+        api_logger.warning(f"🚦 请求被拒绝: {request.path} ({client_id}) - {e.reason}")
+        response = jsonify({
+            'error': 'Too many requests' if e.status_code == 429 else 'Server busy, please retry later',
+            'reason': e.reason,
+            'retry_after': e.retry_after
+        })
+        response.status_code = e.status_code
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    return None
+
+
+@app.teardown_request
+def release_admission(exc=None):
+    """请求结束（流式响应在输出完毕后）交还名额"""
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        admission.release(ticket)
+
+
+def timing_payload():
+    """按需返回耗时明细（return_timing=true 或 X-Debug-Timing: 1）"""
+    trace = get_current_trace()
+    if trace is None:
+        return {}
+
+    flag = (
+        request.args.get('return_timing')
+        or request.form.get('return_timing')
+        or request.headers.get('X-Debug-Timing')
+    )
+    if request.is_json and not flag:
+        flag = str((request.get_json(silent=True) or {}).get('return_timing', ''))
+
+    wants_timing = TRACE_RETURN_TIMING or str(flag).lower() in ('1', 'true', 'yes')
+    return {'timing': trace.timing_breakdown()} if wants_timing else {}
+
+
+OCR_PROFILE_CHOICES = ('fast', 'accurate', 'int8')
+
+
+def ocr_profile_param():
+    """
+    请求指定的 OCR 配置档（ocr_profile 表单 / 查询参数），未指定时为 OCR_PROFILE
+
+    Returns:
+        配置档名称，None 表示使用 OCR 服务的默认配置
+
+    Raises:
+        ValueError: 配置档名称不合法
+    """
+    profile = request.form.get('ocr_profile') or request.args.get('ocr_profile') or OCR_PROFILE or None
+    if profile is not None and profile not in OCR_PROFILE_CHOICES:
+        raise ValueError(f"Invalid ocr_profile: {profile} (choices: {', '.join(OCR_PROFILE_CHOICES)})")
+    return profile
+
+
+# ============= 结果缓存 =============
+
+def lookup_result_cache(cache_key):
+    """
+    查询整文件结果缓存，并合并并发的相同请求
+
+    Returns:
+        (命中的缓存条目或 None, 当前请求是否负责计算并在结束后 release)
+    """
+    while True:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached, False
+
+        if result_cache.claim(cache_key):
+            return None, True
+
+        api_logger.info("⏳ 相同文件正在处理中，等待其结果...")
+        cached = result_cache.wait(cache_key)
+        if cached is not None:
+            return cached, False
+        # 对方失败或等待超时：重新申请计算权，避免多个请求同时重复计算
+
+
+def build_file_url(filename, proxy_domain):
+    """构建输出文件的访问 URL（通过 Nginx 代理时加 /translator-api 前缀）"""
+    scheme = request.headers.get('X-Forwarded-Proto', request.scheme)
+    host = request.headers.get('X-Forwarded-Host', request.host)
+    forwarded_host = request.headers.get('X-Forwarded-Host', '')
+    original_uri = request.headers.get('X-Original-URI', '')
+    referer = request.headers.get('Referer', '')
+
+    is_proxied = (
+        proxy_domain in host or
+        proxy_domain in forwarded_host or
+        'translator-api' in original_uri or
+        'translator-api' in referer
+    )
+
+    if is_proxied:
+        return f"{scheme}://{host}/translator-api/api/files/{filename}"
+    return f"{scheme}://{host}/api/files/{filename}"
+
+
+def log_cache_hit_usage(translation_type, file_info, elapsed, enable_summary):
+    """记录缓存命中的使用情况"""
+    usage_record = create_usage_record(
+        request=request,
+        translation_type=translation_type,
+        file_info=file_info,
+        processing_time=elapsed,
+        status='success',
+        enable_summary=enable_summary
+    )
+    usage_record['cache_hit'] = True
+    log_usage(usage_record)
+
+
+def cache_hit_response(cached, translation_type, input_path, file_info, start_time, enable_summary, **fields):
+    """
+    结果缓存命中时的统一处理：删除重复上传的文件、记录使用情况并返回结果
+
+    Args:
+        fields: 各接口特有的响应字段（如结果文件 URL）
+    """
+    elapsed = time.time() - start_time
+    api_logger.info(f"⚡ 结果缓存命中: {cached['output_file']}")
+    remove_files([input_path])  # 重复上传不再保留
+    log_cache_hit_usage(translation_type, file_info, elapsed, enable_summary)
+
+    payload = cached.get('payload', {})
+    result = {
+        'success': True,
+        **fields,
+        'processing_time': f"{elapsed:.2f}s",
+        **timing_payload(),
+        'cached': True
+    }
+    if enable_summary and payload.get('summary'):
+        result['summary'] = refresh_summary(payload['summary'])
+    return jsonify(result)
+
+
+# ============= AI 总结 =============
+
+def summary_payload(summary_result):
+    """
+    把 summary_manager 返回的状态转换为响应中的 summary 字段
+
+    总结在后台生成：status 为 pending 时 content 为空，
+    客户端通过 status_url（支持 ?wait=秒 长轮询）或 events_url（SSE）获取结果
+    """
+    if not summary_result:
+        return None
+    summary_id = summary_result.get('summary_id')
+    payload = {
+        'success': summary_result.get('success', False),
+        'content': summary_result.get('summary'),
+        'error': summary_result.get('error'),
+        'status': summary_result.get('status', 'done' if summary_result.get('success') else 'failed')
+    }
+    if summary_id:
+        payload.update({
+            'summary_id': summary_id,
+            'status_url': f'/api/summaries/{summary_id}',
+            'events_url': f'/api/summaries/{summary_id}/events'
+        })
+    return payload
+
+
+def refresh_summary(summary):
+    """缓存命中时，用最新的总结状态替换缓存中保存的（可能仍为 pending 的）summary 字段"""
+    if not summary or not summary.get('summary_id'):
+        return summary
+    latest = summary_manager.get(summary['summary_id'])
+    return summary_payload(latest) if latest else summary
+
+
+# ============= 异步任务 =============
+
+def wants_async():
+    """是否以后台任务方式处理（async=true 或 Prefer: respond-async）"""
+    flag = request.args.get('async') or request.form.get('async') or ''
+    return flag.lower() in ('1', 'true', 'yes') or 'respond-async' in request.headers.get('Prefer', '')
+
+
+def submit_translation_job(job_type, params, usage_record):
+    """提交后台翻译任务，立即返回 202 + job_id"""
+    trace = get_current_trace()
+    params = dict(
+        params,
+        usage=usage_record,
+        trace_id=trace.trace_id if trace else None,
+        submitted_at=time.time()
+    )
+    
+    try:
+        job = job_manager.submit(job_type, params)
+    except JobQueueFull as e:
+        api_logger.warning(f"⚠️ 任务队列已满: {e}")
+        response = jsonify({'error': 'Job queue is full, please retry later'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    
+    job_id = job['job_id']
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': job['status'],
+        'queue_position': job_manager.queue_position(job_id),
+        'status_url': f'/api/jobs/{job_id}',
+        'events_url': f'/api/jobs/{job_id}/events',
+        'cancel_url': f'/api/jobs/{job_id}/cancel'
+    }), 202
+
+
+def run_translation_job(ctx, params, translate):
+    """
+    在 worker 线程中执行文档翻译（结果缓存 + 使用记录 + trace）
+
+    Args:
+        translate: translate(progress_callback) -> (输出路径, 摘要结果)
+
+    Returns:
+        (输出文件相对路径, summary 字段或 None, 耗时秒数, 是否命中缓存)
+    """
+    start_trace(params.get('trace_id'))
+    start_time = time.time()
+    enable_summary = params.get('enable_summary', False)
+    cache_key = params.get('cache_key')
+    cache_owner = False
+    
+    usage_record = params.get('usage') or {}
+    usage_record['job_id'] = ctx.job_id
+    usage_record['job_queue_wait_seconds'] = round(start_time - params.get('submitted_at', start_time), 2)
+    
+    try:
+        cached, cache_owner = lookup_result_cache(cache_key) if cache_key else (None, False)
+        
+        if cached is not None:
+            app_logger.info(f"⚡ 结果缓存命中: {cached['output_file']}")
+            payload = cached.get('payload', {})
+            usage_record['cache_hit'] = True
+            usage_record['status'] = 'success'
+            summary = refresh_summary(payload.get('summary')) if enable_summary else None
+            return cached['output_file'], summary, time.time() - start_time, True
+        
+        output_path, summary_result = translate(ctx.progress)
+        if not output_path or not os.path.exists(output_path):
+            raise Exception('Output file not found')
+        
+        file_store.register(output_path)
+        summary = summary_payload(summary_result) if enable_summary else None
+        result_cache.put(cache_key, output_path, {'summary': summary})
+        
+        usage_record['status'] = 'success'
+        return file_store.relpath(output_path), summary, time.time() - start_time, False
+    
+    except JobCancelled:
+        usage_record['status'] = 'cancelled'
+        raise
+    except Exception as e:
+        usage_record['status'] = 'failed'
+        usage_record['error_message'] = str(e)
+        raise
+    finally:
+        if cache_owner:
+            result_cache.release(cache_key)
+        usage_record['processing_time_seconds'] = round(time.time() - start_time, 2)
+        log_usage(usage_record)
+        end_trace()
+
+
+def run_pdf_job(ctx, params):
+    """后台 PDF 翻译任务"""
+    from services.pdf_translator import translate_pdf_file
+    
+    def translate(progress_callback):
+        return translate_pdf_file(
+            params['input_path'],
+            params['source_lang'],
+            params['target_lang'],
+            params['enable_summary'],
+            output_path=params['output_path'],
+            progress_callback=progress_callback
+        )
+    
+    output_file, summary, elapsed, cached = run_translation_job(ctx, params, translate)
+    return {
+        'success': True,
+        'download_url': f'/api/files/{output_file}',
+        'filename': output_file,
+        'source_lang': params['source_lang'],
+        'target_lang': params['target_lang'],
+        'processing_time': f"{elapsed:.2f}s",
+        **({'cached': True} if cached else {}),
+        **({'summary': summary} if summary else {})
+    }
+
+
+def run_ppt_job(ctx, params):
+    """后台 PPT 翻译任务"""
+    from services.ppt_translator import translate_ppt_file, translate_ppt_simple
+    if params['simple_mode']:
+        translate_fn, ocr_kwargs = translate_ppt_simple, {}
+    else:
+        translate_fn, ocr_kwargs = translate_ppt_file, {'ocr_profile': params.get('ocr_profile')}
+    
+    def translate(progress_callback):
+        return translate_fn(
+            params['input_path'],
+            src_lang=params['source_lang'],
+            tgt_lang=params['target_lang'],
+            output_path=params['output_path'],
+            enable_summary=params['enable_summary'],
+            progress_callback=progress_callback,
+            **ocr_kwargs
+        )
+    
+    output_file, summary, elapsed, cached = run_translation_job(ctx, params, translate)
+    return {
+        'success': True,
+        'message': 'Translation completed',
+        'translated_ppt_url': params['file_url_base'] + output_file,
+        'original_filename': params['original_filename'],
+        'translated_filename': output_file,
+        'processing_time': f"{elapsed:.2f}s",
+        'mode': 'simple' if params['simple_mode'] else 'full',
+        **({'cached': True} if cached else {}),
+        **({'summary': summary} if summary else {})
+    }
+
+
 # ============= 用户行为监控 =============
 
 def log_usage(request_data):
@@ -150,9 +538,11 @@ def create_usage_record(request, translation_type, file_info=None,
                        processing_time=0, status='success', error_message=None,
                        enable_summary=False):
     """创建使用记录"""
+    trace = get_current_trace()
+    ticket = g.get('admission_ticket') if has_request_context() else None
     return {
         'timestamp': datetime.now().isoformat(),
-        'request_id': str(uuid.uuid4()),
+        'request_id': trace.trace_id if trace else str(uuid.uuid4()),
         'client_ip': request.headers.get('X-Forwarded-For', request.remote_addr),
         'user_agent': request.headers.get('User-Agent', 'Unknown'),
         'endpoint': request.path,
@@ -165,55 +555,19 @@ def create_usage_record(request, translation_type, file_info=None,
         'processing_time_seconds': round(processing_time, 2),
         'status': status,
         'error_message': error_message,
-        'enable_summary': enable_summary
+        'enable_summary': enable_summary,
+        'queue_wait_seconds': round(ticket.wait_seconds, 3) if ticket else None
     }
 
 # ============= 定时归档任务 =============
 
-def archive_old_files(folder, max_age_hours=2, archive_folder=ARCHIVE_FOLDER):
-    """归档超过指定时间的文件（不删除）"""
+def archive_old_files(max_age_hours=ARCHIVE_MAX_AGE_HOURS):
+    """归档超过指定时间的文件（不删除），归档文件在后台压缩"""
     try:
-        now = time.time()
-        max_age_seconds = max_age_hours * 3600
-        archived_count = 0
-        
-        # 获取当前日期，用于创建归档目录
-        current_date = datetime.now()
-        year = current_date.strftime('%Y')
-        month = current_date.strftime('%m')
-        day = current_date.strftime('%d')
-        
-        # 创建归档目录：archives/YYYY/MM/DD/
-        archive_path = os.path.join(archive_folder, year, month, day)
-        os.makedirs(archive_path, exist_ok=True)
-        
-        for file_path in Path(folder).glob('*'):
-            if file_path.is_file():
-                file_age = now - file_path.stat().st_mtime
-                if file_age > max_age_seconds:
-                    try:
-                        # 移动文件到归档目录
-                        dest_path = os.path.join(archive_path, file_path.name)
-                        
-                        # 如果目标文件已存在，添加时间戳后缀
-                        if os.path.exists(dest_path):
-                            name, ext = os.path.splitext(file_path.name)
-                            timestamp = int(file_path.stat().st_mtime)
-                            dest_path = os.path.join(archive_path, f"{name}_{timestamp}{ext}")
-                        
-                        # 移动文件
-                        file_path.rename(dest_path)
-                        archived_count += 1
-                        
-                        app_logger.info(
-                            f"📦 归档文件: {file_path.name} → {year}/{month}/{day}/ "
-                            f"(年龄: {file_age/3600:.1f}小时)"
-                        )
-                    except Exception as e:
-                        app_logger.error(f"归档文件失败 {file_path}: {e}")
+        archived_count = file_store.archive_expired(max_age_hours)
         
         if archived_count > 0:
-            app_logger.info(f"✓ 归档完成，已归档 {archived_count} 个文件到 {year}/{month}/{day}/")
+            app_logger.info(f"✓ 归档完成，已归档 {archived_count} 个文件")
         else:
             app_logger.debug(f"ℹ️  无需归档的文件")
     
@@ -226,15 +580,36 @@ def schedule_archive():
     while True:
         time.sleep(2 * 3600)  # 2小时
         app_logger.info("🔄 开始定时归档...")
-        archive_old_files(UPLOAD_FOLDER, max_age_hours=2)
+        archive_old_files()
+        # 输出文件被归档后，对应的结果缓存条目随之失效
+        result_cache.evict_missing()
 
 
 # 🔥 修改：启动归档线程（替代清理线程）
 archive_thread = threading.Thread(target=schedule_archive, daemon=True)
 archive_thread.start()
+file_store.start()
+
+# 启动后台任务队列（恢复上次排队中的任务）
+job_manager.register('pdf', run_pdf_job)
+job_manager.register('ppt', run_ppt_job)
+job_manager.start()
+
+# 上游（OCR / Inpaint / Ollama）健康状态由后台线程定期刷新
+http_client.start_health_checks()
 
 # ============= 定时清理任务 =============
 
+def remove_files(paths):
+    """删除请求中途已保存的文件（忽略不存在的）"""
+    for path in paths:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            app_logger.error(f"删除文件失败 {path}: {e}")
+
+
 def cleanup_old_files(folder, max_age_hours=2):
     """清理超过指定时间的文件"""
     try:
@@ -304,6 +679,8 @@ def translate_image():
     """图片翻译接口"""
     start_time = time.time()
     usage_record = None  # 用于记录使用情况
+    cache_key = None
+    cache_owner = False
 
     try:
         # 1. 检查文件
@@ -321,23 +698,53 @@ def translate_image():
         tgt_lang = request.form.get('target_lang', 'zh')
         
         enable_summary = request.form.get('enable_summary', 'false').lower() == 'true'
+        try:
+            ocr_profile = ocr_profile_param()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
         api_logger.info(f"Translation request: {src_lang} → {tgt_lang}")
         api_logger.info(f"Original filename: {file.filename}")
         api_logger.info(f"   AI Summary: {'✓' if enable_summary else '✗'}") 
+        if ocr_profile:
+            api_logger.info(f"   OCR profile: {ocr_profile}")
 
         # 3. 保存上传的文件
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         safe_filename = f"{timestamp}_{file.filename}"
-        input_path = os.path.join(UPLOAD_FOLDER, safe_filename)
+        input_path = file_store.upload_path(safe_filename)
         
-        file.save(input_path)
-        file_size = os.path.getsize(input_path) / 1024
+        # 边写磁盘边计算内容哈希
+        content_hash, file_bytes = save_upload_with_hash(file, input_path)
+        file_size = file_bytes / 1024
         api_logger.info(f"✓ File saved: {input_path} ({file_size:.1f}KB)")
         
+        # 3.1 查询结果缓存（相同文件 + 相同参数）
+        cache_mode = (('inpaint' if USE_INPAINT else 'local') + ('+summary' if enable_summary else '')
+                      + (f'+ocr-{ocr_profile}' if ocr_profile else ''))
+        cache_key = make_cache_key(content_hash, 'image', src_lang, tgt_lang, cache_mode)
+        cached, cache_owner = lookup_result_cache(cache_key)
+        
+        if cached is not None:
+            return cache_hit_response(
+                cached, 'image', input_path, {
+                    'source_lang': src_lang,
+                    'target_lang': tgt_lang,
+                    'file_name': file.filename,
+                    'file_size_kb': round(file_size, 2)
+                }, start_time, enable_summary,
+                message='Translation completed',
+                translated_image_url=build_file_url(
+                    cached['output_file'], os.getenv('PRODUCTION_DOMAIN', 'example.com')
+                ),
+                original_filename=file.filename,
+                translated_filename=cached['output_file'],
+                translations=cached.get('payload', {}).get('translations', [])
+            )
+        
         # 4. 执行翻译
         output_filename = f"{timestamp}_translated_{file.filename}"
-        output_path = os.path.join(UPLOAD_FOLDER, output_filename)
+        output_path = file_store.upload_path(output_filename)
         
         api_logger.info(f"Expected output: {output_path}")
         
@@ -352,7 +759,8 @@ def translate_image():
                 ocr_url=OCR_SERVICE_URL,
                 inpaint_url=INPAINT_SERVICE_URL,
                 use_inpaint=USE_INPAINT,
-                enable_summary=enable_summary
+                enable_summary=enable_summary,
+                ocr_profile=ocr_profile
             )
             
             # 🔥 修复：区分不同的失败原因
@@ -421,8 +829,9 @@ def translate_image():
                 enable_summary=enable_summary
             )
             log_usage(usage_record)
-            # 验证输出文件名
-            actual_output_file = os.path.basename(output_path)
+            # 验证输出文件名（分片目录内的相对路径）
+            file_store.register(output_path)
+            actual_output_file = file_store.relpath(output_path)
             api_logger.info(f"   Expected filename: {output_filename}")
             api_logger.info(f"   Actual filename: {actual_output_file}")
             api_logger.info(f"   Output exists: {os.path.exists(output_path)}")
@@ -475,6 +884,12 @@ def translate_image():
             api_logger.info(f"   Is proxied: {is_proxied}")
             api_logger.info(f"   Final image URL: {image_url}")
             
+            summary = summary_payload(summary_result) if enable_summary else None
+            result_cache.put(cache_key, output_path, {
+                'translations': formatted_translations,
+                'summary': summary
+            })
+            
             return jsonify({
                 'success': True,
                 'message': 'Translation completed',
@@ -482,16 +897,9 @@ def translate_image():
                 'original_filename': file.filename,
                 'translated_filename': actual_output_file,
                 'processing_time': f"{elapsed:.2f}s",
+                **timing_payload(),
                 'translations': formatted_translations,
-                **(
-                    {
-                        'summary': {
-                            'success': summary_result['success'],
-                            'content': summary_result.get('summary'),
-                            'error': summary_result.get('error')
-                        }
-                    } if enable_summary and summary_result else {}
-                )
+                **({'summary': summary} if summary else {})
             })
         # 🔥 如果失败（未检测到文本），返回友好错误
         if not success:
@@ -507,13 +915,6 @@ def translate_image():
             api_logger.error(f"   Expected output: {output_path}")
             api_logger.error(f"   File exists: {os.path.exists(output_path)}")
             
-            try:
-                files = os.listdir(UPLOAD_FOLDER)
-                translated_files = [f for f in files if 'translated' in f and timestamp in f]
-                api_logger.error(f"   Files with timestamp {timestamp}: {translated_files}")
-            except Exception as e:
-                api_logger.error(f"   Cannot list files: {e}")
-            
             return jsonify({'error': 'Translation failed'}), 500
     
     except Exception as e:
@@ -533,11 +934,17 @@ def translate_image():
 
         log_exception(api_logger, e)
         return jsonify({'error': str(e)}), 500
+    
+    finally:
+        if cache_owner:
+            result_cache.release(cache_key)
 
 @app.route('/api/translate/pdf', methods=['POST'])
 def translate_pdf():
     """PDF翻译接口 - 模仿图片翻译的格式"""
     start_time = time.time()
+    cache_key = None
+    cache_owner = False
     
     try:
         from services.pdf_translator import translate_pdf_file
@@ -555,13 +962,12 @@ def translate_pdf():
             api_logger.warning(f"❌ Invalid file type: {file.filename}")
             return jsonify({'error': 'Only PDF files are supported'}), 400
         
-        # 2. 保存上传的文件
-        upload_dir = os.path.join(os.path.dirname(__file__), 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        file_path = os.path.join(upload_dir, file.filename)
-        file.save(file_path)
-        file_size = os.path.getsize(file_path) / 1024  # 转换为 KB
+        # 2. 保存上传的文件（分片目录，时间戳命名避免同名覆盖）
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        file_path = file_store.upload_path(f"{timestamp}_{file.filename}")
+        output_path = file_store.upload_path(f"{timestamp}_translated_{file.filename}")
+        content_hash, file_bytes = save_upload_with_hash(file, file_path)
+        file_size = file_bytes / 1024  # 转换为 KB
 
         # 3. 获取参数（与图片翻译保持一致）
         src_lang = request.form.get('source_lang', 'en')
@@ -575,6 +981,48 @@ def translate_pdf():
         api_logger.info(f"   {src_lang} → {tgt_lang}")
         api_logger.info(f"   AI Summary: {'✓' if enable_summary else '✗'}")
         
+        cache_key = make_cache_key(content_hash, 'pdf', src_lang, tgt_lang,
+                                   'layout' + ('+summary' if enable_summary else ''))
+        
+        # 3.1 异步模式：提交后台任务，立即返回 job_id
+        if wants_async():
+            return submit_translation_job('pdf', {
+                'input_path': file_path,
+                'output_path': output_path,
+                'source_lang': src_lang,
+                'target_lang': tgt_lang,
+                'enable_summary': enable_summary,
+                'cache_key': cache_key
+            }, create_usage_record(
+                request=request,
+                translation_type='pdf',
+                file_info={
+                    'source_lang': src_lang,
+                    'target_lang': tgt_lang,
+                    'file_name': file.filename,
+                    'file_size_kb': round(file_size, 2)
+                },
+                status='queued',
+                enable_summary=enable_summary
+            ))
+        
+        # 3.2 查询结果缓存
+        cached, cache_owner = lookup_result_cache(cache_key)
+        
+        if cached is not None:
+            return cache_hit_response(
+                cached, 'pdf', file_path, {
+                    'source_lang': src_lang,
+                    'target_lang': tgt_lang,
+                    'file_name': file.filename,
+                    'file_size_kb': round(file_size, 2)
+                }, start_time, enable_summary,
+                download_url=f"/api/files/{cached['output_file']}",
+                filename=cached['output_file'],
+                source_lang=src_lang,
+                target_lang=tgt_lang
+            )
+        
         # 4. 调用PDF翻译
         try:
             # 🔥 修改: 传递 enable_summary 参数
@@ -582,7 +1030,8 @@ def translate_pdf():
                 file_path, 
                 src_lang, 
                 tgt_lang,
-                enable_summary
+                enable_summary,
+                output_path=output_path
             )
         except Exception as e:
             # 如果复杂版本失败，尝试简单版本
@@ -609,7 +1058,8 @@ def translate_pdf():
         elapsed = time.time() - start_time
         
         # 5. 返回结果（与图片翻译格式一致）
-        download_filename = os.path.basename(translated_pdf_path)
+        file_store.register(translated_pdf_path)
+        download_filename = file_store.relpath(translated_pdf_path)
         
         api_logger.info(f"✓ PDF translation completed ({elapsed:.2f}s)")
         api_logger.info(f"   Output: {download_filename}")
@@ -628,6 +1078,10 @@ def translate_pdf():
             enable_summary=enable_summary
         )
         log_usage(usage_record)
+        
+        summary = summary_payload(summary_result) if enable_summary else None
+        result_cache.put(cache_key, translated_pdf_path, {'summary': summary})
+        
         # ✅ 修复：使用与图片翻译相同的 download_url 格式
         return jsonify({
             'success': True,
@@ -636,16 +1090,9 @@ def translate_pdf():
             'source_lang': src_lang,
             'target_lang': tgt_lang,
             'processing_time': f"{elapsed:.2f}s",
+            **timing_payload(),
             # 总结字段
-            **(
-                {
-                    'summary': {
-                        'success': summary_result['success'],
-                        'content': summary_result.get('summary'),
-                        'error': summary_result.get('error')
-                    }
-                } if enable_summary and summary_result else {}
-            )
+            **({'summary': summary} if summary else {})
         })
         
     except Exception as e:
@@ -676,6 +1123,10 @@ def translate_pdf():
             'error': 'PDF translation failed',
             'details': str(e)
         }), 500
+    
+    finally:
+        if cache_owner:
+            result_cache.release(cache_key)
 
 @app.route('/api/translate/translate-text', methods=['POST'])
 def translate_text():
@@ -738,7 +1189,8 @@ def translate_text():
                 api_logger.info(f"   分段数量: {len(chunks)}")
 
                 translator = get_translator()
-                translated_chunks = translator.translate_batch(chunks, src_lang, tgt_lang)
+                with span('text.translate', chunks=len(chunks)):
+                    translated_chunks = translator.translate_batch(chunks, src_lang, tgt_lang)
                 translated_text = '\n'.join(translated_chunks)
                 
                 if not translated_text:
@@ -752,36 +1204,21 @@ def translate_text():
                 'details': str(translation_error)
             }), 500
         
-        # 🔥 新增: AI 总结功能
-        summary_result = None
+        # 🔥 新增: AI 总结功能（后台生成，先返回 summary_id）
+        summary = None
         if enable_summary:
             try:
-                # 根据配置动态导入 AI 服务
-                from config import AI_PROVIDER
-                if AI_PROVIDER == 'qwen':
-                    from services.qwen_service import qwen_service as ai_service
-                else:
-                    from services.ollama_service import ollama_service as ai_service
-                
-                api_logger.info(f"🧠 开始生成AI总结 (提供商: {AI_PROVIDER})...")
-                summary_result = ai_service.generate_summary(
-                    text=translated_text,
-                    target_language=tgt_lang
-                )
-                
-                if summary_result['success']:
-                    api_logger.info(f"✓ AI总结生成成功")
-                else:
-                    api_logger.warning(f"⚠️ AI总结生成失败: {summary_result['error']}")
-                    
+                with span('text.summary.submit'):
+                    summary = summary_payload(summary_manager.submit(translated_text, tgt_lang))
             except Exception as summary_error:
                 api_logger.error(f"❌ AI总结异常: {summary_error}")
                 log_exception(api_logger, summary_error)
                 # 🔥 总结失败不影响翻译结果
-                summary_result = {
+                summary = {
                     'success': False,
-                    'summary': None,
-                    'error': '生成总结时发生错误 🔧'
+                    'content': None,
+                    'error': '生成总结时发生错误 🔧',
+                    'status': 'failed'
                 }
 
         elapsed = time.time() - start_time
@@ -796,16 +1233,9 @@ def translate_text():
             'source_lang': src_lang,
             'target_lang': tgt_lang,
             'processing_time': f"{elapsed:.2f}s",
+            **timing_payload(),
             # 🔥 总结字段 (如果启用)
-            **(
-                {
-                    'summary': {
-                        'success': summary_result['success'],
-                        'content': summary_result.get('summary'),
-                        'error': summary_result.get('error')
-                    }
-                } if enable_summary and summary_result else {}
-            )
+            **({'summary': summary} if summary else {})
         })
     
     except Exception as e:
@@ -818,6 +1248,8 @@ def translate_text():
 def translate_ppt():
     """PPT 翻译接口 - 与图片/PDF 格式保持一致"""
     start_time = time.time()
+    cache_key = None
+    cache_owner = False
     
     try:
         # 1. 检查文件
@@ -841,25 +1273,79 @@ def translate_ppt():
         enable_summary = request.form.get('enable_summary', 'false').lower() == 'true'
 
         simple_mode = request.form.get('simple', 'false').lower() == 'true'
+        try:
+            # 简化模式不处理图片，不需要 OCR
+            ocr_profile = None if simple_mode else ocr_profile_param()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         api_logger.info(f"📊 PPT translation request: {src_lang} → {tgt_lang}")
         api_logger.info(f"   Original filename: {file.filename}")
         api_logger.info(f"   Mode: {'Simple' if simple_mode else 'Full'}")
         api_logger.info(f"   AI Summary: {'✓' if enable_summary else '✗'}")
+        if ocr_profile:
+            api_logger.info(f"   OCR profile: {ocr_profile}")
        
         # 3. 保存上传的文件（使用时间戳命名）
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         safe_filename = f"{timestamp}_{file.filename}"
-        input_path = os.path.join(UPLOAD_FOLDER, safe_filename)
+        input_path = file_store.upload_path(safe_filename)
         
-        file.save(input_path)
-        file_size = os.path.getsize(input_path) / 1024
+        content_hash, file_bytes = save_upload_with_hash(file, input_path)
+        file_size = file_bytes / 1024
         api_logger.info(f"✓ File saved: {input_path} ({file_size:.1f}KB)")
         
-        # 4. 执行翻译
+        cache_mode = (('simple' if simple_mode else 'full') + ('+summary' if enable_summary else '')
+                      + (f'+ocr-{ocr_profile}' if ocr_profile else ''))
+        cache_key = make_cache_key(content_hash, 'ppt', src_lang, tgt_lang, cache_mode)
         output_filename = f"{timestamp}_translated_{file.filename}"
-        output_path = os.path.join(UPLOAD_FOLDER, output_filename)
+        output_path = file_store.upload_path(output_filename)
+        
+        # 3.1 异步模式：提交后台任务，立即返回 job_id
+        if wants_async():
+            return submit_translation_job('ppt', {
+                'input_path': input_path,
+                'output_path': output_path,
+                'original_filename': file.filename,
+                'file_url_base': build_file_url('', 'chat.offerupup.cn'),
+                'source_lang': src_lang,
+                'target_lang': tgt_lang,
+                'enable_summary': enable_summary,
+                'simple_mode': simple_mode,
+                'ocr_profile': ocr_profile,
+                'cache_key': cache_key
+            }, create_usage_record(
+                request=request,
+                translation_type='ppt',
+                file_info={
+                    'source_lang': src_lang,
+                    'target_lang': tgt_lang,
+                    'file_name': file.filename,
+                    'file_size_kb': round(file_size, 2)
+                },
+                status='queued',
+                enable_summary=enable_summary
+            ))
+        
+        # 3.2 查询结果缓存
+        cached, cache_owner = lookup_result_cache(cache_key)
+        
+        if cached is not None:
+            return cache_hit_response(
+                cached, 'ppt', input_path, {
+                    'source_lang': src_lang,
+                    'target_lang': tgt_lang,
+                    'file_name': file.filename,
+                    'file_size_kb': round(file_size, 2)
+                }, start_time, enable_summary,
+                message='Translation completed',
+                translated_ppt_url=build_file_url(cached['output_file'], 'chat.offerupup.cn'),
+                original_filename=file.filename,
+                translated_filename=cached['output_file'],
+                mode='simple' if simple_mode else 'full'
+            )
         
+        # 4. 执行翻译
         api_logger.info(f"   Expected output: {output_path}")
         
         try:
@@ -867,7 +1353,7 @@ def translate_ppt():
             
             # 根据模式选择翻译方法
             if simple_mode:
-                actual_output_path = translate_ppt_simple(
+                actual_output_path, summary_result = translate_ppt_simple(
                     input_path,
                     src_lang=src_lang,
                     tgt_lang=tgt_lang,
@@ -880,7 +1366,8 @@ def translate_ppt():
                     src_lang=src_lang,
                     tgt_lang=tgt_lang,
                     output_path=output_path,
-                    enable_summary=enable_summary
+                    enable_summary=enable_summary,
+                    ocr_profile=ocr_profile
                 )
             
         except Exception as translation_error:
@@ -913,7 +1400,8 @@ def translate_ppt():
 
         # 5. 验证输出文件
         if os.path.exists(actual_output_path):
-            actual_output_file = os.path.basename(actual_output_path)
+            file_store.register(actual_output_path)
+            actual_output_file = file_store.relpath(actual_output_path)
             api_logger.info(f"✓ Translation completed ({elapsed:.2f}s)")
             api_logger.info(f"   Expected filename: {output_filename}")
             api_logger.info(f"   Actual filename: {actual_output_file}")
@@ -933,27 +1421,12 @@ def translate_ppt():
                 enable_summary=enable_summary
             )
             log_usage(usage_record)
+            
+            summary = summary_payload(summary_result) if enable_summary else None
+            result_cache.put(cache_key, actual_output_path, {'summary': summary})
 
             # 6. 构建下载 URL（与图片翻译逻辑一致）
-            scheme = request.headers.get('X-Forwarded-Proto', request.scheme)
-            host = request.headers.get('X-Forwarded-Host', request.host)
-            forwarded_host = request.headers.get('X-Forwarded-Host', '')
-            original_uri = request.headers.get('X-Original-URI', '')
-            referer = request.headers.get('Referer', '')
-            
-            is_proxied = (
-                'chat.offerupup.cn' in host or 
-                'chat.offerupup.cn' in forwarded_host or
-                'translator-api' in original_uri or
-                'translator-api' in referer
-            )
-            
-            if is_proxied:
-                download_url = f"{scheme}://{host}/translator-api/api/files/{actual_output_file}"
-            else:
-                download_url = f"{scheme}://{host}/api/files/{actual_output_file}"
-            
-            api_logger.info(f"   Is proxied: {is_proxied}")
+            download_url = build_file_url(actual_output_file, 'chat.offerupup.cn')
             api_logger.info(f"   Final download URL: {download_url}")
             
             # 7. 返回结果
@@ -964,17 +1437,10 @@ def translate_ppt():
                 'original_filename': file.filename,
                 'translated_filename': actual_output_file,
                 'processing_time': f"{elapsed:.2f}s",
+                **timing_payload(),
                 'mode': 'simple' if simple_mode else 'full',
                 # 🔥 总结字段 (如果启用)
-                **(
-                    {
-                        'summary': {
-                            'success': summary_result['success'],
-                            'content': summary_result.get('summary'),
-                            'error': summary_result.get('error')
-                        }
-                    } if enable_summary and summary_result else {}
-                )
+                **({'summary': summary} if summary else {})
             })
         else:
             elapsed = time.time() - start_time
@@ -1027,42 +1493,340 @@ def translate_ppt():
         api_logger.error(f"❌ PPT translation API error: {e}")
         log_exception(api_logger, e)
         return jsonify({'error': str(e)}), 500
+    
+    finally:
+        if cache_owner:
+            result_cache.release(cache_key)
+
+
+
+@app.route('/api/translate/batch', methods=['POST'])
+def translate_batch():
+    """批量翻译接口 - 上传一个 ZIP 或多个文件，结果以 ZIP 流式返回（含 manifest.json）"""
+    start_time = time.time()
+    from services.batch_translator import (
+        BatchItem, BatchTranslator, BatchTooLarge, BATCH_MAX_FILES, BATCH_MAX_TOTAL_BYTES,
+        file_kind, list_zip_members, stream_result_zip
+    )
+    saved_paths = []  # 已写入磁盘的上传/解压文件，请求被拒绝时删除
+    
+    try:
+        # 请求体本身超过总大小限制时，在解析上传文件之前直接拒绝
+        if request.content_length and request.content_length > BATCH_MAX_TOTAL_BYTES:
+            raise BatchTooLarge(f"Request too large: {request.content_length / 1024 / 1024:.1f}MB")
+        
+        # 1. 检查文件（files 多文件字段，或 file 单个 ZIP）
+        uploads = [f for f in request.files.getlist('files') + request.files.getlist('file') if f and f.filename]
+        if not uploads:
+            api_logger.warning("❌ No files in batch request")
+            return jsonify({'error': 'No files provided'}), 400
+        
+        # 2. 获取参数
+        src_lang = request.form.get('source_lang', 'en')
+        tgt_lang = request.form.get('target_lang', 'zh')
+        try:
+            ocr_profile = ocr_profile_param()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        batch_id = uuid.uuid4().hex[:12]
+        items = []
+        used_names = set()
+        total_bytes = 0
+        
+        def add_item(name):
+            """登记一个文件（同名文件自动加序号），返回 BatchItem"""
+            stem, ext = os.path.splitext(name)
+            unique_name, n = name, 1
+            while unique_name in used_names:
+                unique_name = f"{stem}_{n}{ext}"
+                n += 1
+            used_names.add(unique_name)
+            
+            if len(items) >= BATCH_MAX_FILES:
+                raise BatchTooLarge(f"Too many files: more than {BATCH_MAX_FILES}")
+            
+            prefix = f"{timestamp}_{batch_id}_{len(items)}"
+            basename = os.path.basename(unique_name)
+            item = BatchItem(
+                len(items), unique_name,
+                file_store.upload_path(f"{prefix}_{basename}"),
+                file_store.upload_path(f"{prefix}_translated_{basename}")
+            )
+            items.append(item)
+            return item
+        
+        def add_bytes(path):
+            """累计已保存文件的实际大小，超出总大小限制（多个文件 / 多个 ZIP 合计）时拒绝"""
+            nonlocal total_bytes
+            saved_paths.append(path)
+            total_bytes += os.path.getsize(path)
+            if total_bytes > BATCH_MAX_TOTAL_BYTES:
+                raise BatchTooLarge(f"Batch too large: more than {BATCH_MAX_TOTAL_BYTES / 1024 / 1024:.0f}MB")
+        
+        # 3. 保存上传文件（ZIP 只解压支持的文件类型，解压后删除 ZIP）
+        for upload in uploads:
+            if upload.filename.lower().endswith('.zip'):
+                zip_path = file_store.upload_path(f"{timestamp}_{batch_id}_{upload.filename}")
+                try:
+                    upload.save(zip_path)
+                    with zipfile.ZipFile(zip_path) as zf:
+                        for name, info in list_zip_members(zip_path):
+                            item = add_item(name)
+                            if item.kind is None:
+                                continue
+                            with zf.open(info) as src, open(item.input_path, 'wb') as dst:
+                                shutil.copyfileobj(src, dst)
+                            add_bytes(item.input_path)
+                finally:
+                    if os.path.exists(zip_path):
+                        os.remove(zip_path)
+            else:
+                item = add_item(upload.filename)
+                if item.kind is None:
+                    continue
+                upload.save(item.input_path)
+                add_bytes(item.input_path)
+        
+        supported = sum(1 for item in items if file_kind(item.name))
+        api_logger.info(f"📦 Batch translation request: {src_lang} → {tgt_lang}")
+        api_logger.info(f"   Batch: {batch_id}, files: {len(items)} (supported: {supported}), "
+                        f"size: {total_bytes / 1024 / 1024:.1f}MB")
+        
+        usage_record = create_usage_record(
+            request=request,
+            translation_type='batch',
+            file_info={
+                'source_lang': src_lang,
+                'target_lang': tgt_lang,
+                'file_name': f"{len(items)} files",
+                'file_size_kb': round(total_bytes / 1024, 2)
+            },
+            status='running'
+        )
+        
+        def on_complete(manifest):
+            usage_record['processing_time_seconds'] = round(time.time() - start_time, 2)
+            usage_record['status'] = 'success' if manifest['failed'] == 0 else 'partial'
+            usage_record['batch'] = {
+                key: manifest[key] for key in ('total', 'succeeded', 'failed', 'skipped', 'translate_calls')
+            }
+            log_usage(usage_record)
+            api_logger.info(f"✓ Batch {batch_id} completed: {manifest['succeeded']}/{manifest['total']} "
+                            f"({usage_record['processing_time_seconds']:.2f}s)")
+        
+        # 4. 流式返回结果 ZIP（每完成一个文件写入一个条目）
+        batch = BatchTranslator(items, src_lang, tgt_lang, ocr_profile=ocr_profile)
+        response = Response(
+            stream_with_context(stream_result_zip(batch, {'batch_id': batch_id}, on_complete)),
+            mimetype='application/zip'
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="translated_{batch_id}.zip"'
+        response.headers['X-Batch-Id'] = batch_id
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    
+    except BatchTooLarge as e:
+        api_logger.warning(f"❌ Batch too large: {e}")
+        remove_files(saved_paths)
+        return jsonify({'error': str(e)}), 413
+    
+    except zipfile.BadZipFile as e:
+        api_logger.warning(f"❌ Invalid ZIP file: {e}")
+        remove_files(saved_paths)
+        return jsonify({'error': 'Invalid ZIP file'}), 400
+    
+    except Exception as e:
+        remove_files(saved_paths)
+        elapsed = time.time() - start_time
+        try:
+            log_usage(create_usage_record(
+                request=request,
+                translation_type='batch',
+                processing_time=elapsed,
+                status='error',
+                error_message=str(e)
+            ))
+        except:
+            pass
+        api_logger.error(f"❌ Batch translation API error: {e}")
+        log_exception(api_logger, e)
+        return jsonify({'error': 'Batch translation failed', 'details': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询后台任务状态与进度（完成后 result 字段与同步接口返回格式一致）"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    job['queue_position'] = job_manager.queue_position(job_id)
+    return jsonify(job)
 
 
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """取消后台任务（运行中的任务在处理完当前页/幻灯片后停止）"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/events')
+def stream_job_events(job_id):
+    """以 Server-Sent Events 推送任务进度，任务结束后关闭连接"""
+    if job_manager.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        version = None
+        while True:
+            job, version, changed = job_manager.wait_for_update(job_id, version, timeout=JOB_SSE_HEARTBEAT)
+            if job is None:
+                break
+            
+            if changed:
+                event = job['status'] if job['status'] in TERMINAL_STATUSES else 'progress'
+                yield f"event: {event}\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+            else:
+                yield ": keepalive\n\n"
+            
+            if job['status'] in TERMINAL_STATUSES:
+                break
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 关闭 Nginx 缓冲，逐条推送
+    return response
+
+
+@app.route('/api/summaries/<summary_id>', methods=['GET'])
+def get_summary(summary_id):
+    """
+    查询 AI 总结（翻译接口返回的 summary.summary_id）
+
+    ?wait=秒：总结未完成时最多阻塞等待这么久（长轮询，最长 60 秒）
+    """
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), 60)
+    except ValueError:
+        wait = 0
+    
+    result = summary_manager.wait(summary_id, wait) if wait else summary_manager.get(summary_id)
+    if result is None:
+        return jsonify({'error': 'Summary not found'}), 404
+    return jsonify(summary_payload(result))
+
+
+def summary_event_stream(summary_id, first_event=None):
+    """
+    AI 总结的 SSE 事件流
+
+    - meta：summary_id 与是否命中缓存（仅 POST /api/summaries/stream）
+    - token：新生成的文本片段（data 为 {"text": ...}）
+    - done / failed：最终结果（含首个 token 延迟等指标），之后关闭连接
+    """
+    def generate():
+        if first_event is not None:
+            yield f"event: meta\ndata: {json.dumps(first_event, ensure_ascii=False)}\n\n"
+        for event, data in summary_manager.iter_events(summary_id, heartbeat=JOB_SSE_HEARTBEAT):
+            if event == 'keepalive':
+                yield ": keepalive\n\n"
+            elif event == 'token':
+                yield f"event: token\ndata: {json.dumps({'text': data}, ensure_ascii=False)}\n\n"
+            else:
+                payload = dict(summary_payload(data), metrics=data.get('metrics'))
+                yield f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/summaries/<summary_id>/events')
+def stream_summary_events(summary_id):
+    """以 Server-Sent Events 逐段推送 AI 总结，生成结束后关闭连接"""
+    if summary_manager.get(summary_id) is None:
+        return jsonify({'error': 'Summary not found'}), 404
+    return summary_event_stream(summary_id)
+
+
+@app.route('/api/summaries/stream', methods=['POST'])
+def stream_summary():
+    """
+    流式生成 AI 总结（SSE）
+
+    请求体：{"text": "...", "target_lang": "zh"}
+    已缓存的总结直接以 done 事件返回
+    """
+    data = request.get_json(silent=True) or {}
+    text = data.get('text', '')
+    tgt_lang = data.get('target_lang', 'zh')
+    if not text or not text.strip():
+        return jsonify({'error': 'Text is required'}), 400
+    
+    result = summary_manager.submit(text, tgt_lang)
+    if not result.get('summary_id'):
+        return jsonify({'error': result.get('error')}), 400
+    
+    api_logger.info(f"🧠 流式总结: {result['summary_id']} ({result['status']})")
+    return summary_event_stream(result['summary_id'], {
+        'summary_id': result['summary_id'],
+        'cached': result['status'] == 'done',
+        'model': result.get('model')
+    })
+
 
 @app.route('/api/files/<path:filename>')
 def serve_file(filename):
-    """提供文件访问"""
+    """
+    提供文件访问
+
+    - 按扩展名返回正确的 Content-Type
+    - 支持 ETag / Last-Modified 条件请求和 Range 分段下载
+    - 开启 FILES_X_ACCEL_REDIRECT 时交给 Nginx 用 sendfile 直接发送
+    """
     upload_dir = os.path.abspath(UPLOAD_FOLDER)
-    file_path = os.path.join(upload_dir, filename)
-    
-    api_logger.info(f"📂 File request: {filename}")
-    api_logger.info(f"   Path: {file_path}")
-    api_logger.info(f"   Exists: {os.path.exists(file_path)}")
     
-    # 安全检查
-    if not file_path.startswith(upload_dir):
+    # 安全检查（拒绝 .. 等越界路径）
+    file_path = safe_join(upload_dir, filename)
+    if file_path is None:
         api_logger.warning(f"⚠️  Invalid path: {filename}")
         return jsonify({'error': 'Invalid path'}), 403
     
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        api_logger.info(f"✓ Serving: {filename}")
-        return send_file(
-            file_path,
-            mimetype='image/png',
-            as_attachment=False
-        )
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
+        file_stat = None
     
-    api_logger.error(f"❌ Not found: {filename}")
+    if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
+        api_logger.warning(f"❌ Not found: {filename}")
+        return jsonify({'error': 'File not found'}), 404
     
-    # 调试：列出可用文件
-    try:
-        files = os.listdir(upload_dir)
-        api_logger.info(f"   Available files: {files}")
-    except Exception as e:
-        api_logger.error(f"   Cannot list: {e}")
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    api_logger.debug(f"📂 Serving: {filename} ({mimetype}, {file_stat.st_size / 1024:.1f}KB)")
     
-    return jsonify({'error': 'File not found'}), 404
+    if FILES_X_ACCEL_REDIRECT:
+        # Nginx internal location 负责发送字节（sendfile、Range、条件请求）
+        response = app.response_class(status=200, mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = FILES_X_ACCEL_PREFIX.rstrip('/') + '/' + quote(filename)
+        response.headers['Cache-Control'] = f'public, max-age={FILES_CACHE_MAX_AGE}'
+        return response
+    
+    return send_file(
+        file_path,
+        mimetype=mimetype,
+        as_attachment=False,
+        conditional=True,
+        etag=True,
+        last_modified=file_stat.st_mtime,
+        max_age=FILES_CACHE_MAX_AGE
+    )
 
 
 @app.errorhandler(413)
@@ -1295,25 +2059,18 @@ def get_system_status():
         upload_disk = shutil.disk_usage(UPLOAD_FOLDER)
         archive_disk = shutil.disk_usage(ARCHIVE_FOLDER)
         
-        # 文件统计
-        upload_files = len(list(Path(UPLOAD_FOLDER).glob('*')))
-        
-        # 归档文件统计
-        archive_count = 0
-        archive_size = 0
-        for root, dirs, files in os.walk(ARCHIVE_FOLDER):
-            archive_count += len(files)
-            for file in files:
-                try:
-                    archive_size += os.path.getsize(os.path.join(root, file))
-                except:
-                    pass
+        # 文件统计（来自存储台账，只增量扫描有变化的分片目录）
+        file_store.refresh()
+        storage_stats = file_store.stats()
+        upload_files = storage_stats['upload']['files_count']
+        archive_count = storage_stats['archive']['files_count']
+        archive_size = storage_stats['archive']['total_bytes']
         
         # 检查服务状态
         services_status = {
             'api': True,  # 当前服务肯定在运行
-            'ocr': check_service_health(OCR_SERVICE_URL),
-            'inpaint': check_service_health(INPAINT_SERVICE_URL) if USE_INPAINT else None,
+            'ocr': http_client.is_healthy('ocr'),
+            'inpaint': http_client.is_healthy('inpaint') if USE_INPAINT else None,
         }
         
         return jsonify({
@@ -1332,9 +2089,15 @@ def get_system_status():
             'archive_folder': {
                 'path': ARCHIVE_FOLDER,
                 'files_count': archive_count,
-                'total_size_gb': round(archive_size / (1024**3), 2)
+                'total_size_gb': round(archive_size / (1024**3), 2),
+                'max_size_gb': round(storage_stats['archive']['max_bytes'] / (1024**3), 2),
+                'pending_compression': storage_stats['archive']['pending_compression']
             },
             'services': services_status,
+            'jobs': job_manager.stats(),
+            'admission': admission.stats(),
+            'summaries': summary_manager.stats(),
+            'upstreams': http_client.stats(),
             'uptime': get_uptime()
         })
         
@@ -1343,16 +2106,6 @@ def get_system_status():
         return jsonify({'error': str(e)}), 500
 
 
-def check_service_health(url):
-    """检查服务健康状态"""
-    try:
-        import requests
-        response = requests.get(url, timeout=2)
-        return response.status_code == 200
-    except:
-        return False
-
-
 # 启动时间（用于计算 uptime）
 _start_time = time.time()
 
@@ -13,9 +13,16 @@ except ImportError:
 
 # 基础路径
 BASE_DIR = Path(__file__).parent
-UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', str(BASE_DIR / 'uploads'))
-ARCHIVE_FOLDER = os.getenv('ARCHIVE_FOLDER', str(BASE_DIR / 'archives'))
-LOG_FOLDER = os.getenv('LOG_FOLDER', str(BASE_DIR / 'logs'))
+
+
+def resolve_path(value):
+    """相对路径按 translator_api 目录解析（与启动时的工作目录无关）"""
+    return str(BASE_DIR / value) if not os.path.isabs(value) else value
+
+
+UPLOAD_FOLDER = resolve_path(os.getenv('UPLOAD_FOLDER', 'uploads'))
+ARCHIVE_FOLDER = resolve_path(os.getenv('ARCHIVE_FOLDER', 'archives'))
+LOG_FOLDER = resolve_path(os.getenv('LOG_FOLDER', 'logs'))
 
 # 服务端口配置（本地默认值）
 API_HOST = os.getenv('API_HOST', '0.0.0.0')
@@ -30,6 +37,17 @@ INPAINT_PORT = int(os.getenv('INPAINT_PORT', '8900'))
 OCR_SERVICE_URL = os.getenv('OCR_SERVICE_URL', f'http://{OCR_HOST}:{OCR_PORT}/ocr')
 INPAINT_SERVICE_URL = os.getenv('INPAINT_SERVICE_URL', f'http://{INPAINT_HOST}:{INPAINT_PORT}/inpaint')
 USE_INPAINT = os.getenv('USE_INPAINT', 'True').lower() == 'true'
+# 以二进制（application/octet-stream）上传图片给 OCR 服务；关闭则使用旧的 base64 JSON 接口
+OCR_BINARY_UPLOAD = os.getenv('OCR_BINARY_UPLOAD', 'true').lower() == 'true'
+# OCR 响应格式：compact 只返回文本 / 置信度 / 扁平 int32 多边形（full 为 PaddleOCR 完整结果）
+OCR_RESPONSE_FORMAT = os.getenv('OCR_RESPONSE_FORMAT', 'compact')
+# 紧凑格式中多边形的编码：base64 / json / msgpack（msgpack 需要两端都安装）
+OCR_POLY_ENCODING = os.getenv('OCR_POLY_ENCODING', 'base64')
+# 批量 OCR（/ocr/batch）每次请求的图片数（PPT 的幻灯片图片按此分组发送）
+OCR_BATCH_SIZE = int(os.getenv('OCR_BATCH_SIZE', '16'))
+# 默认 OCR 配置档：fast（正向截图，更快）/ accurate / int8（OCR 服务配置了量化模型时）；为空时使用 OCR 服务的默认配置档
+# 图片 / PPT / 批量接口可用 ocr_profile 表单参数按请求覆盖
+OCR_PROFILE = os.getenv('OCR_PROFILE', '')
 
 # CORS 允许的源（本地 + 生产）
 ALLOWED_ORIGINS_STR = os.getenv('ALLOWED_ORIGINS', 'http://localhost:5001,http://127.0.0.1:5001')
@@ -71,3 +89,119 @@ OPENAI_TEMPERATURE = float(os.getenv('OPENAI_TEMPERATURE', '0.7'))
 
 # 通用配置
 SUMMARY_MAX_WORDS = int(os.getenv('SUMMARY_MAX_WORDS', '200'))  # 总结最大字数
+
+# 异步总结：翻译结果先返回 summary_id，总结在后台线程池生成
+SUMMARY_WORKERS = int(os.getenv('SUMMARY_WORKERS', '2'))
+# 总结缓存（按 文本哈希 + 目标语言 + 模型）
+SUMMARY_CACHE_FILE = resolve_path(os.getenv('SUMMARY_CACHE_FILE', 'cache/summary_cache.json'))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', '1000'))
+# 长文档分段总结（map-reduce）：超过单段上限的文本先分段并行总结，再合并
+SUMMARY_SECTION_TOKENS = int(os.getenv('SUMMARY_SECTION_TOKENS', '1500'))  # 每段估算 token 上限
+SUMMARY_MAP_CONCURRENCY = int(os.getenv('SUMMARY_MAP_CONCURRENCY', '3'))  # 分段总结的最大并发
+SUMMARY_MAX_SECTIONS = int(os.getenv('SUMMARY_MAX_SECTIONS', '24'))  # 分段数上限（超出时加大每段长度，不丢弃内容）
+
+# ========== 请求链路追踪 ==========
+# 是否把完成的 trace 导出到本地 collector 文件（JSON Lines）
+TRACE_EXPORT_ENABLED = os.getenv('TRACE_EXPORT_ENABLED', 'False').lower() == 'true'
+TRACE_EXPORT_FILE = os.getenv('TRACE_EXPORT_FILE', str(Path(LOG_FOLDER) / 'traces' / 'traces.jsonl'))
+# 是否默认在响应中返回耗时明细（也可按请求传 return_timing=true 或 X-Debug-Timing: 1）
+TRACE_RETURN_TIMING = os.getenv('TRACE_RETURN_TIMING', 'False').lower() == 'true'
+
+# ========== 整文件结果缓存 ==========
+# 相同文件 + 相同参数重复上传时直接返回已有结果
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'True').lower() == 'true'
+RESULT_CACHE_INDEX_FILE = resolve_path(os.getenv('RESULT_CACHE_INDEX_FILE', 'cache/result_cache.json'))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '2000'))
+# 相同上传并发到达时，等待首个请求完成的最长秒数
+RESULT_CACHE_WAIT_TIMEOUT = int(os.getenv('RESULT_CACHE_WAIT_TIMEOUT', '600'))
+# 翻译引擎 / 渲染逻辑升级时修改此值，使旧缓存失效
+RESULT_CACHE_ENGINE_VERSION = os.getenv('RESULT_CACHE_ENGINE_VERSION', '1')
+
+# ========== 文件下载 (/api/files) ==========
+# 开启后只返回 X-Accel-Redirect 头，由 Nginx internal location 用 sendfile 发送文件
+FILES_X_ACCEL_REDIRECT = os.getenv('FILES_X_ACCEL_REDIRECT', 'False').lower() == 'true'
+FILES_X_ACCEL_PREFIX = os.getenv('FILES_X_ACCEL_PREFIX', '/protected-files/')
+# 浏览器缓存时间（秒），过期后通过 ETag / Last-Modified 重新验证
+FILES_CACHE_MAX_AGE = int(os.getenv('FILES_CACHE_MAX_AGE', '3600'))
+
+# ========== 上传存储与归档 ==========
+# 上传文件按文件名哈希前缀分到子目录（2 位十六进制 = 256 个分片）
+UPLOAD_SHARD_CHARS = int(os.getenv('UPLOAD_SHARD_CHARS', '2'))
+# 文件台账（SQLite），记录每个文件的大小和时间
+STORAGE_LEDGER_FILE = resolve_path(os.getenv('STORAGE_LEDGER_FILE', 'cache/storage_ledger.db'))
+# 上传文件超过多少小时后归档
+ARCHIVE_MAX_AGE_HOURS = float(os.getenv('ARCHIVE_MAX_AGE_HOURS', '2'))
+# 归档压缩: zstd / none（未安装 zstandard 时自动退回 gzip）
+ARCHIVE_COMPRESSION = os.getenv('ARCHIVE_COMPRESSION', 'zstd').lower()
+ARCHIVE_ZSTD_LEVEL = int(os.getenv('ARCHIVE_ZSTD_LEVEL', '3'))
+# 归档总容量预算（GB），超出后从最旧的文件开始删除；0 表示不限制
+ARCHIVE_MAX_BYTES = int(float(os.getenv('ARCHIVE_MAX_GB', '0')) * 1024 ** 3)
+
+# ========== 异步任务队列（PDF / PPT）==========
+# 后台 worker 数量（同时处理的文档数）
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+# 最多排队任务数，超出后提交接口返回 503
+JOB_MAX_QUEUED = int(os.getenv('JOB_MAX_QUEUED', '20'))
+# 任务状态库（SQLite），服务重启后排队中的任务会继续执行
+JOB_DB_FILE = resolve_path(os.getenv('JOB_DB_FILE', 'cache/jobs.db'))
+# 已结束任务的保留时间（小时）
+JOB_RETENTION_HOURS = float(os.getenv('JOB_RETENTION_HOURS', '24'))
+# SSE 心跳间隔（秒）
+JOB_SSE_HEARTBEAT = int(os.getenv('JOB_SSE_HEARTBEAT', '15'))
+
+# ========== 批量翻译 (/api/translate/batch) ==========
+# 单次批量请求最多文件数、解压后总大小上限（MB）
+BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', '200'))
+BATCH_MAX_TOTAL_BYTES = int(os.getenv('BATCH_MAX_TOTAL_MB', '500')) * 1024 * 1024
+# OCR / Inpaint 并发数（OCR 与翻译、Inpaint 流水线重叠执行）
+BATCH_OCR_CONCURRENCY = int(os.getenv('BATCH_OCR_CONCURRENCY', '2'))
+BATCH_RENDER_CONCURRENCY = int(os.getenv('BATCH_RENDER_CONCURRENCY', '2'))
+# PDF / PPT 整个文档的翻译并发数（单独的线程池，不占用图片的 Inpaint 线程）
+BATCH_DOCUMENT_CONCURRENCY = int(os.getenv('BATCH_DOCUMENT_CONCURRENCY', '1'))
+# 跨文件合并翻译时每批最多文本段数
+BATCH_TRANSLATE_SEGMENTS = int(os.getenv('BATCH_TRANSLATE_SEGMENTS', '64'))
+
+# ========== 准入控制（并发 / 排队限制）==========
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'True').lower() == 'true'
+# 图片 / 文档 / 批量等重型请求的全局并发上限（文本翻译不占用）
+ADMISSION_GLOBAL_LIMIT = int(os.getenv('ADMISSION_GLOBAL_LIMIT', '6'))
+# 单个客户端（X-Forwarded-For）最多排队请求数，超出返回 429
+ADMISSION_MAX_QUEUED_PER_CLIENT = int(os.getenv('ADMISSION_MAX_QUEUED_PER_CLIENT', '4'))
+# 各类别：并发上限、排队长度、最长等待秒数、优先级（0 最高）
+ADMISSION_CLASSES = {
+    'text': {
+        'max_concurrent': int(os.getenv('ADMISSION_TEXT_CONCURRENCY', '8')),
+        'max_queue': int(os.getenv('ADMISSION_TEXT_QUEUE', '32')),
+        'timeout': float(os.getenv('ADMISSION_TEXT_TIMEOUT', '10')),
+        'priority': 0
+    },
+    'image': {
+        'max_concurrent': int(os.getenv('ADMISSION_IMAGE_CONCURRENCY', '4')),
+        'max_queue': int(os.getenv('ADMISSION_IMAGE_QUEUE', '16')),
+        'timeout': float(os.getenv('ADMISSION_IMAGE_TIMEOUT', '60')),
+        'priority': 1
+    },
+    'document': {
+        'max_concurrent': int(os.getenv('ADMISSION_DOCUMENT_CONCURRENCY', '2')),
+        'max_queue': int(os.getenv('ADMISSION_DOCUMENT_QUEUE', '8')),
+        'timeout': float(os.getenv('ADMISSION_DOCUMENT_TIMEOUT', '120')),
+        'priority': 2
+    },
+    'batch': {
+        'max_concurrent': int(os.getenv('ADMISSION_BATCH_CONCURRENCY', '1')),
+        'max_queue': int(os.getenv('ADMISSION_BATCH_QUEUE', '2')),
+        'timeout': float(os.getenv('ADMISSION_BATCH_TIMEOUT', '30')),
+        'priority': 2
+    },
+}
+
+# ========== 出站 HTTP 连接池配置 ==========
+# OCR / Inpaint / Ollama / Qwen 各自复用 keep-alive 连接
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))  # 每个上游的最大连接数
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3'))  # 建立连接超时（秒）
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))  # 连接失败 / 502-504 的重试次数
+HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', '0.3'))  # 重试退避系数（秒）
+HTTP_HEALTH_INTERVAL = int(os.getenv('HTTP_HEALTH_INTERVAL', '15'))  # 后台健康检查间隔（秒）
+# 各上游的读取超时（秒）
+OCR_READ_TIMEOUT = float(os.getenv('OCR_READ_TIMEOUT', '60'))
+INPAINT_READ_TIMEOUT = float(os.getenv('INPAINT_READ_TIMEOUT', '120'))
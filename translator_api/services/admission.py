@@ -0,0 +1,268 @@
+"""
+准入控制 - 按接口类别限制并发与排队
+
+- 每个接口类别（文本 / 图片 / 文档 / 批量）有独立的并发上限、排队长度和等待超时
+- 文本翻译为交互式请求，优先级最高，且不占用重型任务的全局并发额度
+- 空出名额时优先分配给当前占用请求最少的客户端（按 X-Forwarded-For 区分）
+- 排队已满 / 等待超时返回 503，单个客户端排队过多返回 429，均带 Retry-After
+"""
+import itertools
+import math
+import threading
+import time
+
+from logger_config import app_logger
+
+try:
+    from config import (
+        ADMISSION_ENABLED,
+        ADMISSION_GLOBAL_LIMIT,
+        ADMISSION_MAX_QUEUED_PER_CLIENT,
+        ADMISSION_CLASSES
+    )
+except ImportError:
+    ADMISSION_ENABLED = True
+    ADMISSION_GLOBAL_LIMIT = 6
+    ADMISSION_MAX_QUEUED_PER_CLIENT = 4
+    ADMISSION_CLASSES = {
+        'text': {'max_concurrent': 8, 'max_queue': 32, 'timeout': 10, 'priority': 0},
+        'image': {'max_concurrent': 4, 'max_queue': 16, 'timeout': 60, 'priority': 1},
+        'document': {'max_concurrent': 2, 'max_queue': 8, 'timeout': 120, 'priority': 2},
+        'batch': {'max_concurrent': 1, 'max_queue': 2, 'timeout': 30, 'priority': 2},
+    }
+
+# 接口路径 → 类别（未列出的接口不做准入控制）
+ENDPOINT_CLASSES = {
+    '/api/translate/translate-text': 'text',
+    '/api/translate/image': 'image',
+    '/api/translate/pdf': 'document',
+    '/api/translate/ppt': 'document',
+    '/api/translate/batch': 'batch',
+}
+
+# 服务耗时滑动平均的权重（用于估算 Retry-After）
+EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """请求未被接纳"""
+
+    def __init__(self, status_code, reason, retry_after):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class EndpointClass:
+    """单个接口类别的限额与计数"""
+
+    def __init__(self, name, max_concurrent, max_queue, timeout, priority):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.priority = priority
+        self.active = 0
+        self.waiting = 0
+        self.avg_service_time = 1.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+
+    def retry_after(self):
+        """按平均处理时间和排队长度估算多久后重试（秒）"""
+        estimate = self.avg_service_time * (self.waiting + 1) / max(self.max_concurrent, 1)
+        return int(min(max(math.ceil(estimate), 1), 120))
+
+
+class Ticket:
+    """已获准的请求，结束时交还给 release()"""
+
+    def __init__(self, endpoint_class, client_id, wait_seconds):
+        self.endpoint_class = endpoint_class
+        self.client_id = client_id
+        self.wait_seconds = wait_seconds
+        self.granted_at = time.time()
+
+
+class _Waiter:
+    def __init__(self, endpoint_class, client_id, seq):
+        self.endpoint_class = endpoint_class
+        self.client_id = client_id
+        self.seq = seq
+        self.granted = False
+
+
+class AdmissionController:
+    """准入控制器（线程安全）"""
+
+    def __init__(self, classes, global_limit=6, max_queued_per_client=4, enabled=True):
+        self.enabled = enabled
+        self.global_limit = global_limit
+        self.max_queued_per_client = max_queued_per_client
+        self.classes = {
+            name: EndpointClass(name, **settings) for name, settings in classes.items()
+        }
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._heavy_active = 0
+        self._client_active = {}
+        self._client_queued = {}
+
+    # ---------- 分类 ----------
+
+    def classify(self, path, method='POST'):
+        """返回请求所属类别名（不受控的请求返回 None）"""
+        if not self.enabled or method != 'POST':
+            return None
+        name = ENDPOINT_CLASSES.get(path.rstrip('/'))
+        return name if name in self.classes else None
+
+    # ---------- 调度 ----------
+
+    def _is_heavy(self, endpoint_class):
+        return endpoint_class.priority > 0
+
+    def _can_run(self, endpoint_class):
+        if endpoint_class.active >= endpoint_class.max_concurrent:
+            return False
+        return not self._is_heavy(endpoint_class) or self._heavy_active < self.global_limit
+
+    def _dispatch(self):
+        """把空出的名额分配给排队者：优先级高者优先，同优先级下占用最少的客户端优先（调用方持锁）"""
+        granted = False
+        ordered = sorted(
+            self._waiters,
+            key=lambda w: (w.endpoint_class.priority, self._client_active.get(w.client_id, 0), w.seq)
+        )
+        for waiter in ordered:
+            if self._can_run(waiter.endpoint_class):
+                self._grant(waiter)
+                granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _grant(self, waiter):
+        cls = waiter.endpoint_class
+        self._waiters.remove(waiter)
+        cls.waiting -= 1
+        cls.active += 1
+        if self._is_heavy(cls):
+            self._heavy_active += 1
+        self._dec(self._client_queued, waiter.client_id)
+        self._client_active[waiter.client_id] = self._client_active.get(waiter.client_id, 0) + 1
+        waiter.granted = True
+
+    def _withdraw(self, waiter):
+        self._waiters.remove(waiter)
+        waiter.endpoint_class.waiting -= 1
+        self._dec(self._client_queued, waiter.client_id)
+
+    @staticmethod
+    def _dec(counter, key):
+        value = counter.get(key, 0) - 1
+        if value > 0:
+            counter[key] = value
+        else:
+            counter.pop(key, None)
+
+    # ---------- 对外接口 ----------
+
+    def acquire(self, class_name, client_id):
+        """
+        申请执行名额（必要时排队等待）
+
+        Raises:
+            AdmissionRejected: 排队已满 / 等待超时（503），或该客户端排队过多（429）
+        """
+        cls = self.classes[class_name]
+        start = time.time()
+
+        with self._cond:
+            waiter = _Waiter(cls, client_id, next(self._seq))
+            self._waiters.append(waiter)
+            cls.waiting += 1
+            self._client_queued[client_id] = self._client_queued.get(client_id, 0) + 1
+            self._dispatch()
+
+            if not waiter.granted:
+                if self._client_queued.get(client_id, 0) > self.max_queued_per_client:
+                    self._withdraw(waiter)
+                    cls.rejected += 1
+                    raise AdmissionRejected(429, 'too_many_requests_from_client', cls.retry_after())
+                if cls.waiting > cls.max_queue:
+                    self._withdraw(waiter)
+                    cls.rejected += 1
+                    raise AdmissionRejected(503, 'queue_full', cls.retry_after())
+
+                deadline = start + cls.timeout
+                while not waiter.granted:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self._withdraw(waiter)
+                        cls.timed_out += 1
+                        raise AdmissionRejected(503, 'queue_timeout', cls.retry_after())
+                    self._cond.wait(remaining)
+
+            wait_seconds = time.time() - start
+            cls.admitted += 1
+            cls.total_wait += wait_seconds
+
+        if wait_seconds > 0.5:
+            app_logger.info(f"⏳ 排队 {wait_seconds:.2f}s 后放行: {class_name} ({client_id})")
+        return Ticket(cls, client_id, wait_seconds)
+
+    def release(self, ticket):
+        """请求结束，交还名额"""
+        cls = ticket.endpoint_class
+        service_time = time.time() - ticket.granted_at
+        with self._cond:
+            cls.active -= 1
+            if self._is_heavy(cls):
+                self._heavy_active -= 1
+            self._dec(self._client_active, ticket.client_id)
+            cls.avg_service_time += EWMA_ALPHA * (service_time - cls.avg_service_time)
+            self._dispatch()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'enabled': self.enabled,
+                'global_limit': self.global_limit,
+                'heavy_active': self._heavy_active,
+                'clients_active': len(self._client_active),
+                'classes': {
+                    name: {
+                        'active': cls.active,
+                        'waiting': cls.waiting,
+                        'max_concurrent': cls.max_concurrent,
+                        'max_queue': cls.max_queue,
+                        'admitted': cls.admitted,
+                        'rejected': cls.rejected,
+                        'timed_out': cls.timed_out,
+                        'avg_wait_seconds': round(cls.total_wait / cls.admitted, 3) if cls.admitted else 0.0,
+                        'avg_service_seconds': round(cls.avg_service_time, 2)
+                    }
+                    for name, cls in self.classes.items()
+                }
+            }
+
+
+def client_id_from_request(request):
+    """客户端标识：X-Forwarded-For 的第一个地址，没有则用 remote_addr"""
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return request.remote_addr or 'unknown'
+
+
+# 全局实例
+admission = AdmissionController(
+    ADMISSION_CLASSES,
+    global_limit=ADMISSION_GLOBAL_LIMIT,
+    max_queued_per_client=ADMISSION_MAX_QUEUED_PER_CLIENT,
+    enabled=ADMISSION_ENABLED
+)
@@ -0,0 +1,388 @@
+"""
+批量翻译服务 - 一次请求翻译多张图片 / 多个文档
+
+流水线：
+- OCR 阶段：线程池并发调用 OCR 服务，第 N+1 张图的 OCR 与第 N 张图的翻译/Inpaint 重叠
+- 翻译阶段：把已完成 OCR 的多张图片的文本段合并成一次 translate_batch 调用
+- 渲染阶段：线程池并发调用 Inpaint（或本地绘制）；PDF / PPT 整个文档在单独的线程池中处理
+- 结果按完成顺序以 ZIP 流式返回，最后写入 manifest.json 记录每个文件的状态
+- 客户端断开时取消尚未开始的 OCR / 渲染 / 文档任务
+"""
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from logger_config import app_logger
+from services.image_translator import call_remote_ocr, translate_texts, render_translated_image
+from services.tracing import bind_trace, finish_deferred_trace, get_current_trace
+
+try:
+    from config import (
+        OCR_SERVICE_URL,
+        INPAINT_SERVICE_URL,
+        USE_INPAINT,
+        BATCH_MAX_FILES,
+        BATCH_MAX_TOTAL_BYTES,
+        BATCH_OCR_CONCURRENCY,
+        BATCH_RENDER_CONCURRENCY,
+        BATCH_DOCUMENT_CONCURRENCY,
+        BATCH_TRANSLATE_SEGMENTS
+    )
+except ImportError:
+    OCR_SERVICE_URL = os.getenv('OCR_SERVICE_URL', 'http://localhost:8899/ocr')
+    INPAINT_SERVICE_URL = os.getenv('INPAINT_SERVICE_URL', 'http://localhost:8900/inpaint')
+    USE_INPAINT = True
+    BATCH_MAX_FILES = 200
+    BATCH_MAX_TOTAL_BYTES = 500 * 1024 * 1024
+    BATCH_OCR_CONCURRENCY = 2
+    BATCH_RENDER_CONCURRENCY = 2
+    BATCH_DOCUMENT_CONCURRENCY = 1
+    BATCH_TRANSLATE_SEGMENTS = 64
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp')
+MANIFEST_NAME = 'manifest.json'
+
+
+class BatchTooLarge(Exception):
+    """文件数或解压后总大小超出限制"""
+
+
+def file_kind(name):
+    """按扩展名判断文件类型：image / pdf / ppt / None（不支持）"""
+    ext = os.path.splitext(name)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    if ext == '.pdf':
+        return 'pdf'
+    if ext in ('.ppt', '.pptx'):
+        return 'ppt'
+    return None
+
+
+def _safe_member_name(name):
+    """规范化 ZIP 成员名，去掉绝对路径和 .. （防止路径穿越）"""
+    parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.', '..')]
+    return '/'.join(parts)
+
+
+def list_zip_members(zip_path, max_files=BATCH_MAX_FILES, max_total_bytes=BATCH_MAX_TOTAL_BYTES):
+    """
+    列出 ZIP 中需要处理的文件（跳过目录、隐藏文件和 __MACOSX）
+
+    Raises:
+        BatchTooLarge: 文件数或解压后总大小超出限制（防 ZIP 炸弹）
+    """
+    members = []
+    total = 0
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            name = _safe_member_name(info.filename)
+            basename = os.path.basename(name)
+            if info.is_dir() or not name or name.startswith('__MACOSX/') or basename.startswith('.'):
+                continue
+            members.append((name, info))
+            total += info.file_size
+
+    if len(members) > max_files:
+        raise BatchTooLarge(f"Too many files in archive: {len(members)} > {max_files}")
+    if total > max_total_bytes:
+        raise BatchTooLarge(f"Archive too large when extracted: {total / 1024 / 1024:.1f}MB")
+    return members
+
+
+class BatchItem:
+    """批量任务中的单个文件"""
+
+    def __init__(self, index, name, input_path, output_path):
+        self.index = index
+        self.name = name
+        self.input_path = input_path
+        self.output_path = output_path
+        self.kind = file_kind(name)
+        self.ocr_results = None
+        self.status = 'pending'
+        self.error = None
+        self.segments = 0
+        self.started_at = None
+        self.finished_at = None
+        self.finished = False
+
+    def manifest_entry(self):
+        entry = {
+            'index': self.index,
+            'name': self.name,
+            'type': self.kind,
+            'status': self.status,
+            'output': self.name if self.status in ('success', 'no_text') else None,
+            'segments': self.segments,
+            'processing_time': round(self.finished_at - self.started_at, 2)
+            if self.started_at and self.finished_at else None
+        }
+        if self.error:
+            entry['error'] = self.error
+        return entry
+
+
+class BatchTranslator:
+    """
+    批量翻译流水线
+
+    用法：
+        batch = BatchTranslator(items, 'en', 'zh')
+        for item in batch.run():   # 按完成顺序产出
+            ...
+    """
+
+    def __init__(self, items, src_lang, tgt_lang, use_inpaint=None,
+                 ocr_concurrency=BATCH_OCR_CONCURRENCY,
+                 render_concurrency=BATCH_RENDER_CONCURRENCY,
+                 document_concurrency=BATCH_DOCUMENT_CONCURRENCY,
+                 translate_segments=BATCH_TRANSLATE_SEGMENTS, ocr_profile=None):
+        self.items = items
+        self.src_lang = src_lang
+        self.tgt_lang = tgt_lang
+        self.ocr_profile = ocr_profile
+        self.use_inpaint = USE_INPAINT if use_inpaint is None else use_inpaint
+        self.ocr_concurrency = ocr_concurrency
+        self.render_concurrency = render_concurrency
+        self.document_concurrency = document_concurrency
+        self.translate_segments = translate_segments
+        self.translate_calls = 0
+        # 在请求上下文中创建：沿用请求的 trace，线程池中的 OCR / Inpaint 调用也带上 X-Trace-Id；
+        # 结果是流式返回的，trace 等整批完成后再导出
+        self.trace = get_current_trace()
+        if self.trace is not None:
+            self.trace.export_deferred = True
+        self._done = queue.Queue()
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    # ---------- 各阶段 ----------
+
+    def _ocr(self, item):
+        if self._cancelled.is_set():
+            raise CancelledError()
+        bind_trace(self.trace)
+        item.started_at = time.time()
+        return call_remote_ocr(item.input_path, OCR_SERVICE_URL, src_lang=self.src_lang, filter_by_lang=True,
+                               profile=self.ocr_profile)
+
+    def _render_image(self, item, translated_texts):
+        if self._cancelled.is_set():
+            return
+        bind_trace(self.trace)
+        try:
+            render_translated_image(
+                item.input_path, item.output_path, item.ocr_results, translated_texts,
+                use_inpaint=self.use_inpaint, inpaint_url=INPAINT_SERVICE_URL
+            )
+            item.status = 'success' if os.path.exists(item.output_path) else 'failed'
+            if item.status == 'failed':
+                item.error = 'Output file not found'
+        except Exception as e:
+            item.status = 'failed'
+            item.error = str(e)
+        self._finish(item)
+
+    def _translate_document(self, item):
+        if self._cancelled.is_set():
+            return
+        bind_trace(self.trace)
+        item.started_at = time.time()
+        try:
+            if item.kind == 'pdf':
+                from services.pdf_translator import translate_pdf_file
+                translate_pdf_file(item.input_path, self.src_lang, self.tgt_lang,
+                                   output_path=item.output_path)
+            else:
+                from services.ppt_translator import translate_ppt_file
+                translate_ppt_file(item.input_path, src_lang=self.src_lang, tgt_lang=self.tgt_lang,
+                                   output_path=item.output_path, ocr_profile=self.ocr_profile)
+            item.status = 'success' if os.path.exists(item.output_path) else 'failed'
+            if item.status == 'failed':
+                item.error = 'Output file not found'
+        except Exception as e:
+            item.status = 'failed'
+            item.error = str(e)
+        self._finish(item)
+
+    def _finish(self, item):
+        with self._lock:
+            if item.finished:
+                return
+            item.finished = True
+        item.finished_at = time.time()
+        self._done.put(item)
+
+    def _flush_group(self, group, render_pool):
+        """合并一组图片的文本段做一次翻译，再分发到渲染线程池"""
+        if self._cancelled.is_set():
+            return
+        texts = [r.text for item in group for r in item.ocr_results]
+        app_logger.info(f"🌐 批量翻译: {len(group)} 个文件, {len(texts)} 段文本")
+        translated = translate_texts(texts, self.src_lang, self.tgt_lang)
+        self.translate_calls += 1
+        if len(translated) != len(texts):
+            translated = texts
+
+        offset = 0
+        for item in group:
+            if self._cancelled.is_set():
+                return
+            count = len(item.ocr_results)
+            render_pool.submit(self._render_image, item, translated[offset:offset + count])
+            offset += count
+
+    def _pipeline(self, ocr_pool, render_pool, document_pool):
+        """翻译调度线程：按顺序取 OCR 结果，凑批翻译后交给渲染池"""
+        image_items = []
+        for item in self.items:
+            if self._cancelled.is_set():
+                return
+            if item.kind == 'image':
+                image_items.append((item, ocr_pool.submit(self._ocr, item)))
+            elif item.kind in ('pdf', 'ppt'):
+                document_pool.submit(self._translate_document, item)
+            else:
+                item.status = 'skipped'
+                item.error = 'Unsupported file type'
+                self._finish(item)
+
+        group = []
+        group_segments = 0
+        for position, (item, future) in enumerate(image_items):
+            if self._cancelled.is_set():
+                return
+            try:
+                item.ocr_results = future.result() or []
+            except CancelledError:
+                return
+            except Exception as e:
+                item.ocr_results = []
+                item.status = 'failed'
+                item.error = f"OCR failed: {e}"
+                self._finish(item)
+                continue
+
+            if not item.ocr_results:
+                shutil.copy(item.input_path, item.output_path)
+                item.status = 'no_text'
+                self._finish(item)
+            else:
+                item.segments = len(item.ocr_results)
+                group.append(item)
+                group_segments += item.segments
+
+            # 凑够一批，或下一张图的 OCR 还没完成（不再等待，先翻译已有的）
+            next_ready = position + 1 < len(image_items) and image_items[position + 1][1].done()
+            if group and (group_segments >= self.translate_segments or not next_ready):
+                self._flush_group(group, render_pool)
+                group = []
+                group_segments = 0
+
+    def run(self):
+        """执行流水线，按完成顺序逐个产出 BatchItem"""
+        ocr_pool = ThreadPoolExecutor(max_workers=self.ocr_concurrency, thread_name_prefix='batch-ocr')
+        render_pool = ThreadPoolExecutor(max_workers=self.render_concurrency, thread_name_prefix='batch-render')
+        document_pool = ThreadPoolExecutor(max_workers=self.document_concurrency, thread_name_prefix='batch-doc')
+
+        def scheduler():
+            bind_trace(self.trace)
+            try:
+                self._pipeline(ocr_pool, render_pool, document_pool)
+            except Exception as e:
+                if self._cancelled.is_set():
+                    # 取消后线程池已关闭，提交新任务失败属于预期
+                    app_logger.info("⏹️ 批量翻译已取消，调度结束")
+                    return
+                app_logger.error(f"❌ 批量翻译调度失败: {e}", exc_info=True)
+                for item in self.items:
+                    if item.kind == 'image' and not item.finished:
+                        item.status = 'failed'
+                        item.error = str(e)
+                        self._finish(item)
+
+        thread = threading.Thread(target=scheduler, name='batch-scheduler', daemon=True)
+        thread.start()
+        delivered = 0
+        try:
+            for _ in range(len(self.items)):
+                yield self._done.get()
+                delivered += 1
+        finally:
+            # 客户端中途断开（生成器被关闭）：通知调度线程停止，并取消尚未开始的任务
+            if delivered < len(self.items):
+                self._cancelled.set()
+                app_logger.info(f"⏹️ 批量翻译中断: 已完成 {delivered}/{len(self.items)}，取消剩余任务")
+            for pool in (ocr_pool, render_pool, document_pool):
+                pool.shutdown(wait=False, cancel_futures=True)
+            finish_deferred_trace(self.trace)
+
+
+# ============= ZIP 流式输出 =============
+
+class _ChunkWriter:
+    """不可 seek 的写入目标，zipfile 会改用 data descriptor 逐个写入条目"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer.extend(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def stream_result_zip(batch, manifest_extra=None, on_complete=None):
+    """
+    以生成器形式产出结果 ZIP 的字节块：每完成一个文件就写入一个条目
+
+    Args:
+        batch: BatchTranslator
+        manifest_extra: 追加到 manifest 的字段
+        on_complete: 全部结束后回调 on_complete(manifest)
+    """
+    start_time = time.time()
+    writer = _ChunkWriter()
+    zf = zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_STORED)
+
+    for item in batch.run():
+        if item.status in ('success', 'no_text'):
+            zf.write(item.output_path, arcname=item.name)
+        app_logger.info(f"📦 [{item.index + 1}/{len(batch.items)}] {item.name}: {item.status}")
+        chunk = writer.drain()
+        if chunk:
+            yield chunk
+
+    entries = [item.manifest_entry() for item in sorted(batch.items, key=lambda i: i.index)]
+    manifest = {
+        **(manifest_extra or {}),
+        'source_lang': batch.src_lang,
+        'target_lang': batch.tgt_lang,
+        **({'ocr_profile': batch.ocr_profile} if batch.ocr_profile else {}),
+        'total': len(entries),
+        'succeeded': sum(1 for e in entries if e['status'] in ('success', 'no_text')),
+        'failed': sum(1 for e in entries if e['status'] == 'failed'),
+        'skipped': sum(1 for e in entries if e['status'] == 'skipped'),
+        'translate_calls': batch.translate_calls,
+        'processing_time': round(time.time() - start_time, 2),
+        'files': entries
+    }
+    zf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+    zf.close()
+    yield writer.drain()
+
+    if on_complete is not None:
+        on_complete(manifest)
@@ -0,0 +1,158 @@
+"""
+长文档分层总结（map-reduce）- Ollama / Qwen 通用
+
+- 按估算 token 数把文本切成不超过上限的段落（优先在换行处切分）；
+  段数超过 SUMMARY_MAX_SECTIONS 时加大每段的长度，全文每一部分都参与总结
+- map：各段并行生成局部总结（全局共享的有界线程池）
+- reduce：合并局部总结；合并后仍超过上限时分组再总结，直到可以一次生成
+- 最后一步以流式方式生成，调用方仍能逐段收到 token
+
+只依赖服务的 stream_summary(text, target_language)，ollama_service / qwen_service 均可使用
+"""
+import math
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from logger_config import app_logger
+
+try:
+    from config import (
+        SUMMARY_SECTION_TOKENS,
+        SUMMARY_MAP_CONCURRENCY,
+        SUMMARY_MAX_SECTIONS
+    )
+except ImportError:
+    SUMMARY_SECTION_TOKENS = 1500
+    SUMMARY_MAP_CONCURRENCY = 3
+    SUMMARY_MAX_SECTIONS = 24
+
+# 中日韩字符大约 1 字 1 token，其他文字按 4 个字符 1 token 估算
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+
+_executor = None
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数（不依赖具体模型的 tokenizer）"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def split_sections(text, max_tokens=SUMMARY_SECTION_TOKENS):
+    """
+    按 token 上限切分文本
+
+    Returns:
+        段落列表，每段估算 token 数不超过 max_tokens（单行过长时按字符硬切）
+    """
+    sections = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            sections.append('\n'.join(current))
+        current = []
+        current_tokens = 0
+
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        tokens = estimate_tokens(line)
+        if tokens > max_tokens:
+            flush()
+            # 按比例换算成字符数后硬切
+            step = max(int(len(line) * max_tokens / tokens), 1)
+            sections.extend(line[i:i + step] for i in range(0, len(line), step))
+            continue
+        if current_tokens + tokens > max_tokens:
+            flush()
+        current.append(line)
+        current_tokens += tokens
+    flush()
+    return sections
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=SUMMARY_MAP_CONCURRENCY, thread_name_prefix='summary-map')
+    return _executor
+
+
+class HierarchicalSummarizer:
+    """分层总结器"""
+
+    def __init__(self, service, section_tokens=SUMMARY_SECTION_TOKENS, max_sections=SUMMARY_MAX_SECTIONS):
+        self.service = service
+        self.section_tokens = section_tokens
+        self.max_sections = max_sections
+
+    def _summarize(self, text, target_language):
+        """非流式总结一段文本（map / 中间 reduce 使用）"""
+        summary = ''.join(self.service.stream_summary(text=text, target_language=target_language)).strip()
+        if not summary:
+            raise RuntimeError("AI未能生成有效的总结")
+        return summary
+
+    def _map(self, sections, target_language):
+        futures = [
+            _get_executor().submit(self._summarize, section, target_language)
+            for section in sections
+        ]
+        return [future.result() for future in futures]
+
+    def _split(self, text):
+        """
+        切分全文；段数超过 max_sections 时按比例加大每段的 token 上限重新切分（不丢弃任何内容）
+
+        Returns:
+            (段落列表, 实际使用的每段 token 上限)
+        """
+        section_tokens = self.section_tokens
+        sections = split_sections(text, section_tokens)
+        while len(sections) > self.max_sections:
+            section_tokens = max(math.ceil(section_tokens * len(sections) / self.max_sections), section_tokens + 1)
+            sections = split_sections(text, section_tokens)
+        if section_tokens != self.section_tokens:
+            app_logger.warning(f"⚠️ 文档过长: 每段上限加大到 {section_tokens} tokens，共 {len(sections)} 段")
+        return sections, section_tokens
+
+    @staticmethod
+    def _join(partials):
+        return '\n\n'.join(f"[{i + 1}] {partial}" for i, partial in enumerate(partials))
+
+    def stream(self, text, target_language):
+        """
+        流式生成总结（短文本直接调用服务，长文本走 map-reduce）
+
+        Yields:
+            最终总结的文本片段
+
+        Raises:
+            RuntimeError: 生成失败（异常信息为面向用户的提示）
+        """
+        if estimate_tokens(text) <= self.section_tokens:
+            yield from self.service.stream_summary(text=text, target_language=target_language)
+            return
+
+        start = time.time()
+        sections, section_tokens = self._split(text)
+
+        app_logger.info(f"🧠 分段总结: {len(sections)} 段 (每段 ≤{section_tokens} tokens)")
+        partials = self._map(sections, target_language)
+
+        # 合并后仍过长：分组再总结，逐层收敛
+        level = 1
+        while estimate_tokens(self._join(partials)) > self.section_tokens and len(partials) > 1:
+            groups = split_sections('\n'.join(p.replace('\n', ' ') for p in partials), self.section_tokens)
+            app_logger.info(f"🧠 第 {level} 层合并: {len(partials)} 个局部总结 → {len(groups)} 组")
+            if len(groups) >= len(partials):
+                break  # 无法继续收敛（单个局部总结已接近上限）
+            partials = self._map(groups, target_language)
+            level += 1
+
+        app_logger.info(f"✓ 分段总结完成 ({time.time() - start:.1f}s)，开始生成最终总结")
+        yield from self.service.stream_summary(text=self._join(partials), target_language=target_language)
@@ -0,0 +1,223 @@
+"""
+出站 HTTP 客户端 - OCR / Inpaint / Ollama / Qwen 共用
+
+- 每个上游一个 requests.Session，复用 keep-alive 连接池（不再每次调用都新建 TCP 连接）
+- 统一的连接 / 读取超时与重试策略（连接失败、502/503/504 时按退避重试）
+- 健康状态由后台线程定期刷新并缓存，调用方直接读取，不再每次请求前探测
+- 记录每个上游的调用次数、失败次数与延迟（平均 / p50 / p95）
+"""
+import threading
+import time
+from collections import deque
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from logger_config import app_logger
+from services.tracing import inject_headers
+
+try:
+    from config import (
+        OCR_SERVICE_URL,
+        INPAINT_SERVICE_URL,
+        OLLAMA_BASE_URL,
+        OLLAMA_TIMEOUT,
+        QWEN_BASE_URL,
+        QWEN_TIMEOUT,
+        HTTP_POOL_SIZE,
+        HTTP_CONNECT_TIMEOUT,
+        HTTP_RETRIES,
+        HTTP_RETRY_BACKOFF,
+        HTTP_HEALTH_INTERVAL,
+        OCR_READ_TIMEOUT,
+        INPAINT_READ_TIMEOUT
+    )
+except ImportError:
+    import os
+    OCR_SERVICE_URL = os.getenv('OCR_SERVICE_URL', 'http://localhost:8899/ocr')
+    INPAINT_SERVICE_URL = os.getenv('INPAINT_SERVICE_URL', 'http://localhost:8900/inpaint')
+    OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+    OLLAMA_TIMEOUT = 60
+    QWEN_BASE_URL = os.getenv('QWEN_BASE_URL', 'https://dashscope.aliyuncs.com/compatible-mode/v1')
+    QWEN_TIMEOUT = 60
+    HTTP_POOL_SIZE = 10
+    HTTP_CONNECT_TIMEOUT = 3
+    HTTP_RETRIES = 2
+    HTTP_RETRY_BACKOFF = 0.3
+    HTTP_HEALTH_INTERVAL = 15
+    OCR_READ_TIMEOUT = 60
+    INPAINT_READ_TIMEOUT = 120
+
+# 延迟统计保留的最近样本数
+LATENCY_SAMPLES = 200
+
+
+class Upstream:
+    """单个上游服务：连接池 + 健康状态 + 延迟统计"""
+
+    def __init__(self, name, read_timeout, health_url=None):
+        self.name = name
+        self.read_timeout = read_timeout
+        self.health_url = health_url
+        self.session = requests.Session()
+        retry = Retry(
+            total=HTTP_RETRIES,
+            connect=HTTP_RETRIES,
+            # 读超时不重试：上游仍在处理超时的请求，重试只会在过载时再排入重复任务，
+            # 且总耗时会成倍超过网关的超时
+            read=0,
+            status=HTTP_RETRIES,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=None,
+            backoff_factor=HTTP_RETRY_BACKOFF,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.healthy = None  # None 表示尚未检查
+        self.checked_at = None
+        self.requests = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, elapsed, ok):
+        self.requests += 1
+        self.latencies.append(elapsed)
+        if not ok:
+            self.errors += 1
+
+    def stats(self):
+        samples = sorted(self.latencies)
+
+        def percentile(p):
+            return round(samples[min(int(len(samples) * p), len(samples) - 1)] * 1000, 1) if samples else None
+
+        return {
+            'healthy': self.healthy,
+            'checked_at': self.checked_at,
+            'requests': self.requests,
+            'errors': self.errors,
+            'latency_ms': {
+                'avg': round(sum(samples) / len(samples) * 1000, 1) if samples else None,
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': round(samples[-1] * 1000, 1) if samples else None
+            }
+        }
+
+
+class HttpClient:
+    """按上游名称管理连接池的 HTTP 客户端"""
+
+    def __init__(self, health_interval=HTTP_HEALTH_INTERVAL):
+        self.health_interval = health_interval
+        self._upstreams = {}
+        self._lock = threading.Lock()
+        self._health_thread = None
+
+    def register(self, name, read_timeout, health_url=None):
+        self._upstreams[name] = Upstream(name, read_timeout, health_url)
+
+    def upstream(self, name):
+        return self._upstreams[name]
+
+    # ---------- 请求 ----------
+
+    def request(self, name, method, url, timeout=None, **kwargs):
+        """
+        通过上游 name 的连接池发送请求（自动附加 trace 头）
+
+        Args:
+            timeout: 读取超时（秒），默认使用上游配置；连接超时统一为 HTTP_CONNECT_TIMEOUT
+        """
+        upstream = self._upstreams[name]
+        kwargs['headers'] = inject_headers(kwargs.get('headers'))
+        read_timeout = timeout if timeout is not None else upstream.read_timeout
+        start = time.time()
+        try:
+            response = upstream.session.request(
+                method, url, timeout=(HTTP_CONNECT_TIMEOUT, read_timeout), **kwargs
+            )
+        except requests.ConnectionError:
+            with self._lock:
+                upstream.record(time.time() - start, ok=False)
+                upstream.healthy = False
+            raise
+        except requests.RequestException:
+            with self._lock:
+                upstream.record(time.time() - start, ok=False)
+            raise
+
+        with self._lock:
+            upstream.record(time.time() - start, ok=response.status_code < 500)
+            if response.status_code < 500:
+                upstream.healthy = True
+        return response
+
+    def post(self, name, url, **kwargs):
+        return self.request(name, 'POST', url, **kwargs)
+
+    def get(self, name, url, **kwargs):
+        return self.request(name, 'GET', url, **kwargs)
+
+    # ---------- 健康检查 ----------
+
+    def check(self, name):
+        """立即探测一次上游健康状态（没有 health_url 的上游只根据实际调用结果更新）"""
+        upstream = self._upstreams[name]
+        if not upstream.health_url:
+            return upstream.healthy
+        try:
+            response = upstream.session.get(upstream.health_url, timeout=(HTTP_CONNECT_TIMEOUT, 5))
+            healthy = response.status_code == 200
+        except requests.RequestException:
+            healthy = False
+
+        with self._lock:
+            if upstream.healthy is not None and healthy != upstream.healthy:
+                app_logger.info(f"{'✅' if healthy else '⚠️'} 上游 {name} {'恢复' if healthy else '不可用'}")
+            upstream.healthy = healthy
+            upstream.checked_at = time.time()
+        return healthy
+
+    def is_healthy(self, name):
+        """缓存的健康状态（尚未检查过时视为可用）"""
+        self.start_health_checks()
+        return self._upstreams[name].healthy is not False
+
+    def start_health_checks(self):
+        """启动后台健康检查线程（重复调用无副作用）"""
+        with self._lock:
+            if self._health_thread is not None:
+                return
+            self._health_thread = threading.Thread(target=self._health_loop, name='http-health', daemon=True)
+        self._health_thread.start()
+        app_logger.info(f"✓ 上游健康检查已启动 (间隔 {self.health_interval}s)")
+
+    def _health_loop(self):
+        while True:
+            for name in list(self._upstreams):
+                self.check(name)
+            time.sleep(self.health_interval)
+
+    def stats(self):
+        with self._lock:
+            return {name: upstream.stats() for name, upstream in self._upstreams.items()}
+
+
+def _health_url(service_url, path='health'):
+    """OCR / Inpaint 的健康检查地址：与服务接口同级的 /health"""
+    return urljoin(service_url, path)
+
+
+# 全局实例
+http_client = HttpClient()
+http_client.register('ocr', OCR_READ_TIMEOUT, health_url=_health_url(OCR_SERVICE_URL))
+http_client.register('inpaint', INPAINT_READ_TIMEOUT, health_url=_health_url(INPAINT_SERVICE_URL))
+http_client.register('ollama', OLLAMA_TIMEOUT, health_url=f"{OLLAMA_BASE_URL}/api/tags")
+# Qwen 没有免费的健康检查接口，只根据实际调用结果更新状态
+http_client.register('qwen', QWEN_TIMEOUT)
@@ -8,10 +8,13 @@ import logging
 import requests
 import base64
 import json
+import numpy as np
 from typing import List, Tuple, Dict
 from dataclasses import dataclass
 from PIL import Image, ImageDraw, ImageFont
 from pathlib import Path
+from services.tracing import span, merge_remote_spans
+from services.http_client import http_client
 
 # 创建 logger
 logger = logging.getLogger(__name__)
@@ -28,15 +31,31 @@ try:
     from config import (
         OCR_SERVICE_URL,
         INPAINT_SERVICE_URL,
-        USE_INPAINT
+        USE_INPAINT,
+        OCR_BINARY_UPLOAD,
+        OCR_RESPONSE_FORMAT,
+        OCR_POLY_ENCODING,
+        OCR_BATCH_SIZE,
+        OCR_PROFILE
     )
 except ImportError:
     import os
     OCR_SERVICE_URL = os.getenv('OCR_SERVICE_URL', 'http://localhost:8899/ocr')
     INPAINT_SERVICE_URL = os.getenv('INPAINT_SERVICE_URL', 'http://localhost:8900/inpaint')
     USE_INPAINT = True
+    OCR_BINARY_UPLOAD = True
+    OCR_RESPONSE_FORMAT = 'compact'
+    OCR_POLY_ENCODING = 'base64'
+    OCR_BATCH_SIZE = 16
+    OCR_PROFILE = ''
     logger.warning("无法导入配置，使用默认值")
 
+# msgpack 为可选依赖（OCR_POLY_ENCODING=msgpack 时使用）
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 # 导入翻译器
 try:
     from services.nllb_translator_pipeline import get_translator
@@ -232,13 +251,188 @@ def check_fonts_on_startup():
 
 # ============= OCR 函数 =============
 
+def _ocr_params(params: Dict = None) -> Dict:
+    """补充响应格式参数（OCR_RESPONSE_FORMAT=compact 时请求紧凑响应）和默认配置档"""
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+    if OCR_PROFILE:
+        params.setdefault('profile', OCR_PROFILE)
+    if OCR_RESPONSE_FORMAT == 'compact':
+        params.setdefault('format', 'compact')
+        encoding = OCR_POLY_ENCODING if (OCR_POLY_ENCODING != 'msgpack' or msgpack) else 'base64'
+        params.setdefault('poly_encoding', encoding)
+    return params
+
+
+def _form_values(params: Dict) -> Dict:
+    """查询字符串 / 表单中的布尔值写成 true / false"""
+    return {k: str(v).lower() if isinstance(v, bool) else v for k, v in params.items()}
+
+
+def post_ocr_image(image_data: bytes, ocr_url: str = None, params: Dict = None):
+    """
+    把图片原始字节发送给 OCR 服务
+
+    默认以 application/octet-stream 上传（参数放在查询字符串），
+    省去 base64 编码（+33% 体积）和服务端的 JSON 解析 / base64 解码；
+    旧版 OCR 服务不支持时（400 / 415）自动退回 base64 JSON 接口；
+    OCR_RESPONSE_FORMAT=compact 时请求紧凑响应，用 decode_ocr_response() 解析
+
+    Returns:
+        requests.Response
+    """
+    if ocr_url is None:
+        ocr_url = OCR_SERVICE_URL
+    params = _ocr_params(params)
+
+    if OCR_BINARY_UPLOAD:
+        query = _form_values(params)
+        resp = http_client.post(
+            'ocr', ocr_url, data=image_data, params=query,
+            headers={'Content-Type': 'application/octet-stream'}
+        )
+        if resp.status_code not in (400, 415):
+            return resp
+        logger.warning(f"OCR 服务不支持二进制上传 ({resp.status_code})，改用 base64 JSON")
+
+    payload = dict(params, image_base64=base64.b64encode(image_data).decode('utf-8'))
+    return http_client.post('ocr', ocr_url, json=payload)
+
+
+def unpack_polys(polys: Dict) -> List[list]:
+    """把紧凑格式的扁平 int32 数组还原为 [[x, y], ...] 多边形列表"""
+    data = polys.get('data') or []
+    if polys.get('encoding') == 'base64':
+        data = base64.b64decode(data)
+    if isinstance(data, (bytes, bytearray)):
+        flat = np.frombuffer(data, dtype='<i4')
+    else:
+        flat = np.asarray(data, dtype=np.int32)
+
+    count = polys.get('count', 0)
+    counts = polys.get('counts') or [polys.get('points_per_poly', 4)] * count
+    points = flat.reshape(-1, 2).tolist()
+
+    result = []
+    offset = 0
+    for n in counts:
+        result.append(points[offset:offset + n])
+        offset += n
+    return result
+
+
+def _load_ocr_body(resp) -> Dict:
+    """读取 OCR 响应体（JSON 或 msgpack）"""
+    if resp.headers.get('Content-Type', '').startswith('application/msgpack'):
+        if msgpack is None:
+            raise RuntimeError("OCR 服务返回 msgpack，但本地未安装 msgpack")
+        return msgpack.unpackb(resp.content, raw=False)
+    return resp.json()
+
+
+def _decode_ocr_payload(data: Dict) -> Dict:
+    """解析单张图片的识别结果（紧凑格式或旧版完整格式）"""
+    decoded = {
+        'success': bool(data.get('success', False)),
+        'error': data.get('error'),
+        'filtered': data.get('filtered', False),
+        'scale': data.get('scale', 1.0),
+        'texts': [],
+        'scores': [],
+        'polys': []
+    }
+    if not decoded['success']:
+        return decoded
+
+    if data.get('format') == 'compact':
+        decoded['texts'] = data.get('texts', [])
+        decoded['scores'] = data.get('scores', [])
+        decoded['polys'] = unpack_polys(data.get('polys', {}))
+        return decoded
+
+    # 旧版 OCR 服务：PaddleOCR 完整结果 [{'res': {...}}, ...]
+    for item in data.get('result') or []:
+        res = item.get('res', {}) if isinstance(item, dict) else {}
+        rec_texts = res.get('rec_texts', [])
+        rec_scores = res.get('rec_scores', [])
+        boxes = res.get('rec_polys') or res.get('dt_polys') or res.get('rec_boxes') or []
+        for i, text in enumerate(rec_texts):
+            decoded['texts'].append(text)
+            decoded['scores'].append(rec_scores[i] if i < len(rec_scores) else 0.0)
+            decoded['polys'].append(boxes[i] if i < len(boxes) else [])
+    return decoded
+
+
+def decode_ocr_response(resp) -> Dict:
+    """
+    解析 OCR 服务响应（紧凑格式 JSON / msgpack，以及旧版完整格式）
+
+    Returns:
+        {'success', 'error', 'filtered', 'scale', 'texts', 'scores', 'polys'}，
+        三个列表一一对应，polys 中每项为 [[x, y], ...]（已还原到原图坐标，scale 为检测时的缩放比例）
+    """
+    return _decode_ocr_payload(_load_ocr_body(resp))
+
+
+def call_ocr_batch(images: Dict[str, bytes], params: Dict = None, ocr_url: str = None) -> Dict[str, Dict]:
+    """
+    批量 OCR：按 OCR_BATCH_SIZE 分组调用 /ocr/batch，每组一次请求
+
+    旧版 OCR 服务没有 /ocr/batch（404 / 405）时退回逐张调用 /ocr
+
+    Args:
+        images: {客户端 id: 图片原始字节}
+
+    Returns:
+        {id: decode_ocr_response() 格式的结果}，失败的图片 success 为 False
+    """
+    if ocr_url is None:
+        ocr_url = OCR_SERVICE_URL
+    batch_url = ocr_url.rstrip('/') + '/batch'
+    form = _form_values(_ocr_params(params))
+    ids = list(images)
+    results = {}
+
+    for start in range(0, len(ids), max(OCR_BATCH_SIZE, 1)):
+        chunk = ids[start:start + OCR_BATCH_SIZE]
+        files = [(image_id, (image_id, images[image_id], 'application/octet-stream')) for image_id in chunk]
+        resp = http_client.post('ocr', batch_url, files=files, data=form)
+        merge_remote_spans(resp)
+
+        if resp.status_code in (404, 405):
+            logger.warning(f"OCR 服务不支持批量接口 ({resp.status_code})，改为逐张识别")
+            for image_id in ids[start:]:
+                single = post_ocr_image(images[image_id], ocr_url, params)
+                merge_remote_spans(single)
+                results[image_id] = (decode_ocr_response(single) if single.status_code == 200 else
+                                     _decode_ocr_payload({'error': f"HTTP {single.status_code}"}))
+            break
+
+        try:
+            data = _load_ocr_body(resp)
+        except ValueError:
+            data = {}
+        if resp.status_code != 200 or not data.get('success'):
+            error = data.get('error') or f"HTTP {resp.status_code}"
+            logger.error(f"批量 OCR 失败: {error}")
+            results.update((image_id, _decode_ocr_payload({'error': error})) for image_id in chunk)
+            continue
+
+        for image_id in chunk:
+            results[image_id] = _decode_ocr_payload(data['results'].get(image_id, {'error': '缺少结果'}))
+        logger.info(f"   批量 OCR: {len(chunk)} 张图片 ({data.get('failed', 0)} 张失败), "
+                    f"服务端耗时 {data.get('processing_time')}s")
+
+    return results
+
+
 def call_remote_ocr(
     image_path: str, 
     ocr_url: str = None, 
     src_lang: str = None,
-    filter_by_lang: bool = True  # 🔥 默认启用过滤
+    filter_by_lang: bool = True,  # 🔥 默认启用过滤
+    profile: str = None
 ) -> List[OCRResult]:
-    """调用远程 OCR 服务"""
+    """调用远程 OCR 服务（profile 为 OCR 配置档 fast / accurate，为空时使用默认配置）"""
     if ocr_url is None:
         ocr_url = OCR_SERVICE_URL
     
@@ -251,22 +445,21 @@ def call_remote_ocr(
         with open(image_path, 'rb') as f:
             image_data = f.read()
         
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
         logger.info(f"   图片大小: {len(image_data) / 1024:.1f} KB")
         
-        # 构建请求
-        payload = {
-            "image_base64": image_base64
-        }
-        
         # 🔥 添加语言过滤参数
+        params = {}
         if src_lang and filter_by_lang:
-            payload["source_lang"] = src_lang
-            payload["filter_by_language"] = True
+            params["source_lang"] = src_lang
+            params["filter_by_language"] = True
             logger.info(f"   🔍 启用语言过滤: {src_lang}")
+        if profile:
+            params["profile"] = profile
+            logger.info(f"   ⚙️ OCR 配置档: {profile}")
         
-        # 发送请求
-        resp = requests.post(ocr_url, json=payload, timeout=60)
+        # 发送请求（二进制上传）
+        resp = post_ocr_image(image_data, ocr_url, params)
+        merge_remote_spans(resp)
         logger.info(f"OCR 响应状态: {resp.status_code}")
         
         if resp.status_code != 200:
@@ -274,37 +467,21 @@ def call_remote_ocr(
             logger.error(f"响应内容: {resp.text[:500]}")
             return []
         
-        data = resp.json()
-        
-        if not data.get('success', False):
-            logger.error(f"OCR 处理失败")
-            return []
-        
-        if 'result' not in data:
-            logger.error(f"OCR 响应格式错误，缺少 'result' 字段")
-            return []
+        data = decode_ocr_response(resp)
         
-        result_list = data['result']
-        if not result_list or len(result_list) == 0:
-            logger.warning("OCR 未识别到任何文本")
+        if not data['success']:
+            logger.error(f"OCR 处理失败: {data.get('error')}")
             return []
         
-        first_result = result_list[0]
-        res = first_result.get('res', {})
-        
-        rec_texts = res.get('rec_texts', [])
-        rec_scores = res.get('rec_scores', [])
-        
-        # 🔥 获取 boxes（优先使用 rec_polys）
-        rec_polys = res.get('rec_polys', [])
-        dt_polys = res.get('dt_polys', [])
-        rec_boxes = res.get('rec_boxes', [])
-        
-        boxes = rec_polys or dt_polys or rec_boxes
+        rec_texts = data['texts']
+        rec_scores = data['scores']
+        boxes = data['polys']
         
         logger.info(f"   OCR 结果:")
         logger.info(f"      rec_texts: {len(rec_texts)} 个")
         logger.info(f"      boxes: {len(boxes)} 个")
+        if data['scale'] != 1.0:
+            logger.info(f"      检测缩放: {data['scale']} (坐标已还原到原图)")
         
         if not rec_texts:
             logger.warning("OCR 未识别到任何文本")
@@ -460,12 +637,8 @@ def call_inpaint_with_translation(
             logger.info(f"   boxes 示例: {boxes[0] if boxes else 'None'}")
             logger.info(f"   texts 示例: {texts[0] if texts else 'None'}")
             
-            resp = requests.post(
-                inpaint_url, 
-                files=files,
-                data=data,
-                timeout=120
-            )
+            resp = http_client.post('inpaint', inpaint_url, files=files, data=data)
+        merge_remote_spans(resp)
         
         logger.info(f"   响应状态: {resp.status_code}")
         
@@ -501,7 +674,7 @@ def call_inpaint_with_translation(
             elif 'image_url' in json_data:
                 # 返回图片 URL
                 img_url = json_data['image_url']
-                img_resp = requests.get(img_url, timeout=30)
+                img_resp = http_client.get('inpaint', img_url, timeout=30)
                 with open(output_path, 'wb') as f:
                     f.write(img_resp.content)
                 logger.info(f"✓ 图片已保存（URL 格式）")
@@ -584,6 +757,53 @@ def draw_translated_text_local(image: Image.Image, ocr_results: list, translated
     return image
 
 
+def render_translated_image(
+    image_path: str,
+    output_path: str,
+    ocr_results: List[OCRResult],
+    translated_texts: List[str],
+    use_inpaint: bool = None,
+    inpaint_url: str = None
+) -> str:
+    """
+    生成译文图片：优先调用 Inpaint 服务，失败或未启用时使用本地方案
+
+    Returns:
+        输出图片路径
+    """
+    if use_inpaint is None:
+        use_inpaint = USE_INPAINT
+    
+    if use_inpaint and inpaint_url:
+        with span('image.inpaint', boxes=len(ocr_results)):
+            result_path = call_inpaint_with_translation(
+                image_path, 
+                ocr_results, 
+                translated_texts,
+                inpaint_url
+            )
+        
+        if result_path and os.path.exists(result_path):
+            import shutil
+            shutil.copy(result_path, output_path)
+            logger.info(f"✓ 使用 Inpaint 服务完成")
+            return output_path
+        
+        logger.warning(f"⚠️  Inpaint 失败，使用本地备用方案")
+    else:
+        logger.info(f"   使用本地处理...")
+    
+    with span('image.render_local'):
+        image = Image.open(image_path)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        boxes = [r.box for r in ocr_results if r.box]
+        image = simple_inpaint(image, boxes)
+        image = draw_translated_text_local(image, ocr_results, translated_texts)
+        image.save(output_path, quality=95)
+    return output_path
+
+
 # ============= 主翻译函数 =============
 
 def translate_image_with_ocr_and_nllb_detailed(
@@ -594,7 +814,8 @@ def translate_image_with_ocr_and_nllb_detailed(
     ocr_url: str = None,
     inpaint_url: str = None,
     use_inpaint: bool = None,
-    enable_summary: bool = False
+    enable_summary: bool = False,
+    ocr_profile: str = None
 ) -> Tuple[bool, List[Dict], str, Dict]:
     """图片翻译完整流程（返回详细信息）"""
     try:
@@ -610,12 +831,14 @@ def translate_image_with_ocr_and_nllb_detailed(
         
         # 🔥 步骤1: OCR识别（确保传递参数）
         logger.info("[1/3] 🖼️  OCR 识别中...")
-        ocr_results = call_remote_ocr(
-            image_path, 
-            ocr_url,
-            src_lang=src_lang,      # 🔥 传递源语言
-            filter_by_lang=True     # 🔥 启用过滤（默认值是 True，这里明确传递）
-        )
+        with span('image.ocr'):
+            ocr_results = call_remote_ocr(
+                image_path, 
+                ocr_url,
+                src_lang=src_lang,      # 🔥 传递源语言
+                filter_by_lang=True,    # 🔥 启用过滤（默认值是 True，这里明确传递）
+                profile=ocr_profile
+            )
         
         # 🔥 简化处理：如果OCR结果为空，直接返回原图
         if not ocr_results or len(ocr_results) == 0:
@@ -634,22 +857,23 @@ def translate_image_with_ocr_and_nllb_detailed(
         
         # 步骤2: 翻译
         logger.info(f"\n[2/3] 🌐 翻译中 ({src_lang} → {tgt_lang})...")
-        if enable_summary:
-            from services.nllb_translator_pipeline import get_translator
-            translator = get_translator()
-            
-            translation_result = translator.translate_with_summary(
-                texts=texts,
-                src_lang=src_lang,
-                tgt_lang=tgt_lang,
-                enable_summary=True
-            )
-            
-            translated_texts = translation_result['translations']
-            summary_result = translation_result.get('summary')
-        else:
-            # 原有逻辑
-            translated_texts = translate_texts(texts, src_lang, tgt_lang)
+        with span('image.translate', segments=len(texts)):
+            if enable_summary:
+                from services.nllb_translator_pipeline import get_translator
+                translator = get_translator()
+                
+                translation_result = translator.translate_with_summary(
+                    texts=texts,
+                    src_lang=src_lang,
+                    tgt_lang=tgt_lang,
+                    enable_summary=True
+                )
+                
+                translated_texts = translation_result['translations']
+                summary_result = translation_result.get('summary')
+            else:
+                # 原有逻辑
+                translated_texts = translate_texts(texts, src_lang, tgt_lang)
         
         # 构建翻译记录
         translations = []
@@ -668,37 +892,8 @@ def translate_image_with_ocr_and_nllb_detailed(
         
         # 步骤3: Inpaint
         logger.info(f"\n[3/3] 🎨 Inpaint 处理中...")
-        
-        if use_inpaint and inpaint_url:
-            result_path = call_inpaint_with_translation(
-                image_path, 
-                ocr_results, 
-                translated_texts,
-                inpaint_url
-            )
-            
-            if result_path and os.path.exists(result_path):
-                import shutil
-                shutil.copy(result_path, output_path)
-                logger.info(f"✓ 使用 Inpaint 服务完成")
-            else:
-                logger.warning(f"⚠️  Inpaint 失败，使用本地备用方案")
-                image = Image.open(image_path)
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                boxes = [r.box for r in ocr_results if r.box]
-                image = simple_inpaint(image, boxes)
-                image = draw_translated_text_local(image, ocr_results, translated_texts)
-                image.save(output_path, quality=95)
-        else:
-            logger.info(f"   使用本地处理...")
-            image = Image.open(image_path)
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            boxes = [r.box for r in ocr_results if r.box]
-            image = simple_inpaint(image, boxes)
-            image = draw_translated_text_local(image, ocr_results, translated_texts)
-            image.save(output_path, quality=95)
+        render_translated_image(image_path, output_path, ocr_results, translated_texts,
+                                use_inpaint=use_inpaint, inpaint_url=inpaint_url)
         
         if os.path.exists(output_path):
             logger.info("=" * 60)
@@ -0,0 +1,335 @@
+"""
+异步任务队列 - PDF / PPT 等长耗时文档翻译
+
+- 提交后立即返回 job_id，由有界线程池在后台执行
+- 任务状态持久化到 SQLite，服务重启后排队中的任务会重新执行
+- 处理函数通过 JobContext 上报每页/每张幻灯片的进度
+- 进度可轮询，也可通过 Server-Sent Events 订阅
+- 取消：排队中的任务直接取消；运行中的任务在下一次上报进度时中止
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from logger_config import app_logger
+
+try:
+    from config import (
+        JOB_DB_FILE,
+        JOB_WORKERS,
+        JOB_MAX_QUEUED,
+        JOB_RETENTION_HOURS
+    )
+except ImportError:
+    JOB_DB_FILE = os.path.join(os.path.dirname(__file__), '..', 'cache', 'jobs.db')
+    JOB_WORKERS = 2
+    JOB_MAX_QUEUED = 20
+    JOB_RETENTION_HOURS = 24
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+TERMINAL_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+
+
+class JobCancelled(BaseException):
+    """
+    任务被取消（由 JobContext.progress / check_cancelled 抛出）
+
+    与 asyncio.CancelledError 一样继承 BaseException，
+    避免被翻译流程中逐项处理的 except Exception 吞掉
+    """
+
+
+class JobQueueFull(Exception):
+    """排队任务数已达上限"""
+
+
+class JobContext:
+    """传给处理函数的任务上下文"""
+
+    def __init__(self, manager, job_id):
+        self.manager = manager
+        self.job_id = job_id
+
+    @property
+    def cancelled(self):
+        return self.manager.is_cancel_requested(self.job_id)
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+
+    def progress(self, stage, done=None, total=None):
+        """上报进度（同时检查取消标记，可直接作为 progress_callback 使用）"""
+        self.manager.update_progress(self.job_id, stage, done, total)
+        self.check_cancelled()
+
+
+class JobManager:
+    """任务管理器（有界线程池 + SQLite 状态）"""
+
+    def __init__(self, db_file, max_workers=2, max_queued=20, retention_hours=24):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention_hours = retention_hours
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        self._db = sqlite3.connect(db_file, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._versions = {}
+        self._cancel_flags = set()
+        self._handlers = {}
+        self._executor = None
+        self._init_db()
+
+    # ---------- 持久化 ----------
+
+    def _init_db(self):
+        with self._lock:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id             TEXT PRIMARY KEY,
+                    type           TEXT NOT NULL,
+                    status         TEXT NOT NULL,
+                    stage          TEXT,
+                    progress_done  INTEGER,
+                    progress_total INTEGER,
+                    params         TEXT,
+                    result         TEXT,
+                    error          TEXT,
+                    created_at     REAL NOT NULL,
+                    started_at     REAL,
+                    finished_at    REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+            """)
+            self._db.commit()
+
+    def _update(self, job_id, **fields):
+        """更新字段并唤醒订阅者（调用方无需持锁）"""
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+            self._versions[job_id] = self._versions.get(job_id, 0) + 1
+            self._changed.notify_all()
+
+    def _row(self, job_id):
+        with self._lock:
+            return self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    @staticmethod
+    def _to_dict(row):
+        """对外展示的任务信息（不含内部参数）"""
+        total = row['progress_total']
+        done = row['progress_done']
+        return {
+            'job_id': row['id'],
+            'type': row['type'],
+            'status': row['status'],
+            'stage': row['stage'],
+            'progress': {
+                'done': done,
+                'total': total,
+                'percent': round(done / total * 100, 1) if total else None
+            },
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at']
+        }
+
+    # ---------- 生命周期 ----------
+
+    def register(self, job_type, handler):
+        """注册处理函数 handler(ctx, params) -> result dict"""
+        self._handlers[job_type] = handler
+
+    def start(self):
+        """启动线程池，并恢复上次未完成的任务（需在 register 之后调用）"""
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job-worker')
+
+        with self._lock:
+            # 运行到一半的任务无法续跑，标记为失败
+            interrupted = self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status = ?",
+                (STATUS_FAILED, 'Interrupted by service restart', time.time(), STATUS_RUNNING)
+            ).rowcount
+            self._db.commit()
+            pending = self._db.execute(
+                "SELECT id, type FROM jobs WHERE status = ? ORDER BY created_at", (STATUS_QUEUED,)
+            ).fetchall()
+
+        for row in pending:
+            self._executor.submit(self._run, row['id'])
+
+        app_logger.info(f"✓ 任务队列已启动: {self.max_workers} 个 worker, "
+                        f"恢复 {len(pending)} 个排队任务, {interrupted} 个中断任务标记为失败")
+
+    # ---------- 提交 / 查询 / 取消 ----------
+
+    def _queued_count(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (STATUS_QUEUED,)
+            ).fetchone()[0]
+
+    def submit(self, job_type, params):
+        """
+        提交任务
+
+        Raises:
+            JobQueueFull: 排队任务数已达 max_queued
+        """
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        self.start()
+        self.prune()
+
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if self._queued_count() >= self.max_queued:
+                raise JobQueueFull(f"{self.max_queued} jobs already queued")
+            self._db.execute(
+                "INSERT INTO jobs (id, type, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, job_type, STATUS_QUEUED, json.dumps(params, ensure_ascii=False), time.time())
+            )
+            self._db.commit()
+
+        self._executor.submit(self._run, job_id)
+        app_logger.info(f"📥 任务已提交: {job_type} {job_id}")
+        return self.get(job_id)
+
+    def get(self, job_id):
+        row = self._row(job_id)
+        return self._to_dict(row) if row else None
+
+    def queue_position(self, job_id):
+        """排队位置（1 表示下一个执行）；不在排队中返回 None"""
+        row = self._row(job_id)
+        if row is None or row['status'] != STATUS_QUEUED:
+            return None
+        with self._lock:
+            ahead = self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?",
+                (STATUS_QUEUED, row['created_at'])
+            ).fetchone()[0]
+        return ahead + 1
+
+    def cancel(self, job_id):
+        """请求取消；返回最新任务信息（不存在返回 None）"""
+        row = self._row(job_id)
+        if row is None:
+            return None
+
+        if row['status'] == STATUS_QUEUED:
+            self._update(job_id, status=STATUS_CANCELLED, finished_at=time.time())
+            app_logger.info(f"🛑 排队中的任务已取消: {job_id}")
+        elif row['status'] == STATUS_RUNNING:
+            with self._lock:
+                self._cancel_flags.add(job_id)
+            self._update(job_id, stage='cancelling')
+            app_logger.info(f"🛑 已请求取消运行中的任务: {job_id}")
+        return self.get(job_id)
+
+    def is_cancel_requested(self, job_id):
+        with self._lock:
+            return job_id in self._cancel_flags
+
+    def update_progress(self, job_id, stage, done=None, total=None):
+        fields = {'stage': stage}
+        if done is not None:
+            fields['progress_done'] = done
+        if total is not None:
+            fields['progress_total'] = total
+        self._update(job_id, **fields)
+
+    def wait_for_update(self, job_id, last_version=None, timeout=15):
+        """
+        阻塞等待任务状态变化（用于 SSE）
+
+        Returns:
+            (任务信息, 当前版本号, 是否有变化)
+        """
+        with self._changed:
+            version = self._versions.get(job_id, 0)
+            if last_version is not None and version == last_version:
+                self._changed.wait_for(lambda: self._versions.get(job_id, 0) != last_version, timeout)
+                version = self._versions.get(job_id, 0)
+        return self.get(job_id), version, version != last_version
+
+    # ---------- 执行 ----------
+
+    def _run(self, job_id):
+        row = self._row(job_id)
+        if row is None or row['status'] != STATUS_QUEUED:
+            return  # 已在排队时被取消
+
+        started_at = time.time()
+        self._update(job_id, status=STATUS_RUNNING, stage='starting', started_at=started_at)
+        ctx = JobContext(self, job_id)
+        handler = self._handlers[row['type']]
+        params = json.loads(row['params']) if row['params'] else {}
+
+        try:
+            result = handler(ctx, params)
+            self._update(job_id, status=STATUS_SUCCEEDED, stage='done',
+                         result=json.dumps(result, ensure_ascii=False), finished_at=time.time())
+            app_logger.info(f"✅ 任务完成: {job_id} ({time.time() - started_at:.1f}s)")
+        except JobCancelled:
+            self._update(job_id, status=STATUS_CANCELLED, finished_at=time.time())
+            app_logger.info(f"🛑 任务已取消: {job_id}")
+        except Exception as e:
+            self._update(job_id, status=STATUS_FAILED, error=str(e), finished_at=time.time())
+            app_logger.error(f"❌ 任务失败: {job_id}: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._cancel_flags.discard(job_id)
+
+    # ---------- 维护 ----------
+
+    def prune(self):
+        """删除超过保留期的已结束任务"""
+        cutoff = time.time() - self.retention_hours * 3600
+        with self._lock:
+            removed = self._db.execute(
+                f"DELETE FROM jobs WHERE finished_at < ? AND status IN ({','.join('?' * len(TERMINAL_STATUSES))})",
+                (cutoff, *TERMINAL_STATUSES)
+            ).rowcount
+            self._db.commit()
+        return removed
+
+    def stats(self):
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: count for status, count in rows}
+        return {
+            'workers': self.max_workers,
+            'max_queued': self.max_queued,
+            'queued': counts.get(STATUS_QUEUED, 0),
+            'running': counts.get(STATUS_RUNNING, 0),
+            'succeeded': counts.get(STATUS_SUCCEEDED, 0),
+            'failed': counts.get(STATUS_FAILED, 0),
+            'cancelled': counts.get(STATUS_CANCELLED, 0)
+        }
+
+
+# 全局实例
+job_manager = JobManager(
+    JOB_DB_FILE,
+    max_workers=JOB_WORKERS,
+    max_queued=JOB_MAX_QUEUED,
+    retention_hours=JOB_RETENTION_HOURS
+)
@@ -587,19 +587,10 @@ class NLLBTranslator:
                 combined_text = '\n'.join(translations)
                 
                 if combined_text.strip():
-                    logger.info(f"🧠 开始生成AI总结...")
-                    summary_result = self.ollama_service.generate_summary(
-                        text=combined_text,
-                        target_language=tgt_lang
-                    )
-                    
-                    result['summary'] = summary_result
-                    
-                    if summary_result.get('success'):
-                        logger.info(f"✓ AI总结生成成功")
-                    else:
-                        logger.warning(f"⚠️ AI总结生成失败: {summary_result.get('error')}")
-                        
+                    # 总结在后台生成，这里只拿到 summary_id（已缓存的直接返回结果）
+                    from services.summary_service import summary_manager
+                    result['summary'] = summary_manager.submit(combined_text, tgt_lang)
+
             except Exception as e:
                 logger.error(f"❌ AI总结异常: {e}")
                 result['summary'] = {
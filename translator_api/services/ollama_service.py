@@ -1,9 +1,11 @@
 """
 Ollama AI 总结服务
 """
+import json
 import logging
 import requests
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterator
+from services.http_client import http_client
 from config import (
     OLLAMA_BASE_URL, 
     OLLAMA_MODEL, 
@@ -62,20 +64,12 @@ Zusammenfassung:"""
     
     def check_health(self) -> bool:
         """
-        检查 Ollama 服务是否可用
+        检查 Ollama 服务是否可用（读取后台健康检查缓存的状态，不发起请求）
         
         Returns:
             True 如果服务可用，否则 False
         """
-        try:
-            response = requests.get(
-                f"{self.base_url}/api/tags",
-                timeout=5
-            )
-            return response.status_code == 200
-        except Exception as e:
-            logger.warning(f"Ollama 服务健康检查失败: {str(e)}")
-            return False
+        return http_client.is_healthy('ollama')
     
     def generate_summary(self, text: str, target_language: str) -> Dict[str, any]:
         """
@@ -126,7 +120,8 @@ Zusammenfassung:"""
             logger.info(f"正在调用 Ollama 生成总结 (模型: {self.model}, 语言: {target_language})")
             
             # 调用 API
-            response = requests.post(
+            response = http_client.post(
+                'ollama',
                 f"{self.base_url}/api/generate",
                 json=payload,
                 timeout=self.timeout
@@ -178,5 +173,69 @@ Zusammenfassung:"""
             }
 
 
+    def stream_summary(self, text: str, target_language: str) -> Iterator[str]:
+        """
+        流式生成文本总结（"stream": true，Ollama 逐行返回 JSON）
+        
+        Args:
+            text: 要总结的文本
+            target_language: 目标语言代码
+        
+        Yields:
+            新生成的文本片段
+        
+        Raises:
+            RuntimeError: 生成失败（异常信息为面向用户的提示）
+        """
+        # 健康状态由后台线程刷新，这里只读缓存
+        if not self.check_health():
+            raise RuntimeError("AI总结服务暂时不可用，请稍后再试 😊")
+        
+        prompt = self._get_summary_prompt(text, target_language)
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": True,
+            "options": {
+                "temperature": self.temperature,
+                "num_predict": self.max_words * 2  # 预留空间
+            }
+        }
+        
+        logger.info(f"正在调用 Ollama 流式生成总结 (模型: {self.model}, 语言: {target_language})")
+        
+        try:
+            with http_client.post(
+                'ollama',
+                f"{self.base_url}/api/generate",
+                json=payload,
+                stream=True,
+                timeout=self.timeout
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(chunk["error"])
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
+        
+        except requests.Timeout:
+            logger.error(f"Ollama 请求超时 (timeout={self.timeout}s)")
+            raise RuntimeError("AI总结生成超时，请稍后重试 ⏱️")
+        
+        except requests.RequestException as e:
+            logger.error(f"Ollama 请求失败: {str(e)}")
+            raise RuntimeError("AI总结服务连接失败，请检查网络 🔌")
+        
+        except (ValueError, RuntimeError) as e:
+            logger.error(f"Ollama 流式响应异常: {str(e)}")
+            raise RuntimeError("生成总结时发生错误，请稍后重试 🔧")
+
+
 # 创建全局实例
 ollama_service = OllamaService()
\ No newline at end of file
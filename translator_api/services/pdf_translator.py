@@ -4,12 +4,14 @@ import tempfile
 from typing import List, Dict, Optional
 from logger_config import app_logger
 from collections import defaultdict
+from services.tracing import span
 
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), '..', 'uploads')
 FONT_DIR = os.path.join(os.path.dirname(__file__), '..', 'fonts')
 
 
-def translate_pdf_file(pdf_file_path, src_lang='auto', tgt_lang='zh', enable_summary=False):
+def translate_pdf_file(pdf_file_path, src_lang='auto', tgt_lang='zh', enable_summary=False,
+                       output_path=None, progress_callback=None):
     """
     PDF翻译主函数 - 按坐标提取文本，翻译后重建PDF
     
@@ -24,6 +26,8 @@ def translate_pdf_file(pdf_file_path, src_lang='auto', tgt_lang='zh', enable_sum
         src_lang: 源语言（'auto'为自动检测）
         tgt_lang: 目标语言（'zh'/'en'/'de'等）
         enable_summary: 是否生成AI摘要
+        output_path: 输出路径（默认 UPLOAD_DIR/translated_<文件名>）
+        progress_callback: 进度回调 progress_callback(stage, done, total)，按页上报
     
     返回：
         (翻译后的PDF路径, AI摘要结果)
@@ -36,9 +40,11 @@ def translate_pdf_file(pdf_file_path, src_lang='auto', tgt_lang='zh', enable_sum
         app_logger.info(f"🚀 开始翻译PDF: {pdf_file_path}")
         
         doc = fitz.open(pdf_file_path)
+        _report_progress(progress_callback, 'extract', 0, len(doc))
         
         # ============ 步骤1：提取文本和位置信息 ============
-        all_texts, text_positions = _extract_text_with_positions(doc)
+        with span('pdf.extract'):
+            all_texts, text_positions = _extract_text_with_positions(doc)
         
         app_logger.info(f"✅ 提取完成: {len(all_texts)} 个文本行")
         _log_text_preview(all_texts, text_positions, max_lines=10)
@@ -51,13 +57,20 @@ def translate_pdf_file(pdf_file_path, src_lang='auto', tgt_lang='zh', enable_sum
         # ============ 步骤3：批量翻译 ============
         app_logger.info(f"🔤 批量翻译 ({src_lang} -> {tgt_lang})...")
         
-        translated_texts = translator.translate_batch(
-            all_texts, 
-            src_lang=src_lang, 
-            tgt_lang=tgt_lang,
-            batch_size=8,
-            force_individual=True  # PDF翻译使用逐条模式，确保位置对应
-        )
+        with span('pdf.translate', lines=len(all_texts)):
+            if progress_callback is None:
+                translated_texts = translator.translate_batch(
+                    all_texts, 
+                    src_lang=src_lang, 
+                    tgt_lang=tgt_lang,
+                    batch_size=8,
+                    force_individual=True  # PDF翻译使用逐条模式，确保位置对应
+                )
+            else:
+                translated_texts = _translate_by_page(
+                    translator, all_texts, text_positions, len(doc),
+                    src_lang, tgt_lang, progress_callback
+                )
         
         if len(translated_texts) != len(all_texts):
             app_logger.warning(f"⚠️ 翻译结果数量不匹配，使用原文补充")
@@ -74,10 +87,13 @@ def translate_pdf_file(pdf_file_path, src_lang='auto', tgt_lang='zh', enable_sum
         chinese_font_path = _find_chinese_font() if is_cjk_target else None
         
         # 创建新PDF并插入翻译
-        out_path = _rebuild_pdf_with_translation(
-            doc, text_positions, translated_texts, 
-            is_cjk_target, chinese_font_path, pdf_file_path
-        )
+        with span('pdf.rebuild', pages=len(doc)):
+            out_path = _rebuild_pdf_with_translation(
+                doc, text_positions, translated_texts, 
+                is_cjk_target, chinese_font_path, pdf_file_path,
+                output_path=output_path,
+                progress_callback=progress_callback
+            )
         
         doc.close()
         
@@ -85,7 +101,9 @@ def translate_pdf_file(pdf_file_path, src_lang='auto', tgt_lang='zh', enable_sum
         
         # ============ 步骤5：生成AI摘要（可选）============
         if enable_summary:
-            summary_result = _generate_ai_summary(translated_texts, tgt_lang)
+            _report_progress(progress_callback, 'summary')
+            with span('pdf.summary'):
+                summary_result = _generate_ai_summary(translated_texts, tgt_lang)
         
         return out_path, summary_result
         
@@ -96,6 +114,46 @@ def translate_pdf_file(pdf_file_path, src_lang='auto', tgt_lang='zh', enable_sum
         raise
 
 
+def _report_progress(progress_callback, stage, done=None, total=None):
+    """上报进度（未传回调时不做任何事）"""
+    if progress_callback is not None:
+        progress_callback(stage, done, total)
+
+
+def _translate_by_page(translator, all_texts, text_positions, num_pages,
+                       src_lang, tgt_lang, progress_callback):
+    """按页分批翻译，每页完成后上报进度（结果顺序与 all_texts 一致）"""
+    translated_texts = []
+    start = 0
+    for page_num in range(num_pages):
+        end = start
+        while end < len(all_texts) and text_positions[end]['page_num'] == page_num:
+            end += 1
+        
+        if end > start:
+            page_result = translator.translate_batch(
+                all_texts[start:end],
+                src_lang=src_lang,
+                tgt_lang=tgt_lang,
+                batch_size=8,
+                force_individual=True
+            )
+            if len(page_result) != end - start:
+                page_result = all_texts[start:end]
+            translated_texts.extend(page_result)
+        
+        start = end
+        _report_progress(progress_callback, 'translate', page_num + 1, num_pages)
+    
+    # 理论上文本按页顺序提取；若有剩余（页码乱序）逐条补齐
+    if start < len(all_texts):
+        translated_texts.extend(translator.translate_batch(
+            all_texts[start:], src_lang=src_lang, tgt_lang=tgt_lang,
+            batch_size=8, force_individual=True
+        ))
+    return translated_texts
+
+
 def _extract_text_with_positions(doc):
     """
     从PDF中提取文本和位置信息
@@ -209,7 +267,8 @@ def _log_translation_preview(orig_texts, trans_texts, positions, max_lines=5):
 
 
 def _rebuild_pdf_with_translation(doc, text_positions, translated_texts, 
-                                  is_cjk_target, chinese_font_path, pdf_file_path):
+                                  is_cjk_target, chinese_font_path, pdf_file_path,
+                                  output_path=None, progress_callback=None):
     """
     重建PDF：删除原文，保留图片，插入翻译
     
@@ -238,15 +297,19 @@ def _rebuild_pdf_with_translation(doc, text_positions, translated_texts,
         
         # 步骤3：收集该页的翻译内容并按Y坐标排序
         page_items = _get_page_translations(text_positions, translated_texts, page_num)
-        if not page_items:
-            continue
         
         # 步骤4：插入翻译文本
-        _insert_translations(new_page, page_items, is_cjk_target, chinese_font_path)
+        if page_items:
+            _insert_translations(new_page, page_items, is_cjk_target, chinese_font_path)
+        
+        _report_progress(progress_callback, 'rebuild', page_num + 1, len(doc))
     
     # 保存并返回
-    out_filename = f"translated_{os.path.basename(pdf_file_path)}"
-    out_path = os.path.join(UPLOAD_DIR, out_filename)
+    if output_path:
+        out_path = output_path
+    else:
+        out_filename = f"translated_{os.path.basename(pdf_file_path)}"
+        out_path = os.path.join(UPLOAD_DIR, out_filename)
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     new_doc.save(out_path)
     
@@ -460,28 +523,16 @@ def _try_fonts(page, text_rect, text, font_size, font_list, external_font_path):
 
 
 def _generate_ai_summary(translated_texts, tgt_lang):
-    """生成AI摘要（可选功能）"""
+    """提交AI摘要任务（可选功能，结果通过 summary_id 查询）"""
     try:
-        combined_text = '\n'.join(translated_texts[:20])
+        # 全文提交：长文档由 summary_service 分段总结（map-reduce）
+        combined_text = '\n'.join(translated_texts)
         if not combined_text.strip():
             return None
         
-        app_logger.info("🧠 开始生成AI总结...")
-        
-        from config import AI_PROVIDER
-        if AI_PROVIDER == 'qwen':
-            from services.qwen_service import qwen_service as ai_service
-        else:
-            from services.ollama_service import ollama_service as ai_service
-        
-        summary_result = ai_service.generate_summary(
-            text=combined_text,
-            target_language=tgt_lang
-        )
-        
-        if summary_result and summary_result.get('success'):
-            app_logger.info("✓ AI总结生成成功")
-            return summary_result
+        # 总结在后台生成，这里只提交任务并返回 summary_id
+        from services.summary_service import summary_manager
+        return summary_manager.submit(combined_text, tgt_lang)
     except Exception as e:
         app_logger.error(f"❌ AI总结异常: {e}")
     
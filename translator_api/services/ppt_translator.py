@@ -6,14 +6,15 @@ PPT 翻译服务 - 混合处理方案
 """
 import os
 import json
-import base64
-import requests
 from io import BytesIO
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.shapes import MSO_SHAPE_TYPE
 from PIL import Image
 from logger_config import app_logger
+from services.tracing import span, merge_remote_spans
+from services.http_client import http_client
+from services.image_translator import call_ocr_batch
 
 # 导入配置
 try:
@@ -182,8 +183,15 @@ def extract_ppt_elements(ppt_path):
 
 # ============= 文本翻译函数 =============
 
-def translate_text_elements(slide_elements, translator, src_lang='auto', tgt_lang='zh', enable_summary=False):
-    """翻译所有文本元素"""
+def _report_progress(progress_callback, stage, done=None, total=None):
+    """上报进度（未传回调时不做任何事）"""
+    if progress_callback is not None:
+        progress_callback(stage, done, total)
+
+
+def translate_text_elements(slide_elements, translator, src_lang='auto', tgt_lang='zh', enable_summary=False,
+                            progress_callback=None):
+    """翻译所有文本元素（progress_callback 按幻灯片上报进度）"""
     app_logger.info("🔤 开始翻译文本元素...")
     # for AI summary purpose
     all_translated_text = []
@@ -269,35 +277,19 @@ def translate_text_elements(slide_elements, translator, src_lang='auto', tgt_lan
             app_logger.info(f"  ✓ 翻译了 {chart_count} 个图表元素")
         
         app_logger.info(f"  ✓ 幻灯片 {slide_idx + 1} 文本翻译完成")
+        _report_progress(progress_callback, 'translate_text', slide_idx + 1, len(slide_elements))
 
     if enable_summary:
         try:
-            from services.nllb_translator_pipeline import get_translator
-            summary_result = None
-            if all_translated_text:
-                        translator = get_translator()
-                        combined_text = '\n'.join(all_translated_text)
-                        
-                        app_logger.info(f"🧠 开始生成AI总结...")
-                        
-                        translation_result = translator.translate_with_summary(
-                            texts=[combined_text],
-                            src_lang=src_lang,
-                            tgt_lang=tgt_lang,
-                            enable_summary=True
-                        )
-                        
-                        summary_result = translation_result.get('summary')
-                        
-                        if summary_result and summary_result.get('success'):
-                            app_logger.info(f"✓ AI总结生成成功")
-                        else:
-                            app_logger.warning(f"⚠️ AI总结生成失败")
-            return summary_result
-            
+            # 译文已在上面生成，直接提交总结（长文档由 summary_service 分段总结，不再整体重新翻译）
+            combined_text = '\n'.join(all_translated_text)
+            if not combined_text.strip():
+                return None
+            from services.summary_service import summary_manager
+            return summary_manager.submit(combined_text, tgt_lang)
         except Exception as e:
             app_logger.error(f"❌ AI总结异常: {e}")
-            summary_result = {
+            return {
                 'success': False,
                 'summary': None,
                 'error': '生成总结时发生错误 🔧'
@@ -306,32 +298,39 @@ def translate_text_elements(slide_elements, translator, src_lang='auto', tgt_lan
 
 # ============= OCR + Inpaint 处理函数 =============
 
-def call_ocr_service(image_base64, src_lang='auto'):
-    """调用 OCR 服务识别图片中的文字"""
+def call_ocr_service(images, src_lang='auto', profile=None):
+    """
+    批量调用 OCR 服务识别图片中的文字（/ocr/batch，按 OCR_BATCH_SIZE 分组，紧凑格式响应）
+
+    Args:
+        images: {图片 id: 图片原始字节}
+        profile: OCR 配置档（fast / accurate），为空时使用默认配置
+
+    Returns:
+        {图片 id: [(text, poly), ...]}，识别失败的图片为 None
+    """
+    params = {
+        'source_lang': src_lang,
+        'filter_by_language': True,  # 启用语言过滤
+        'profile': profile
+    }
+    
     try:
-        payload = {
-            'image_base64': image_base64,
-            'source_lang': src_lang,
-            'filter_by_language': True  # 启用语言过滤
-        }
-        
-        app_logger.debug(f"    调用 OCR: {OCR_SERVICE_URL}")
-        resp = requests.post(OCR_SERVICE_URL, json=payload, timeout=60)
-        
-        if resp.status_code != 200:
-            app_logger.error(f"    OCR 失败: HTTP {resp.status_code}")
-            return None
-        
-        result = resp.json()
-        if not result.get('success'):
-            app_logger.error(f"    OCR 失败: {result.get('error')}")
-            return None
-        
-        return result.get('result', [])
-        
+        app_logger.debug(f"    调用批量 OCR: {OCR_SERVICE_URL} ({len(images)} 张图片)")
+        results = call_ocr_batch(images, params, OCR_SERVICE_URL)
     except Exception as e:
         app_logger.error(f"    OCR 调用异常: {e}")
-        return None
+        return {image_id: None for image_id in images}
+    
+    parsed = {}
+    for image_id in images:
+        result = results.get(image_id)
+        if not result or not result['success']:
+            app_logger.error(f"    OCR 失败 ({image_id}): {result.get('error') if result else '无结果'}")
+            parsed[image_id] = None
+        else:
+            parsed[image_id] = list(zip(result['texts'], result['polys']))
+    return parsed
 
 
 def call_inpaint_service(image_bytes, boxes, texts):
@@ -347,7 +346,8 @@ def call_inpaint_service(image_bytes, boxes, texts):
         app_logger.debug(f"      boxes: {len(boxes)} 个区域")
         app_logger.debug(f"      texts: {len(texts)} 段文字")
         
-        resp = requests.post(INPAINT_SERVICE_URL, files=files, data=data, timeout=120)
+        resp = http_client.post('inpaint', INPAINT_SERVICE_URL, files=files, data=data)
+        merge_remote_spans(resp)
         
         if resp.status_code != 200:
             app_logger.error(f"    Inpaint 失败: HTTP {resp.status_code}")
@@ -361,14 +361,26 @@ def call_inpaint_service(image_bytes, boxes, texts):
         return None
 
 
-def process_images_with_ocr_inpaint(slide_elements, prs, translator, src_lang='auto', tgt_lang='zh'):
-    """使用 OCR + Inpaint 处理图片中的文字"""
+def process_images_with_ocr_inpaint(slide_elements, prs, translator, src_lang='auto', tgt_lang='zh',
+                                    progress_callback=None, ocr_profile=None):
+    """使用 OCR + Inpaint 处理图片中的文字（progress_callback 按幻灯片上报进度）"""
     if not USE_INPAINT:
         app_logger.info("⚠️ Inpaint 功能已禁用，跳过图片处理")
         return
     
     app_logger.info("🖼️ 开始处理图片元素...")
     
+    # 1. 先收集所有幻灯片的图片，分组批量调用 OCR（每组一次请求，而不是每张图片一次）
+    images = {
+        f"{slide_idx}-{img_idx}": img_elem['image_bytes']
+        for slide_idx, elements in enumerate(slide_elements)
+        for img_idx, img_elem in enumerate(elements['images'])
+    }
+    all_ocr_results = {}
+    if images:
+        app_logger.info(f"  OCR 识别中: {len(images)} 张图片...")
+        all_ocr_results = call_ocr_service(images, src_lang, ocr_profile)
+    
     for slide_idx, elements in enumerate(slide_elements):
         slide = prs.slides[slide_idx]
         
@@ -376,43 +388,28 @@ def process_images_with_ocr_inpaint(slide_elements, prs, translator, src_lang='a
             try:
                 app_logger.info(f"  处理图片 {img_idx + 1}/{len(elements['images'])} (幻灯片 {slide_idx + 1})")
                 
-                img = img_elem['image']
                 image_bytes = img_elem['image_bytes']
-                
-                # 1. 转换为 Base64
-                image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-                
-                # 2. 调用 OCR 识别
-                app_logger.info(f"    OCR 识别中...")
-                ocr_results = call_ocr_service(image_base64, src_lang)
+                ocr_results = all_ocr_results.get(f"{slide_idx}-{img_idx}")
                 
                 if not ocr_results or len(ocr_results) == 0:
                     app_logger.info(f"    未检测到文字，跳过")
                     continue
                 
-                # 3. 解析 OCR 结果
+                # 2. 解析 OCR 结果
                 boxes = []
                 original_texts = []
                 
-                for ocr_item in ocr_results:
-                    if 'res' not in ocr_item:
-                        continue
-                    
-                    res = ocr_item['res']
-                    rec_texts = res.get('rec_texts', [])
-                    dt_polys = res.get('dt_polys', res.get('rec_polys', []))
-                    
-                    for text, poly in zip(rec_texts, dt_polys):
-                        if text.strip():
-                            boxes.append(poly)
-                            original_texts.append(text)
+                for text, poly in ocr_results:
+                    if text.strip() and poly:
+                        boxes.append(poly)
+                        original_texts.append(text)
                 
                 app_logger.info(f"    检测到 {len(original_texts)} 个文本区域")
                 
                 if len(boxes) == 0:
                     continue
                 
-                # 4. 翻译文字
+                # 3. 翻译文字
                 app_logger.info(f"    翻译文字...")
                 translations = []
                 for text in original_texts:
@@ -423,7 +420,7 @@ def process_images_with_ocr_inpaint(slide_elements, prs, translator, src_lang='a
                         app_logger.error(f"      翻译失败: {e}")
                         translations.append(text)
                 
-                # 5. 构造 texts 参数（用于 Inpaint）
+                # 4. 构造 texts 参数（用于 Inpaint）
                 texts_data = []
                 for translated_text in translations:
                     texts_data.append({
@@ -432,7 +429,7 @@ def process_images_with_ocr_inpaint(slide_elements, prs, translator, src_lang='a
                         'align': 'center'          # 居中对齐
                     })
                 
-                # 6. 调用 Inpaint 服务
+                # 5. 调用 Inpaint 服务
                 app_logger.info(f"    Inpaint 处理中...")
                 processed_image_bytes = call_inpaint_service(image_bytes, boxes, texts_data)
                 
@@ -440,7 +437,7 @@ def process_images_with_ocr_inpaint(slide_elements, prs, translator, src_lang='a
                     app_logger.warning(f"    Inpaint 处理失败，保留原图")
                     continue
                 
-                # 7. 替换 PPT 中的图片
+                # 6. 替换 PPT 中的图片
                 app_logger.info(f"    替换图片...")
                 shape = img_elem['shape']
                 left, top, width, height = shape.left, shape.top, shape.width, shape.height
@@ -470,19 +467,26 @@ def process_images_with_ocr_inpaint(slide_elements, prs, translator, src_lang='a
         
         if len(elements['images']) > 0:
             app_logger.info(f"  ✓ 幻灯片 {slide_idx + 1} 图片处理完成")
+        _report_progress(progress_callback, 'images', slide_idx + 1, len(slide_elements))
 
 
 # ============= 主翻译函数 =============
 
-def translate_ppt_file(ppt_file_path, src_lang='auto', tgt_lang='zh', output_path=None, enable_summary=False):
-    """主翻译函数 - PPT 混合处理"""
+def translate_ppt_file(ppt_file_path, src_lang='auto', tgt_lang='zh', output_path=None, enable_summary=False,
+                       progress_callback=None, ocr_profile=None):
+    """
+    主翻译函数 - PPT 混合处理（progress_callback(stage, done, total) 按幻灯片上报进度）
+
+    ocr_profile 为图片 OCR 使用的配置档（fast / accurate），为空时使用默认配置
+    """
     try:
         app_logger.info(f"🚀 开始翻译 PPT: {ppt_file_path}")
         app_logger.info(f"   源语言: {src_lang}, 目标语言: {tgt_lang}")
         
         # 1. 提取 PPT 元素
         app_logger.info("📊 提取 PPT 内容...")
-        prs, slide_elements = extract_ppt_elements(ppt_file_path)
+        with span('ppt.extract'):
+            prs, slide_elements = extract_ppt_elements(ppt_file_path)
         total_slides = len(slide_elements)
         app_logger.info(f"✅ 提取完成: {total_slides} 页")
         
@@ -500,15 +504,20 @@ def translate_ppt_file(ppt_file_path, src_lang='auto', tgt_lang='zh', output_pat
         summary_result = None
         # 3. 翻译文本元素（直接修改 prs 对象）
         app_logger.info("🔤 开始翻译文本...")
-        if enable_summary:
-            summary_result = translate_text_elements(slide_elements, translator, src_lang, tgt_lang, enable_summary)
-        else:
-            translate_text_elements(slide_elements, translator, src_lang, tgt_lang, enable_summary)
+        with span('ppt.translate_text', texts=total_texts):
+            if enable_summary:
+                summary_result = translate_text_elements(slide_elements, translator, src_lang, tgt_lang, enable_summary,
+                                                         progress_callback=progress_callback)
+            else:
+                translate_text_elements(slide_elements, translator, src_lang, tgt_lang, enable_summary,
+                                        progress_callback=progress_callback)
 
         # 4. 处理图片（OCR + 翻译 + Inpaint）
         if total_images > 0 and USE_INPAINT:
             app_logger.info("🖼️ 开始处理图片...")
-            process_images_with_ocr_inpaint(slide_elements, prs, translator, src_lang, tgt_lang)
+            with span('ppt.images', images=total_images):
+                process_images_with_ocr_inpaint(slide_elements, prs, translator, src_lang, tgt_lang,
+                                                progress_callback=progress_callback, ocr_profile=ocr_profile)
         else:
             app_logger.info("⏭️  跳过图片处理")
         
@@ -523,8 +532,10 @@ def translate_ppt_file(ppt_file_path, src_lang='auto', tgt_lang='zh', output_pat
         app_logger.info(f"💾 保存翻译后的 PPT...")
         app_logger.info(f"   输出路径: {output_path}")
         
+        _report_progress(progress_callback, 'save')
         try:
-            prs.save(output_path)
+            with span('ppt.save'):
+                prs.save(output_path)
             
             # 🔥 验证文件是否真的保存成功
             if os.path.exists(output_path):
@@ -556,7 +567,8 @@ def translate_ppt_file(ppt_file_path, src_lang='auto', tgt_lang='zh', output_pat
         raise
 
 
-def translate_ppt_simple(ppt_file_path, src_lang='auto', tgt_lang='zh', output_path=None, enable_summary=False):
+def translate_ppt_simple(ppt_file_path, src_lang='auto', tgt_lang='zh', output_path=None, enable_summary=False,
+                         progress_callback=None):
     """简化版 PPT 翻译（仅处理文本，不处理图片）"""
     try:
         app_logger.info(f"🚀 开始简化翻译 PPT: {ppt_file_path}")
@@ -566,7 +578,8 @@ def translate_ppt_simple(ppt_file_path, src_lang='auto', tgt_lang='zh', output_p
         
         # 提取并翻译
         prs, slide_elements = extract_ppt_elements(ppt_file_path)
-        summary_result = translate_text_elements(slide_elements, translator, src_lang, tgt_lang)
+        summary_result = translate_text_elements(slide_elements, translator, src_lang, tgt_lang,
+                                                 progress_callback=progress_callback)
         
         # 确定输出路径
         if output_path is None:
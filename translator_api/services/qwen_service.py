@@ -2,9 +2,11 @@
 通义千问 (Qwen) AI 总结服务
 支持阿里云 DashScope API（OpenAI 兼容格式）
 """
+import json
 import logging
 import requests
-from typing import Dict
+from typing import Dict, Iterator
+from services.http_client import http_client
 from config import (
     QWEN_API_KEY,
     QWEN_BASE_URL,
@@ -65,7 +67,7 @@ Zusammenfassung:"""
     
     def check_health(self) -> bool:
         """
-        检查 API 服务是否可用
+        检查 API 服务是否可用（根据最近的调用结果，不发起请求）
         
         Returns:
             True 如果服务可用，否则 False
@@ -75,27 +77,8 @@ Zusammenfassung:"""
             logger.warning("Qwen API 配置不完整")
             return False
         
-        try:
-            # 简单的健康检查：发送一个最小请求
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json={
-                    "model": self.model,
-                    "messages": [{"role": "user", "content": "test"}],
-                    "max_tokens": 5
-                },
-                timeout=5
-            )
-            return response.status_code in [200, 400]  # 400也说明API可达
-        except Exception as e:
-            logger.warning(f"Qwen API 健康检查失败: {str(e)}")
-            return False
+        # 不再发送探测请求（会产生调用费用），使用实际调用结果缓存的状态
+        return http_client.is_healthy('qwen')
     
     def generate_summary(self, text: str, target_language: str) -> Dict[str, any]:
         """
@@ -165,7 +148,8 @@ Zusammenfassung:"""
             logger.info(f"正在调用 Qwen API 生成总结 (模型: {self.model}, 语言: {target_language})")
             
             # 调用 API
-            response = requests.post(
+            response = http_client.post(
+                'qwen',
                 f"{self.base_url}/chat/completions",
                 headers=headers,
                 json=payload,
@@ -224,6 +208,85 @@ Zusammenfassung:"""
                 "error": "生成总结时发生错误，请稍后重试 🔧"
             }
 
+    def stream_summary(self, text: str, target_language: str) -> Iterator[str]:
+        """
+        流式生成文本总结（"stream": true，OpenAI 兼容的 SSE 格式）
+        
+        Args:
+            text: 要总结的文本
+            target_language: 目标语言代码
+        
+        Yields:
+            新生成的文本片段
+        
+        Raises:
+            RuntimeError: 生成失败（异常信息为面向用户的提示）
+        """
+        if not self.api_key:
+            raise RuntimeError("AI总结服务未配置 API Key")
+        
+        prompt = self._get_summary_prompt(text, target_language)
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "你是一个专业的文本总结助手，擅长提炼核心信息。"
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": self.temperature,
+            "max_tokens": self.max_words * 2,  # 预留空间
+            "stream": True
+        }
+        
+        logger.info(f"正在调用 Qwen API 流式生成总结 (模型: {self.model}, 语言: {target_language})")
+        
+        try:
+            with http_client.post(
+                'qwen',
+                f"{self.base_url}/chat/completions",
+                headers=headers,
+                json=payload,
+                stream=True,
+                timeout=self.timeout
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    # text/event-stream 通常不带 charset，requests 会按 ISO-8859-1 解码，这里显式用 UTF-8
+                    line = line.decode("utf-8")
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or [{}]
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+        
+        except requests.Timeout:
+            logger.error(f"Qwen API 请求超时 (timeout={self.timeout}s)")
+            raise RuntimeError("AI总结生成超时，请稍后重试 ⏱️")
+        
+        except requests.RequestException as e:
+            logger.error(f"Qwen API 请求失败: {str(e)}")
+            error_msg = str(e)
+            if "401" in error_msg or "403" in error_msg:
+                raise RuntimeError("AI总结服务认证失败，请检查 API Key 🔑")
+            raise RuntimeError("AI总结服务连接失败，请检查网络 🔌")
+        
+        except ValueError as e:
+            logger.error(f"Qwen API 流式响应异常: {str(e)}")
+            raise RuntimeError("生成总结时发生错误，请稍后重试 🔧")
+
 
 # 创建全局实例
 qwen_service = QwenService()
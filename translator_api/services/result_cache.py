@@ -0,0 +1,261 @@
+"""
+整文件翻译结果缓存 - 按上传内容哈希寻址
+
+- 上传文件在写入磁盘的同时计算 SHA-256
+- (内容哈希, 接口, 源语言, 目标语言, 模式, 引擎版本) 作为缓存键
+- 命中时直接返回已有输出文件，不再走 OCR / 翻译 / Inpaint / 重建流程
+- 相同上传同时到达时只计算一次，其余请求等待结果
+- 淘汰与归档任务联动：命中会刷新输出文件的 mtime，归档后清理失效条目；
+  LRU 淘汰的条目若是输出文件的最后一个引用，文件随之删除并移出存储台账
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from logger_config import app_logger
+from services.storage import file_store
+
+try:
+    from config import (
+        UPLOAD_FOLDER,
+        RESULT_CACHE_ENABLED,
+        RESULT_CACHE_INDEX_FILE,
+        RESULT_CACHE_MAX_ENTRIES,
+        RESULT_CACHE_WAIT_TIMEOUT,
+        RESULT_CACHE_ENGINE_VERSION
+    )
+except ImportError:
+    UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'uploads')
+    RESULT_CACHE_ENABLED = True
+    RESULT_CACHE_INDEX_FILE = os.path.join(os.path.dirname(__file__), '..', 'cache', 'result_cache.json')
+    RESULT_CACHE_MAX_ENTRIES = 2000
+    RESULT_CACHE_WAIT_TIMEOUT = 600
+    RESULT_CACHE_ENGINE_VERSION = '1'
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+def save_upload_with_hash(file_storage, dest_path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    流式保存上传文件并同时计算 SHA-256
+
+    Args:
+        file_storage: werkzeug FileStorage
+        dest_path: 保存路径
+
+    Returns:
+        (十六进制哈希, 文件字节数)
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    stream = file_storage.stream
+
+    with open(dest_path, 'wb') as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+
+    return hasher.hexdigest(), size
+
+
+def engine_version():
+    """当前翻译引擎版本标识（切换云端/本地翻译或升级版本后缓存自动失效）"""
+    backend = 'cloud' if os.getenv('USE_CLOUD_TRANSLATE', 'false').lower() == 'true' else 'nllb'
+    return f"{backend}-{RESULT_CACHE_ENGINE_VERSION}"
+
+
+def make_cache_key(content_hash, endpoint, src_lang, tgt_lang, mode='default'):
+    """组装缓存键"""
+    return '|'.join([content_hash, endpoint, src_lang or '', tgt_lang or '', mode, engine_version()])
+
+
+class ResultCache:
+    """结果缓存（进程内 LRU + JSON 索引持久化）"""
+
+    def __init__(self, index_file, upload_folder, max_entries=2000, enabled=True, store=None):
+        self.index_file = index_file
+        self.store = store
+        self.upload_folder = os.path.abspath(upload_folder)
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    # ---------- 持久化 ----------
+
+    def _load(self):
+        if not self.enabled or not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for key, entry in data.items():
+                self._entries[key] = entry
+            app_logger.info(f"✓ 结果缓存已加载: {len(self._entries)} 条")
+        except Exception as e:
+            app_logger.warning(f"⚠️ 结果缓存索引加载失败: {e}")
+
+    def _save(self):
+        """写索引（调用方需持有锁）"""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_file)), exist_ok=True)
+            tmp_path = self.index_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_file)
+        except Exception as e:
+            app_logger.error(f"❌ 结果缓存索引保存失败: {e}")
+
+    # ---------- 查询 / 写入 ----------
+
+    def _output_path(self, entry):
+        return os.path.join(self.upload_folder, entry['output_file'])
+
+    def _is_valid(self, entry):
+        """输出文件仍在上传目录中且未被同名文件覆盖"""
+        try:
+            st = os.stat(self._output_path(entry))
+        except OSError:
+            return False
+        return st.st_size == entry.get('output_size')
+
+    def get(self, key):
+        """查询缓存，命中时刷新输出文件 mtime（推迟归档）"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if not self._is_valid(entry):
+                del self._entries[key]
+                self.misses += 1
+                self._save()
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        try:
+            os.utime(self._output_path(entry))
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, output_path, payload=None):
+        """写入缓存（output_path 必须位于上传目录下）"""
+        if not self.enabled or not output_path or not os.path.exists(output_path):
+            return None
+
+        output_path = os.path.abspath(output_path)
+        if not output_path.startswith(self.upload_folder):
+            app_logger.debug(f"输出文件不在上传目录中，跳过缓存: {output_path}")
+            return None
+
+        entry = {
+            'output_file': os.path.relpath(output_path, self.upload_folder),
+            'output_size': os.path.getsize(output_path),
+            'created_at': time.time(),
+            'payload': payload or {}
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[1])
+            # 其他条目仍引用同一输出文件时保留文件
+            referenced = {e['output_file'] for e in self._entries.values()}
+            orphaned = {e['output_file'] for e in evicted} - referenced
+            self._save()
+
+        self._remove_outputs(orphaned)
+        return entry
+
+    def _remove_outputs(self, output_files):
+        """删除被淘汰条目的输出文件（并移出存储台账）"""
+        if not output_files or self.store is None:
+            return
+        for output_file in output_files:
+            self.store.remove(os.path.join(self.upload_folder, output_file))
+        app_logger.info(f"🧹 结果缓存淘汰: 删除 {len(output_files)} 个输出文件")
+
+    # ---------- 并发合并 ----------
+
+    def claim(self, key):
+        """
+        申请计算权
+
+        Returns:
+            True 表示当前请求负责计算；False 表示已有相同请求在计算
+        """
+        with self._lock:
+            if key in self._inflight:
+                return False
+            self._inflight[key] = threading.Event()
+            return True
+
+    def wait(self, key, timeout=None):
+        """等待进行中的相同请求完成，返回其缓存结果（失败或超时则为 None，调用方应重新 claim）"""
+        with self._lock:
+            event = self._inflight.get(key)
+        if event is not None:
+            event.wait(timeout if timeout is not None else RESULT_CACHE_WAIT_TIMEOUT)
+        return self.get(key)
+
+    def release(self, key):
+        """计算结束（无论成功与否）后释放，唤醒等待者"""
+        with self._lock:
+            event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    # ---------- 淘汰 ----------
+
+    def evict_missing(self):
+        """清理输出文件已被归档或删除的条目（归档任务结束后调用）"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if not self._is_valid(entry)]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self._save()
+        if stale:
+            app_logger.info(f"🧹 结果缓存清理: {len(stale)} 条已失效")
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'inflight': len(self._inflight),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0
+            }
+
+
+# 全局实例
+result_cache = ResultCache(
+    RESULT_CACHE_INDEX_FILE,
+    UPLOAD_FOLDER,
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    enabled=RESULT_CACHE_ENABLED,
+    store=file_store
+)
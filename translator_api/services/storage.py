@@ -0,0 +1,407 @@
+"""
+上传文件存储 - 哈希分片目录 + 增量归档 + 后台压缩 + 归档容量预算
+
+- 上传和输出文件写入 UPLOAD_FOLDER/<2位哈希>/ 子目录，避免单目录文件过多
+- 归档按分片目录 mtime 增量扫描（os.scandir），只有变化过的分片才会被重新列出
+- 文件大小和时间记录在 SQLite 台账中，统计和淘汰都不需要遍历目录
+- 归档文件在后台线程压缩（zstd，未安装 zstandard 时退回 gzip）
+- 归档总大小超过 ARCHIVE_MAX_BYTES 时按时间从旧到新删除
+"""
+import gzip
+import hashlib
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from logger_config import app_logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    from config import (
+        UPLOAD_FOLDER,
+        ARCHIVE_FOLDER,
+        STORAGE_LEDGER_FILE,
+        UPLOAD_SHARD_CHARS,
+        ARCHIVE_COMPRESSION,
+        ARCHIVE_ZSTD_LEVEL,
+        ARCHIVE_MAX_BYTES
+    )
+except ImportError:
+    UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'uploads')
+    ARCHIVE_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'archives')
+    STORAGE_LEDGER_FILE = os.path.join(os.path.dirname(__file__), '..', 'cache', 'storage_ledger.db')
+    UPLOAD_SHARD_CHARS = 2
+    ARCHIVE_COMPRESSION = 'zstd'
+    ARCHIVE_ZSTD_LEVEL = 3
+    ARCHIVE_MAX_BYTES = 0
+
+# 压缩后至少节省这个比例才保留压缩版本（JPEG/PPTX 等本身已压缩的文件通常不划算）
+MIN_COMPRESSION_SAVING = 0.05
+COMPRESSED_SUFFIXES = ('.zst', '.gz')
+
+
+class FileStore:
+    """分片上传目录 + 归档台账"""
+
+    def __init__(self, upload_folder, archive_folder, ledger_file,
+                 shard_chars=2, compression='zstd', zstd_level=3, archive_max_bytes=0):
+        self.upload_folder = os.path.abspath(upload_folder)
+        self.archive_folder = os.path.abspath(archive_folder)
+        self.shard_chars = shard_chars
+        self.compression = compression
+        self.zstd_level = zstd_level
+        self.archive_max_bytes = archive_max_bytes
+
+        os.makedirs(self.upload_folder, exist_ok=True)
+        os.makedirs(self.archive_folder, exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(ledger_file)), exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(ledger_file, check_same_thread=False)
+        self._init_db()
+
+        self._compress_queue = queue.Queue()
+        self._worker = None
+
+    # ---------- 台账 ----------
+
+    def _init_db(self):
+        with self._lock:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path  TEXT PRIMARY KEY,
+                    dir   TEXT NOT NULL,
+                    area  TEXT NOT NULL,      -- upload / archive
+                    size  INTEGER NOT NULL,
+                    mtime REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_files_area_mtime ON files(area, mtime);
+                CREATE INDEX IF NOT EXISTS idx_files_dir ON files(dir);
+                CREATE TABLE IF NOT EXISTS dirs (
+                    path  TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key   TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+            self._db.commit()
+
+    def _upsert(self, path, area, size, mtime):
+        self._db.execute(
+            "INSERT OR REPLACE INTO files (path, dir, area, size, mtime) VALUES (?, ?, ?, ?, ?)",
+            (path, os.path.dirname(path), area, size, mtime)
+        )
+
+    def _delete(self, path):
+        self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    # ---------- 分片路径 ----------
+
+    def upload_path(self, filename):
+        """返回文件在分片目录中的绝对路径（自动创建分片目录）"""
+        shard = hashlib.md5(filename.encode('utf-8')).hexdigest()[:self.shard_chars]
+        shard_dir = os.path.join(self.upload_folder, shard)
+        os.makedirs(shard_dir, exist_ok=True)
+        return os.path.join(shard_dir, filename)
+
+    def relpath(self, path):
+        """上传目录内的相对路径（用于 /api/files/ URL）"""
+        return os.path.relpath(os.path.abspath(path), self.upload_folder).replace(os.sep, '/')
+
+    def register(self, path):
+        """登记新写入的上传/输出文件"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._upsert(os.path.abspath(path), 'upload', st.st_size, st.st_mtime)
+            self._db.commit()
+
+    def remove(self, path):
+        """删除上传目录中的文件并移出台账（结果缓存淘汰时调用）"""
+        path = os.path.abspath(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            app_logger.error(f"删除文件失败 {path}: {e}")
+            return False
+        with self._lock:
+            self._delete(path)
+            self._db.commit()
+        return True
+
+    # ---------- 增量扫描 ----------
+
+    def _sync_dir(self, dir_path):
+        """用 scandir 同步单个目录到台账（登记新文件、移除已消失的文件）"""
+        seen = set()
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+                seen.add(entry.path)
+                self._upsert(entry.path, 'upload', st.st_size, st.st_mtime)
+
+        rows = self._db.execute(
+            "SELECT path FROM files WHERE area = 'upload' AND dir = ?", (dir_path,)
+        ).fetchall()
+        for (path,) in rows:
+            if path not in seen:
+                self._delete(path)
+
+    def refresh(self):
+        """
+        增量同步上传目录
+
+        只列出顶层目录；分片目录仅在其 mtime 变化（有文件新增/删除）时才重新扫描
+        """
+        rescanned = 0
+        with self._lock:
+            known_dirs = dict(self._db.execute("SELECT path, mtime FROM dirs").fetchall())
+
+            # 顶层：分片目录 + 旧版平铺文件
+            self._sync_dir(self.upload_folder)
+
+            with os.scandir(self.upload_folder) as it:
+                shard_dirs = [
+                    entry for entry in it
+                    if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.')
+                ]
+
+            for entry in shard_dirs:
+                dir_mtime = entry.stat(follow_symlinks=False).st_mtime
+                if known_dirs.get(entry.path) == dir_mtime:
+                    continue
+                self._sync_dir(entry.path)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO dirs (path, mtime) VALUES (?, ?)",
+                    (entry.path, dir_mtime)
+                )
+                rescanned += 1
+
+            self._import_archive_once()
+            self._db.commit()
+
+        if rescanned:
+            app_logger.debug(f"📁 增量扫描: {rescanned} 个分片目录有变化")
+        return rescanned
+
+    def _import_archive_once(self):
+        """首次启用台账时登记已有归档文件（只执行一次）"""
+        done = self._db.execute("SELECT value FROM meta WHERE key = 'archive_imported'").fetchone()
+        if done:
+            return
+
+        count = 0
+        stack = [self.archive_folder]
+        while stack:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        self._upsert(entry.path, 'archive', st.st_size, st.st_mtime)
+                        count += 1
+
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('archive_imported', ?)",
+                         (datetime.now().isoformat(),))
+        app_logger.info(f"📦 归档台账初始化: 登记 {count} 个已有归档文件")
+
+    # ---------- 归档 ----------
+
+    def archive_expired(self, max_age_hours=2):
+        """把超过指定时间的上传文件移到 archives/YYYY/MM/DD/，并排队压缩"""
+        self.refresh()
+
+        cutoff = time.time() - max_age_hours * 3600
+        current_date = datetime.now()
+        archive_path = os.path.join(
+            self.archive_folder,
+            current_date.strftime('%Y'), current_date.strftime('%m'), current_date.strftime('%d')
+        )
+
+        with self._lock:
+            candidates = self._db.execute(
+                "SELECT path FROM files WHERE area = 'upload' AND mtime < ? ORDER BY mtime",
+                (cutoff,)
+            ).fetchall()
+
+        archived_count = 0
+        for (path,) in candidates:
+            try:
+                st = os.stat(path)
+            except OSError:
+                with self._lock:
+                    self._delete(path)
+                continue
+
+            # 文件在台账记录之后被访问过（例如结果缓存命中）
+            if st.st_mtime >= cutoff:
+                with self._lock:
+                    self._upsert(path, 'upload', st.st_size, st.st_mtime)
+                continue
+
+            try:
+                os.makedirs(archive_path, exist_ok=True)
+                name = os.path.basename(path)
+                dest_path = os.path.join(archive_path, name)
+                if os.path.exists(dest_path):
+                    stem, ext = os.path.splitext(name)
+                    dest_path = os.path.join(archive_path, f"{stem}_{int(st.st_mtime)}{ext}")
+
+                shutil.move(path, dest_path)
+                with self._lock:
+                    self._delete(path)
+                    self._upsert(dest_path, 'archive', st.st_size, st.st_mtime)
+                archived_count += 1
+                self._compress_queue.put(dest_path)
+
+                app_logger.info(
+                    f"📦 归档文件: {self.relpath(path)} → {current_date.strftime('%Y/%m/%d')}/ "
+                    f"(年龄: {(time.time() - st.st_mtime) / 3600:.1f}小时)"
+                )
+            except Exception as e:
+                app_logger.error(f"归档文件失败 {path}: {e}")
+
+        with self._lock:
+            self._db.commit()
+
+        self.enforce_budget()
+        return archived_count
+
+    # ---------- 压缩 ----------
+
+    def start(self):
+        """启动后台压缩线程"""
+        if self.compression == 'none' or (self._worker and self._worker.is_alive()):
+            return
+        if self.compression == 'zstd' and zstandard is None:
+            app_logger.warning("⚠️ 未安装 zstandard，归档压缩改用 gzip")
+        self._worker = threading.Thread(target=self._compress_loop, name='archive-compress', daemon=True)
+        self._worker.start()
+
+    def _compress_loop(self):
+        while True:
+            path = self._compress_queue.get()
+            try:
+                self.compress_file(path)
+                self.enforce_budget()
+            except Exception as e:
+                app_logger.error(f"归档压缩失败 {path}: {e}")
+            finally:
+                self._compress_queue.task_done()
+
+    def compress_file(self, path):
+        """压缩单个归档文件；收益不足时保留原文件"""
+        if path.endswith(COMPRESSED_SUFFIXES) or not os.path.exists(path):
+            return None
+
+        st = os.stat(path)
+        if zstandard is not None and self.compression == 'zstd':
+            dest = path + '.zst'
+            cctx = zstandard.ZstdCompressor(level=self.zstd_level)
+            with open(path, 'rb') as src, open(dest, 'wb') as dst:
+                cctx.copy_stream(src, dst)
+        else:
+            dest = path + '.gz'
+            with open(path, 'rb') as src, gzip.open(dest, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+
+        new_size = os.path.getsize(dest)
+        if new_size > st.st_size * (1 - MIN_COMPRESSION_SAVING):
+            os.remove(dest)
+            return None
+
+        os.utime(dest, (st.st_atime, st.st_mtime))
+        os.remove(path)
+        with self._lock:
+            self._delete(path)
+            self._upsert(dest, 'archive', new_size, st.st_mtime)
+            self._db.commit()
+
+        app_logger.debug(f"🗜️ 压缩归档: {os.path.basename(path)} {st.st_size / 1024:.1f}KB → {new_size / 1024:.1f}KB")
+        return dest
+
+    # ---------- 容量预算 ----------
+
+    def enforce_budget(self):
+        """归档总大小超出预算时，从最旧的文件开始删除"""
+        if not self.archive_max_bytes:
+            return 0
+
+        removed = 0
+        with self._lock:
+            total = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM files WHERE area = 'archive'"
+            ).fetchone()[0]
+            if total <= self.archive_max_bytes:
+                return 0
+
+            rows = self._db.execute(
+                "SELECT path, size FROM files WHERE area = 'archive' ORDER BY mtime"
+            )
+            victims = []
+            for path, size in rows:
+                if total <= self.archive_max_bytes:
+                    break
+                victims.append(path)
+                total -= size
+
+            for path in victims:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    app_logger.error(f"删除归档失败 {path}: {e}")
+                    continue
+                self._delete(path)
+                removed += 1
+            self._db.commit()
+
+        if removed:
+            app_logger.info(f"🧹 归档超出容量预算，已删除最旧的 {removed} 个文件")
+        return removed
+
+    # ---------- 统计 ----------
+
+    def stats(self):
+        """按区域汇总文件数和大小（来自台账，不遍历目录）"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT area, COUNT(*), COALESCE(SUM(size), 0) FROM files GROUP BY area"
+            ).fetchall()
+        result = {'upload': {'files_count': 0, 'total_bytes': 0},
+                  'archive': {'files_count': 0, 'total_bytes': 0}}
+        for area, count, size in rows:
+            result[area] = {'files_count': count, 'total_bytes': size}
+        result['archive']['max_bytes'] = self.archive_max_bytes
+        result['archive']['pending_compression'] = self._compress_queue.qsize()
+        return result
+
+
+# 全局实例
+file_store = FileStore(
+    UPLOAD_FOLDER,
+    ARCHIVE_FOLDER,
+    STORAGE_LEDGER_FILE,
+    shard_chars=UPLOAD_SHARD_CHARS,
+    compression=ARCHIVE_COMPRESSION,
+    zstd_level=ARCHIVE_ZSTD_LEVEL,
+    archive_max_bytes=ARCHIVE_MAX_BYTES
+)
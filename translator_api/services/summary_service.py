@@ -0,0 +1,288 @@
+"""
+异步 AI 总结 - 把总结生成移出翻译请求的关键路径
+
+- 翻译接口只提交总结任务，立即拿到 summary_id 返回
+- 后台线程池以流式方式调用 Ollama / Qwen 生成总结，生成中的片段可实时订阅
+- 长文档走分段总结（map-reduce），见 hierarchical_summary.py
+- 结果按 (文本哈希, 目标语言, 模型) 缓存，相同内容不会重复生成
+- 通过 /api/summaries/<summary_id> 查询（支持 wait 长轮询）或 SSE 逐段订阅
+- 记录首个 token 延迟（TTFT）与总耗时
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from logger_config import app_logger
+from services.hierarchical_summary import HierarchicalSummarizer
+
+try:
+    from config import (
+        AI_PROVIDER,
+        SUMMARY_WORKERS,
+        SUMMARY_CACHE_FILE,
+        SUMMARY_CACHE_MAX_ENTRIES
+    )
+except ImportError:
+    AI_PROVIDER = os.getenv('AI_PROVIDER', 'ollama')
+    SUMMARY_WORKERS = 2
+    SUMMARY_CACHE_FILE = os.path.join(os.path.dirname(__file__), '..', 'cache', 'summary_cache.json')
+    SUMMARY_CACHE_MAX_ENTRIES = 1000
+
+STATUS_PENDING = 'pending'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+def get_ai_service():
+    """按 AI_PROVIDER 返回总结服务实例"""
+    if AI_PROVIDER == 'qwen':
+        from services.qwen_service import qwen_service
+        return qwen_service
+    from services.ollama_service import ollama_service
+    return ollama_service
+
+
+def model_id(service=None):
+    """模型标识（提供商:模型名），作为缓存键的一部分"""
+    service = service or get_ai_service()
+    return f"{AI_PROVIDER}:{service.model}"
+
+
+def make_summary_id(text, target_language, model):
+    """summary_id 由内容决定：相同文本 + 语言 + 模型得到相同 id"""
+    text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return hashlib.sha256(f"{text_hash}|{target_language}|{model}".encode('utf-8')).hexdigest()[:32]
+
+
+class SummaryManager:
+    """后台总结任务 + 结果缓存（进程内 LRU + JSON 索引持久化）"""
+
+    def __init__(self, cache_file, max_entries=1000, workers=2):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.workers = workers
+        self._entries = OrderedDict()
+        self._chunks = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._executor = None
+        self.hits = 0
+        self.misses = 0
+        self.streamed = 0
+        self.ttft_total = 0.0
+        self.ttft_max = 0.0
+        self._load()
+
+    # ---------- 持久化 ----------
+
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for summary_id, entry in data.items():
+                self._entries[summary_id] = entry
+            app_logger.info(f"✓ 总结缓存已加载: {len(self._entries)} 条")
+        except Exception as e:
+            app_logger.warning(f"⚠️ 总结缓存加载失败: {e}")
+
+    def _save(self):
+        """只持久化已完成的总结（调用方需持有锁）"""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+            done = {k: v for k, v in self._entries.items() if v['status'] == STATUS_DONE}
+            tmp_path = self.cache_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(done, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except Exception as e:
+            app_logger.error(f"❌ 总结缓存保存失败: {e}")
+
+    # ---------- 对外接口 ----------
+
+    @staticmethod
+    def _view(summary_id, entry):
+        """对外格式（兼容原 generate_summary 的 success/summary/error 字段）"""
+        return {
+            'summary_id': summary_id,
+            'status': entry['status'],
+            'success': entry['status'] == STATUS_DONE,
+            'summary': entry.get('summary'),
+            'error': entry.get('error'),
+            'model': entry.get('model'),
+            'target_language': entry.get('target_language'),
+            'metrics': {
+                'first_token_seconds': entry.get('first_token_seconds'),
+                'duration_seconds': entry.get('duration_seconds')
+            }
+        }
+
+    def submit(self, text, target_language):
+        """
+        提交总结任务（已缓存或正在生成时直接复用）
+
+        Returns:
+            总结状态字典，包含 summary_id
+        """
+        if not text or not text.strip():
+            return {'summary_id': None, 'status': STATUS_FAILED, 'success': False,
+                    'summary': None, 'error': '文本内容为空'}
+
+        service = get_ai_service()
+        model = model_id(service)
+        summary_id = make_summary_id(text, target_language, model)
+
+        with self._lock:
+            entry = self._entries.get(summary_id)
+            if entry is not None and entry['status'] != STATUS_FAILED:
+                self._entries.move_to_end(summary_id)
+                self.hits += 1
+                return self._view(summary_id, entry)
+
+            self.misses += 1
+            entry = {
+                'status': STATUS_PENDING,
+                'summary': None,
+                'error': None,
+                'model': model,
+                'target_language': target_language,
+                'text_chars': len(text),
+                'created_at': time.time()
+            }
+            self._entries[summary_id] = entry
+            self._chunks[summary_id] = []
+            while len(self._entries) > self.max_entries:
+                oldest_id, oldest = next(iter(self._entries.items()))
+                if oldest['status'] == STATUS_PENDING:
+                    break
+                self._entries.popitem(last=False)
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='summary')
+            self._executor.submit(self._run, summary_id, text, target_language, service)
+
+        app_logger.info(f"🧠 已提交后台总结: {summary_id} ({len(text)} 字符, {model})")
+        return self._view(summary_id, entry)
+
+    def get(self, summary_id):
+        with self._lock:
+            entry = self._entries.get(summary_id)
+            return self._view(summary_id, entry) if entry else None
+
+    def wait(self, summary_id, timeout=None):
+        """等待总结完成（超时返回当前状态）"""
+        with self._changed:
+            entry = self._entries.get(summary_id)
+            if entry is None:
+                return None
+            self._changed.wait_for(lambda: entry['status'] != STATUS_PENDING, timeout)
+            return self._view(summary_id, entry)
+
+    def iter_events(self, summary_id, heartbeat=15):
+        """
+        逐段订阅总结（用于 SSE）
+
+        Yields:
+            ('token', 文本片段) / ('keepalive', None) / (结束状态 done|failed, 总结信息)
+            已缓存的总结直接产出结束事件
+        """
+        sent = 0
+        chunks = None
+        while True:
+            with self._changed:
+                entry = self._entries.get(summary_id)
+                if entry is None:
+                    return
+                # 持有片段列表的引用：_run 结束时会从 _chunks 中移除，但最后几段可能还未发出
+                if chunks is None:
+                    chunks = self._chunks.get(summary_id, [])
+                if entry['status'] == STATUS_PENDING and len(chunks) <= sent:
+                    self._changed.wait_for(
+                        lambda: entry['status'] != STATUS_PENDING or len(chunks) > sent, heartbeat
+                    )
+                new_text = ''.join(chunks[sent:])
+                sent = len(chunks)
+                status = entry['status']
+                view = self._view(summary_id, entry)
+
+            if new_text:
+                yield 'token', new_text
+            elif status == STATUS_PENDING:
+                yield 'keepalive', None
+            if status != STATUS_PENDING:
+                yield status, view
+                return
+
+    # ---------- 执行 ----------
+
+    def _run(self, summary_id, text, target_language, service):
+        start = time.time()
+        first_token = None
+        try:
+            for piece in HierarchicalSummarizer(service).stream(text, target_language):
+                with self._changed:
+                    if first_token is None:
+                        first_token = time.time() - start
+                        entry = self._entries.get(summary_id)
+                        if entry is not None:
+                            entry['first_token_seconds'] = round(first_token, 3)
+                    self._chunks[summary_id].append(piece)
+                    self._changed.notify_all()
+            summary = ''.join(self._chunks[summary_id]).strip()
+            result = {'success': bool(summary), 'summary': summary or None,
+                      'error': None if summary else 'AI未能生成有效的总结'}
+        except RuntimeError as e:
+            result = {'success': False, 'summary': None, 'error': str(e)}
+        except Exception as e:
+            app_logger.error(f"❌ AI总结异常: {e}")
+            result = {'success': False, 'summary': None, 'error': '生成总结时发生错误 🔧'}
+
+        with self._changed:
+            entry = self._entries.get(summary_id)
+            if entry is not None:
+                entry['status'] = STATUS_DONE if result.get('success') else STATUS_FAILED
+                entry['summary'] = result.get('summary')
+                entry['error'] = result.get('error')
+                entry['finished_at'] = time.time()
+                entry['duration_seconds'] = round(time.time() - start, 2)
+                if entry['status'] == STATUS_DONE:
+                    self._save()
+            if first_token is not None:
+                self.streamed += 1
+                self.ttft_total += first_token
+                self.ttft_max = max(self.ttft_max, first_token)
+            self._chunks.pop(summary_id, None)
+            self._changed.notify_all()
+
+        if result.get('success'):
+            ttft = f", 首个 token {first_token:.2f}s" if first_token is not None else ''
+            app_logger.info(f"✓ AI总结生成成功: {summary_id} ({time.time() - start:.1f}s{ttft})")
+        else:
+            app_logger.warning(f"⚠️ AI总结生成失败: {summary_id}: {result.get('error')}")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'pending': sum(1 for e in self._entries.values() if e['status'] == STATUS_PENDING),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+                'streamed': self.streamed,
+                'ttft_avg_seconds': round(self.ttft_total / self.streamed, 3) if self.streamed else None,
+                'ttft_max_seconds': round(self.ttft_max, 3) if self.streamed else None
+            }
+
+
+# 全局实例
+summary_manager = SummaryManager(
+    SUMMARY_CACHE_FILE,
+    max_entries=SUMMARY_CACHE_MAX_ENTRIES,
+    workers=SUMMARY_WORKERS
+)
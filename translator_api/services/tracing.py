@@ -0,0 +1,199 @@
+"""
+请求链路追踪 - 在 API、OCR、Inpaint 之间传播同一个 trace
+
+- 入口请求生成（或沿用上游传入的）trace_id
+- 出站 HTTP 调用通过请求头 X-Trace-Id 传播 trace_id
+- 下游服务通过响应头 X-Trace-Spans 回传各自的阶段耗时
+- 请求结束后可导出到本地 collector 文件（JSON Lines）
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from logger_config import app_logger
+
+try:
+    from config import TRACE_EXPORT_ENABLED, TRACE_EXPORT_FILE
+except ImportError:
+    TRACE_EXPORT_ENABLED = os.getenv('TRACE_EXPORT_ENABLED', 'False').lower() == 'true'
+    TRACE_EXPORT_FILE = os.getenv('TRACE_EXPORT_FILE', os.path.join('logs', 'traces', 'traces.jsonl'))
+
+# 传播用的 HTTP 头
+TRACE_HEADER = 'X-Trace-Id'
+SPANS_HEADER = 'X-Trace-Spans'
+
+_current_trace = ContextVar('current_trace', default=None)
+_export_lock = threading.Lock()
+
+
+class Trace:
+    """单个请求的链路信息（线程安全）"""
+
+    def __init__(self, trace_id=None, service='api'):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.service = service
+        self.started_at = time.time()
+        self.ended_at = None
+        self.spans = []
+        # 流式响应在请求结束后仍会记录 spans，此时由调用方在完成后调用 finish_deferred_trace 导出
+        self.export_deferred = False
+        self._lock = threading.Lock()
+
+    def add_span(self, name, start, end, service=None, **attrs):
+        """记录一个阶段（start/end 为 epoch 秒）"""
+        span = {
+            'name': name,
+            'service': service or self.service,
+            'start': round(start, 6),
+            'duration_ms': round((end - start) * 1000, 1)
+        }
+        if attrs:
+            span['attrs'] = attrs
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """以 with 语句记录一个阶段"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.time(), **attrs)
+
+    def merge_remote(self, response):
+        """合并下游服务通过响应头回传的 spans"""
+        raw = response.headers.get(SPANS_HEADER) if response is not None else None
+        if not raw:
+            return 0
+        try:
+            remote_spans = json.loads(raw)
+        except ValueError:
+            app_logger.debug(f"无法解析下游 spans: {raw[:100]}")
+            return 0
+
+        with self._lock:
+            for span in remote_spans:
+                if isinstance(span, dict) and 'name' in span:
+                    self.spans.append(span)
+        return len(remote_spans)
+
+    def timing_breakdown(self):
+        """生成按开始时间排序的耗时明细（相对 trace 开始的毫秒数）"""
+        end = self.ended_at or time.time()
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.get('start', 0))
+
+        breakdown = []
+        for span in spans:
+            item = {
+                'name': span['name'],
+                'service': span.get('service'),
+                'start_ms': round((span.get('start', self.started_at) - self.started_at) * 1000, 1),
+                'duration_ms': span.get('duration_ms')
+            }
+            if span.get('attrs'):
+                item['attrs'] = span['attrs']
+            breakdown.append(item)
+
+        return {
+            'trace_id': self.trace_id,
+            'total_ms': round((end - self.started_at) * 1000, 1),
+            'spans': breakdown
+        }
+
+
+# ============= 上下文管理 =============
+
+def start_trace(trace_id=None, service='api'):
+    """开始一个新 trace 并绑定到当前上下文"""
+    trace = Trace(trace_id, service)
+    _current_trace.set(trace)
+    return trace
+
+
+def get_current_trace():
+    """获取当前上下文的 trace（没有则返回 None）"""
+    return _current_trace.get()
+
+
+def bind_trace(trace):
+    """把已有 trace 绑定到当前上下文（用于后台线程）"""
+    _current_trace.set(trace)
+
+
+def end_trace(export=True):
+    """结束当前 trace，按配置导出，并解除绑定"""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+
+    trace.ended_at = time.time()
+    _current_trace.set(None)
+
+    if export and TRACE_EXPORT_ENABLED and not trace.export_deferred:
+        export_trace(trace)
+    return trace
+
+
+def finish_deferred_trace(trace):
+    """结束延迟导出的 trace（请求已返回，后台流程完成后调用）"""
+    if trace is None:
+        return
+    trace.ended_at = time.time()
+    if TRACE_EXPORT_ENABLED:
+        export_trace(trace)
+
+
+@contextmanager
+def span(name, **attrs):
+    """在当前 trace 上记录阶段；没有 trace 时不做任何事"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name, **attrs):
+        yield
+
+
+def inject_headers(headers=None):
+    """给出站请求附加 trace 头"""
+    headers = dict(headers or {})
+    trace = _current_trace.get()
+    if trace is not None:
+        headers[TRACE_HEADER] = trace.trace_id
+    return headers
+
+
+def merge_remote_spans(response):
+    """把下游服务回传的 spans 合并进当前 trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        return 0
+    return trace.merge_remote(response)
+
+
+# ============= 导出 =============
+
+def export_trace(trace, path=None):
+    """把完成的 trace 追加写入本地 collector 文件（一行一个 JSON）"""
+    path = path or TRACE_EXPORT_FILE
+    record = {
+        'trace_id': trace.trace_id,
+        'service': trace.service,
+        'started_at': trace.started_at,
+        **trace.timing_breakdown()
+    }
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        line = json.dumps(record, ensure_ascii=False)
+        with _export_lock:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+    except Exception as e:
+        app_logger.error(f"❌ Trace 导出失败: {e}")
@@ -0,0 +1,138 @@
+"""
+测试流式 AI 总结（Ollama / Qwen）
+
+在本地启动一个模拟服务，按 chunked 方式逐段返回：
+- Ollama: POST /api/generate，每行一个 JSON（"stream": true）
+- Qwen:   POST /chat/completions，OpenAI 兼容的 SSE（data: {...} / data: [DONE]）
+- Ollama 健康检查 GET /api/tags
+然后通过 SummaryManager 订阅 token，检查拼接结果与首个 token 延迟；
+慢速订阅者（每个事件之间停顿到生成结束）也必须收到完整的 token
+"""
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from services.http_client import http_client
+from services.ollama_service import OllamaService
+from services.qwen_service import QwenService
+from services.summary_service import SummaryManager
+import services.summary_service as summary_service
+
+PIECES = ["• 第一点", "\n• 第二点", "\n• 第三点"]
+CHUNK_DELAY = 0.2
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """模拟 Ollama / Qwen 的流式接口"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        # Ollama 健康检查 /api/tags
+        body = b'{"models": []}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length))
+        assert request.get('stream') is True, 'stream 参数未开启'
+
+        is_ollama = self.path == '/api/generate'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson' if is_ollama else 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        for piece in PIECES:
+            time.sleep(CHUNK_DELAY)
+            if is_ollama:
+                line = json.dumps({'response': piece, 'done': False}, ensure_ascii=False) + '\n'
+            else:
+                event = {'choices': [{'delta': {'content': piece}}]}
+                line = f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            self._write_chunk(line.encode('utf-8'))
+
+        if is_ollama:
+            self._write_chunk(b'{"response": "", "done": true}\n')
+        else:
+            self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+
+def run_case(name, service, consume_delay=0):
+    print(f"▶ {name}")
+    summary_service.get_ai_service = lambda: service
+    manager = SummaryManager(tempfile.mktemp(suffix='.json'), workers=1)
+
+    start = time.time()
+    result = manager.submit(f"{name} 测试文本", 'zh')
+    summary_id = result['summary_id']
+
+    received = []
+    first_token_at = None
+    for event, data in manager.iter_events(summary_id, heartbeat=5):
+        if event == 'token':
+            if first_token_at is None:
+                first_token_at = time.time() - start
+            received.append(data)
+            print(f"   token +{time.time() - start:.2f}s: {data!r}")
+            if consume_delay:
+                time.sleep(consume_delay)
+        elif event in ('done', 'failed'):
+            print(f"   {event}: {data['metrics']}")
+            final = data
+
+    assert final['success'], final['error']
+    assert ''.join(received).strip() == final['summary'], '拼接结果与最终总结不一致'
+    assert first_token_at is not None and first_token_at < CHUNK_DELAY * 2, '首个 token 未及时推送'
+
+    cached = manager.submit(f"{name} 测试文本", 'zh')
+    assert cached['status'] == 'done', '第二次请求未命中缓存'
+    print(f"   ✅ 首个 token {first_token_at:.2f}s, 总耗时 {time.time() - start:.2f}s, 缓存命中 ✓")
+    print()
+
+
+def test_summary_stream():
+    print("=" * 50)
+    print("测试流式 AI 总结")
+    print("=" * 50)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"模拟服务: {base_url}")
+    print()
+
+    try:
+        ollama = OllamaService()
+        ollama.base_url = base_url
+        http_client.register('ollama', ollama.timeout, health_url=f"{base_url}/api/tags")
+        http_client.check('ollama')
+        run_case('Ollama', ollama)
+        run_case('Ollama 慢速订阅', ollama, consume_delay=CHUNK_DELAY * (len(PIECES) + 1))
+
+        qwen = QwenService()
+        qwen.base_url = base_url
+        qwen.api_key = 'test-key'
+        run_case('Qwen', qwen)
+    finally:
+        server.shutdown()
+
+    print("✅ 全部通过")
+
+
+if __name__ == "__main__":
+    test_summary_stream()
@@ -1080,6 +1080,15 @@ function displayAISummary(summaryResult) {
         return;
     }
     
+    if (summaryResult.status === 'pending' && summaryResult.summary_id) {
+        // 总结在后台生成中：先显示占位，再长轮询结果
+        summaryContent.textContent = 'AI总结生成中...';
+        summarySuccess.style.display = 'block';
+        summaryCard.style.display = 'block';
+        streamAISummary(summaryResult.summary_id);
+        return;
+    }
+    
     if (summaryResult.success && summaryResult.content) {
         // 总结成功
         summaryContent.textContent = summaryResult.content;
@@ -1098,8 +1107,73 @@ function displayAISummary(summaryResult) {
     }
 }
 
+// 通过 SSE 逐段显示AI总结；浏览器不支持或连接失败时退回长轮询
+function streamAISummary(summaryId) {
+    if (typeof EventSource === 'undefined') {
+        pollAISummary(summaryId);
+        return;
+    }
+    window.currentSummaryId = summaryId;
+    const summaryContent = document.getElementById('aiSummaryContent');
+    const source = new EventSource(`${ENV_CONFIG.getApiUrl()}/summaries/${summaryId}/events`);
+    let text = '';
+    
+    source.addEventListener('token', (event) => {
+        if (window.currentSummaryId !== summaryId) {
+            source.close();
+            return;
+        }
+        text += JSON.parse(event.data).text;
+        summaryContent.textContent = text;
+    });
+    
+    const finish = (event) => {
+        source.close();
+        if (window.currentSummaryId === summaryId) {
+            displayAISummary(JSON.parse(event.data));
+        }
+    };
+    source.addEventListener('done', finish);
+    source.addEventListener('failed', finish);
+    
+    source.onerror = () => {
+        source.close();
+        if (window.currentSummaryId === summaryId) {
+            pollAISummary(summaryId);
+        }
+    };
+}
+
+// 长轮询后台生成的AI总结（服务端最多挂起 wait 秒）
+async function pollAISummary(summaryId, attempts = 10) {
+    window.currentSummaryId = summaryId;
+    for (let i = 0; i < attempts; i++) {
+        try {
+            const response = await fetch(`${ENV_CONFIG.getApiUrl()}/summaries/${summaryId}?wait=20`);
+            if (!response.ok) {
+                break;
+            }
+            const result = await response.json();
+            if (window.currentSummaryId !== summaryId) {
+                return; // 已开始新的翻译，丢弃旧结果
+            }
+            if (result.status !== 'pending') {
+                displayAISummary(result);
+                return;
+            }
+        } catch (error) {
+            console.warn('⚠️ 获取AI总结失败:', error);
+            break;
+        }
+    }
+    if (window.currentSummaryId === summaryId) {
+        displayAISummary({ success: false, error: 'AI总结暂时不可用 😊' });
+    }
+}
+
 // 🔥 新增: 隐藏AI总结的函数
 function hideAISummary() {
+    window.currentSummaryId = null;
     const summaryCard = document.getElementById('aiSummaryCard');
     if (summaryCard) {
         summaryCard.style.display = 'none';